@@ -3,16 +3,164 @@
 Web application for GitHub Code Search
 """
 
-from flask import Flask, render_template, request, jsonify
-from github_code_search import GitHubCodeSearch
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context
+from github_code_search import GitHubCodeSearch, load_tokens, _COMMIT_SHA_RE
+import async_github
+from http_cache import DEFAULT_CACHE_DIR
+from rate_limit import PRIORITY_BACKGROUND
+from trigram_index import TrigramIndex, TrigramIndexSpill, TrigramIndexStore
+from code_matcher import classify_line, get_matcher
+from search_result import SearchResult
+from jobs import JobRunner
+from result_cache import ResultCache
+from json_response import compress_response, dumps, json_response
+import metrics
+import codecs
+import itertools
 import json
+import os
+import re
+import secrets
+import threading
 import time
+from collections import OrderedDict
 
 app = Flask(__name__)
 
 # Initialize the GitHub search instance
-searcher = GitHubCodeSearch()
-searcher.set_token("")
+searcher = GitHubCodeSearch(
+    max_workers=int(os.environ.get('GITGUTTER_MAX_WORKERS', 8)),
+    cache_dir=os.environ.get('GITGUTTER_CACHE_DIR', DEFAULT_CACHE_DIR),
+    cache_max_bytes=int(os.environ.get('GITGUTTER_CACHE_MAX_MB', 256)) * 1024 * 1024,
+    blob_cache_max_bytes=int(os.environ.get('GITGUTTER_BLOB_CACHE_MAX_MB', 256)) * 1024 * 1024,
+    date_backend=os.environ.get('GITGUTTER_DATE_BACKEND', 'rest'),
+    graphql_url=os.environ.get('GITGUTTER_GRAPHQL_URL') or None,
+    rate_limit_max_wait=float(os.environ.get('GITGUTTER_RATE_LIMIT_MAX_WAIT', 60))
+)
+# Tokens come from GITHUB_TOKENS / GITHUB_TOKEN / GITHUB_TOKENS_FILE
+searcher.set_tokens(load_tokens())
+
+# Fan-outs (enrichment, commit history, file contents) are awaited together on
+# one keep-alive connection pool when httpx is installed
+async_client = async_github.AsyncGitHubClient(
+    searcher,
+    max_connections=int(os.environ.get('GITGUTTER_MAX_CONNECTIONS', 64))
+) if async_github.available() else None
+
+def run_upstream(name, *args, **kwargs):
+    """Call searcher method `name` through the async client when there is one"""
+    if async_client is not None:
+        return async_client.run(getattr(async_client, name)(*args, **kwargs))
+    return getattr(searcher, name)(*args, **kwargs)
+
+# Enriched first pages of recent searches; stale ones are served while they refresh
+search_cache = ResultCache(
+    ttl=float(os.environ.get('GITGUTTER_SEARCH_CACHE_TTL', 300)),
+    stale_ttl=float(os.environ.get('GITGUTTER_SEARCH_CACHE_STALE', 3600)),
+    max_bytes=int(float(os.environ.get('GITGUTTER_SEARCH_CACHE_MAX_MB', 32)) * 1024 * 1024)
+)
+
+# Open searches the frontend can "load more" from, least recently used first
+SEARCH_CURSOR_TTL = 15 * 60
+SEARCH_CURSOR_MAX = 200
+search_cursors = OrderedDict()
+search_cursors_lock = threading.Lock()
+
+# Directory listings of recently browsed repositories, one full tree per commit SHA
+TREE_LISTINGS_MAX = 32
+tree_listings = OrderedDict()
+tree_listings_lock = threading.Lock()
+
+# Repositories up to this size (sum of blob sizes) are analyzed from a single
+# tarball download instead of one contents request per file
+ARCHIVE_MAX_BYTES = int(os.environ.get('GITGUTTER_ARCHIVE_MAX_MB', 200)) * 1024 * 1024
+ARCHIVE_MIN_FILES = 5
+
+# Files fetched individually are requested this many at a time, so streamed
+# analyses still report results as they arrive
+FILE_FETCH_CHUNK = 64
+
+# File contents are streamed in chunks of this size; binary files are told
+# apart by a NUL byte in their first BINARY_SNIFF_BYTES, as git does
+FILE_CHUNK_SIZE = 64 * 1024
+BINARY_SNIFF_BYTES = 8000
+
+# Streaming analyses report progress after this many files without references
+PROGRESS_INTERVAL = 50
+
+# Relationships beyond this many are counted but not returned
+MAX_RELATIONSHIPS = int(os.environ.get('GITGUTTER_MAX_RELATIONSHIPS', 5000))
+
+# Analyses are answered compact (each reference once, referred to by index) unless 'full' is asked for
+ANALYSIS_FORMATS = ('compact', 'full')
+
+# Analyses submitted as jobs run on their own bounded pool, independent of the request
+analysis_jobs = JobRunner(
+    max_workers=int(os.environ.get('GITGUTTER_JOB_WORKERS', 2)),
+    ttl=float(os.environ.get('GITGUTTER_JOB_TTL', 3600))
+)
+
+# Trigram indexes let repeated analyses of the same commit run locally
+_index_dir = os.environ.get('GITGUTTER_INDEX_DIR', os.path.join(DEFAULT_CACHE_DIR, 'indexes'))
+analysis_index = TrigramIndexStore(
+    _index_dir,
+    memory_budget=int(os.environ.get('GITGUTTER_INDEX_MEMORY_MB', 256)) * 1024 * 1024,
+    disk_budget=int(os.environ.get('GITGUTTER_INDEX_DISK_MB', 1024)) * 1024 * 1024
+) if _index_dir else None
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Record the latency and status code of every request, by route pattern"""
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe_request(route, request.method, response.status_code, time.perf_counter() - started)
+    return response
+
+@app.after_request
+def compress_body(response):
+    """Compress JSON and text bodies with brotli or gzip when the client accepts it"""
+    return compress_response(response, request.accept_encodings)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Metrics in the Prometheus text format"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@metrics.REGISTRY.collector
+def collect_state_metrics():
+    """Cache, rate-limit and job gauges, read at scrape time"""
+    caches = {
+        'http': searcher.cache_stats(),
+        'blob': searcher.blob_cache_stats(),
+        'search': search_cache.stats()
+    }
+    yield ('gitgutter_cache_hit_ratio', 'gauge', 'Share of lookups answered from each cache',
+           [({'cache': name}, stats['hit_ratio']) for name, stats in caches.items() if stats.get('enabled')])
+    yield ('gitgutter_cache_bytes', 'gauge', 'Bytes held by each cache',
+           [({'cache': name}, stats['bytes']) for name, stats in caches.items() if stats.get('enabled')])
+    flights = single_flight_stats()
+    yield ('gitgutter_single_flight_shared_total', 'counter', 'Requests answered by an identical in-flight call',
+           [({}, flights['shared'])])
+    
+    rate_limit = searcher.rate_limit_status()
+    resources = rate_limit['resources']
+    yield ('gitgutter_rate_limit_remaining', 'gauge', 'Remaining GitHub rate-limit budget of the token pool',
+           [({'resource': name}, budget['remaining']) for name, budget in resources.items()])
+    yield ('gitgutter_rate_limit_limit', 'gauge', 'GitHub rate-limit budget of the token pool per window',
+           [({'resource': name}, budget['limit']) for name, budget in resources.items()])
+    yield ('gitgutter_rate_limit_waiting', 'gauge', 'Requests waiting for rate-limit budget',
+           [({'resource': name}, budget['waiting']) for name, budget in resources.items()])
+    yield ('gitgutter_rate_limit_wait_seconds_total', 'counter', 'Time requests spent waiting for rate-limit budget',
+           [({}, rate_limit['wait_seconds'])])
+    
+    jobs = analysis_jobs.stats()['jobs']
+    yield ('gitgutter_jobs', 'gauge', 'Analysis jobs by status',
+           [({'status': status}, count) for status, count in jobs.items()])
 
 @app.route('/')
 def index():
@@ -21,83 +169,150 @@ def index():
 
 @app.route('/api/search', methods=['POST'])
 def search():
-    """API endpoint for code search"""
+    """API endpoint for code search
+
+    The response carries a `cursor` while more pages are available; post
+    {"cursor": ...} to get the next page of the same search. First pages
+    come from the search cache when the same search ran recently.
+    """
     try:
         data = request.get_json()
-        query = data.get('query', '').strip()
-        language = data.get('language', '').strip() or None
-        sort = data.get('sort', 'indexed')  # Default to 'indexed' since that's what's selected in the form
-        per_page = min(int(data.get('per_page', 10)), 30)  # Limit to 30 results
-        file_filter_type = data.get('file_filter_type', '').strip()
-        file_extensions_raw = data.get('file_extensions')
-        file_extensions = file_extensions_raw.strip() if file_extensions_raw else ''
-        check_config_files = data.get('check_config_files', False)  # New parameter
-        
-        if not query:
-            return jsonify({'error': 'Query is required'}), 400
-        
-        # Build file extension filter
-        file_filter = None
-        if file_filter_type and file_extensions:
-            extensions = [ext.strip().lower() for ext in file_extensions.split(',') if ext.strip()]
-            if extensions:
-                file_filter = {
-                    'type': file_filter_type,
-                    'extensions': extensions
+        cursor_id = data.get('cursor')
+        cache_state = None
+        if cursor_id:
+            cursor = get_search_cursor(cursor_id)
+            if cursor is None:
+                return jsonify({'error': 'Search cursor expired, please search again'}), 410
+            page = cursor.next_page()
+        else:
+            query = data.get('query', '').strip()
+            language = data.get('language', '').strip() or None
+            sort = data.get('sort', 'indexed')  # Default to 'indexed' since that's what's selected in the form
+            per_page = min(int(data.get('per_page', 10)), 30)  # Limit to 30 results per page
+            file_filter_type = data.get('file_filter_type', '').strip()
+            file_extensions_raw = data.get('file_extensions')
+            file_extensions = file_extensions_raw.strip() if file_extensions_raw else ''
+            check_config_files = data.get('check_config_files', False)  # New parameter
+            
+            if not query:
+                return jsonify({'error': 'Query is required'}), 400
+            
+            # Build file extension filter
+            file_filter = None
+            if file_filter_type and file_extensions:
+                extensions = [ext.strip().lower() for ext in file_extensions.split(',') if ext.strip()]
+                if extensions:
+                    file_filter = {
+                        'type': file_filter_type,
+                        'extensions': extensions
+                    }
+            
+            search_args = {
+                'query': query,
+                'language': language,
+                'sort': sort,
+                'per_page': per_page,
+                'file_filter': file_filter,
+                'check_config_files': check_config_files
+            }
+            # Perform search (or take the enriched first page from the cache); the
+            # cursor only spends search requests once "load more" asks for a page
+            first_page, cache_state = search_cache.get_or_compute(
+                search_cache_key(**search_args),
+                lambda: run_upstream('search_code', **search_args)
+            )
+            cursor = searcher.search_pages(**search_args, enrich=lambda *args: run_upstream('enrich_search_items', *args))
+            page = None
+            if first_page is not None:
+                page = {
+                    'items': first_page.get('items', []),
+                    'page': 1,
+                    'total_count': first_page.get('total_count', 0),
+                    'has_more': cursor.skip_page(first_page)
                 }
         
-        # Perform search
-        results = searcher.search_code(
-            query=query,
-            language=language,
-            sort=sort,
-            per_page=per_page,
-            file_filter=file_filter,
-            check_config_files=check_config_files
-        )
+        if page is None:
+            drop_search_cursor(cursor_id)
+            return jsonify({'error': 'Search failed'}), 500
         
-        if results:
-            # Process results for JSON response
-            processed_results = []
-            for item in results.get('items', []):
-                processed_item = {
-                    'repository': item['repository']['full_name'],
-                    'file_path': item['path'],
-                    'file_name': item['path'].split('/')[-1] if '/' in item['path'] else item['path'],
-                    'language': item.get('language', 'Unknown'),
-                    'size': item.get('size', 'Unknown'),
-                    'updated_at': item.get('updated_at', 'Unknown'),
-                    'html_url': item['html_url'],
-                    'code_snippet': searcher._get_code_snippet_with_context(item),
-                    'is_old': False,
-                    'config_files': item.get('config_files', {})
-                }
-                
-                # Check if result is older than 1 month
-                if processed_item['updated_at'] and processed_item['updated_at'] != 'Unknown':
-                    try:
-                        from datetime import datetime, timedelta
-                        from dateutil import parser
-                        update_date = parser.parse(processed_item['updated_at'])
-                        now_utc = datetime.utcnow().replace(tzinfo=update_date.tzinfo)
-                        one_month_ago = now_utc - timedelta(days=30)
-                        processed_item['is_old'] = update_date < one_month_ago
-                    except:
-                        pass
-                
-                processed_results.append(processed_item)
-            
-            return jsonify({
-                'success': True,
-                'total_count': results.get('total_count', 0),
-                'results': processed_results
-            })
+        if page['has_more']:
+            cursor_id = cursor_id or store_search_cursor(cursor)
         else:
-            return jsonify({'error': 'Search failed'}), 500
+            drop_search_cursor(cursor_id)
+            cursor_id = None
+        
+        return json_response({
+            'success': True,
+            'total_count': page['total_count'],
+            'page': page['page'],
+            'cursor': cursor_id,
+            'cache': cache_state,
+            'results': [process_search_item(item) for item in page['items']]
+        })
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def search_cache_key(query, language, sort, per_page, file_filter, check_config_files):
+    """Key equivalent searches alike: whitespace, case of qualifiers and extension order do not matter"""
+    extensions = ()
+    if file_filter:
+        extensions = (file_filter['type'], tuple(sorted({ext.lstrip('.') for ext in file_filter['extensions']})))
+    return (
+        # Results depend on what the tokens can see
+        searcher.session.scheduler.pool_id,
+        ' '.join(query.split()),
+        (language or '').lower(),
+        sort,
+        per_page,
+        extensions,
+        bool(check_config_files)
+    )
+
+def process_search_item(item):
+    """Shape one search result for the JSON response"""
+    return SearchResult.from_item(item).to_json()
+
+def store_search_cursor(cursor):
+    """Keep a cursor for "load more" requests; returns its id"""
+    cursor_id = secrets.token_urlsafe(16)
+    with search_cursors_lock:
+        search_cursors[cursor_id] = cursor
+        expired = expire_search_cursors_locked()
+    for old_cursor in expired:
+        old_cursor.close()
+    return cursor_id
+
+def get_search_cursor(cursor_id):
+    with search_cursors_lock:
+        cursor = search_cursors.get(cursor_id)
+        if cursor is not None:
+            search_cursors.move_to_end(cursor_id)
+            cursor.last_used = time.time()
+        expired = expire_search_cursors_locked()
+    for old_cursor in expired:
+        old_cursor.close()
+    return cursor
+
+def drop_search_cursor(cursor_id):
+    with search_cursors_lock:
+        cursor = search_cursors.pop(cursor_id, None)
+    if cursor is not None:
+        cursor.close()
+
+def expire_search_cursors_locked():
+    """Forget idle cursors and the oldest ones over SEARCH_CURSOR_MAX; returns them for closing"""
+    # Least recently used cursors come first
+    expired = []
+    now = time.time()
+    while search_cursors:
+        cursor_id, cursor = next(iter(search_cursors.items()))
+        if now - cursor.last_used < SEARCH_CURSOR_TTL and len(search_cursors) <= SEARCH_CURSOR_MAX:
+            break
+        del search_cursors[cursor_id]
+        expired.append(cursor)
+    return expired
+
 @app.route('/api/commit-history', methods=['POST'])
 def commit_history():
     """API endpoint for commit history"""
@@ -106,9 +321,13 @@ def commit_history():
         repo_name = data.get('repository')
         file_path = data.get('file_path')
         max_commits = min(int(data.get('max_commits', 10)), 50)  # Limit to 50 commits
+        # 'content': first lines of the whole file at each commit; 'patch': only the lines each commit changed
+        mode = data.get('mode', 'content')
         
         if not repo_name or not file_path:
             return jsonify({'error': 'Repository and file path are required'}), 400
+        if mode not in ('content', 'patch'):
+            return jsonify({'error': "Mode must be 'content' or 'patch'"}), 400
         
         # Get commit history
         commits_url = f"{searcher.base_url}/repos/{repo_name}/commits?path={file_path}&per_page={max_commits}"
@@ -118,17 +337,32 @@ def commit_history():
             commits = response.json()
             processed_commits = []
             
+            commit_shas = [commit.get('sha', '') for commit in commits]
+            if mode == 'patch':
+                # Only each commit's diff of the file; full content is loaded on demand via /api/file-content
+                changes = run_upstream('get_file_changes_at_commits', repo_name, file_path, commit_shas)
+            else:
+                # Fetch the file at every commit in parallel; versions are cached by blob SHA
+                contents = run_upstream('get_file_contents_at_commits', repo_name, file_path, commit_shas)
+            
             for commit in commits:
                 processed_commit = {
                     'sha': commit.get('sha', '')[:8],
+                    'full_sha': commit.get('sha', ''),
                     'date': commit.get('commit', {}).get('author', {}).get('date', ''),
                     'message': commit.get('commit', {}).get('message', '').strip(),
                     'author': commit.get('commit', {}).get('author', {}).get('name', 'Unknown')
                 }
                 
+                if mode == 'patch':
+                    # None when the commit could not be fetched
+                    processed_commit['change'] = changes.get(commit.get('sha', ''))
+                    processed_commits.append(processed_commit)
+                    continue
+                
                 # Get file content for this commit
                 try:
-                    file_content = searcher._get_file_content_at_commit(repo_name, file_path, commit['sha'])
+                    file_content = contents.get(commit['sha'])
                     if file_content:
                         # Show first 20 lines
                         lines = file_content.split('\n')[:20]
@@ -145,6 +379,7 @@ def commit_history():
             
             return jsonify({
                 'success': True,
+                'mode': mode,
                 'commits': processed_commits
             })
         else:
@@ -160,13 +395,28 @@ def repository_tree():
         data = request.get_json()
         repo_name = data.get('repository')
         path = data.get('path', '')
+        ref = data.get('ref')
         
         if not repo_name:
             return jsonify({'error': 'Repository is required'}), 400
         
+        # Sliced from the cached full tree of the commit; with a full SHA as `ref` no request is made
+        commit_sha = resolve_tree_ref(repo_name, ref)
+        listings = get_tree_listings(repo_name, commit_sha) if commit_sha else None
+        if listings is not None:
+            items = listings.get(path.strip('/'))
+            if items is None:
+                return jsonify({'error': f'No directory {path} in {repo_name}'}), 404
+            return jsonify({
+                'success': True,
+                'tree': tree_listing_items(repo_name, commit_sha, items),
+                'path': path,
+                'sha': commit_sha
+            })
+        
         # Get repository contents using GitHub API
         url = f"{searcher.base_url}/repos/{repo_name}/contents/{path}"
-        response = searcher.session.get(url)
+        response = searcher.session.get(url, params={'ref': ref} if ref else None)
         
         if response.status_code == 200:
             contents = response.json()
@@ -198,45 +448,378 @@ def repository_tree():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/repository-tree/expand', methods=['POST'])
+def expand_repository_tree():
+    """API endpoint for every directory listing on the way to a path, in one response"""
+    try:
+        data = request.get_json()
+        repo_name = data.get('repository')
+        path = data.get('path', '').strip('/')
+        
+        if not repo_name:
+            return jsonify({'error': 'Repository is required'}), 400
+        
+        commit_sha = resolve_tree_ref(repo_name, data.get('ref'))
+        if not commit_sha:
+            return jsonify({'error': f'Could not resolve the default branch of {repo_name}'}), 500
+        listings = get_tree_listings(repo_name, commit_sha)
+        if listings is None:
+            return jsonify({'error': 'Failed to fetch repository tree'}), 500
+        
+        # The root, each ancestor of `path` and `path` itself when it is a directory
+        parts = path.split('/') if path else []
+        directories = [''] + ['/'.join(parts[:depth]) for depth in range(1, len(parts) + 1)]
+        return json_response({
+            'success': True,
+            'path': path,
+            'sha': commit_sha,
+            'listings': {
+                directory: tree_listing_items(repo_name, commit_sha, listings[directory])
+                for directory in directories if directory in listings
+            }
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def resolve_tree_ref(repository, ref):
+    """Full commit SHA of a branch, tag or SHA (the default branch when empty), or None"""
+    if ref and _COMMIT_SHA_RE.match(ref):
+        return ref
+    return searcher.resolve_commit_sha(repository, ref or 'HEAD')
+
+def get_tree_listings(repository, commit_sha):
+    """
+    Directory listings of a repository at a commit, built from one recursive tree
+    
+    Kept for the TREE_LISTINGS_MAX most recently browsed commits, so expanding
+    further directories is answered from memory.
+    
+    Returns:
+        dict: Directory path ('' for the root) -> (name, path, type, size)
+        tuples, directories first; None if the tree could not be fetched
+    """
+    key = (repository.lower(), commit_sha)
+    with tree_listings_lock:
+        listings = tree_listings.get(key)
+        if listings is not None:
+            tree_listings.move_to_end(key)
+            return listings
+    
+    entries = run_upstream('get_repository_tree', repository, commit_sha)
+    if entries is None:
+        return None
+    
+    listings = {'': []}
+    for entry in entries:
+        parent, _, name = entry['path'].rpartition('/')
+        if entry['type'] == 'tree':
+            listings.setdefault(entry['path'], [])
+        listings.setdefault(parent, []).append(
+            (name, entry['path'], 'dir' if entry['type'] == 'tree' else 'file', entry.get('size') or 0)
+        )
+    # Sort: directories first, then files
+    for items in listings.values():
+        items.sort(key=lambda item: (item[2] != 'dir', item[0].lower()))
+    
+    with tree_listings_lock:
+        tree_listings[key] = listings
+        while len(tree_listings) > TREE_LISTINGS_MAX:
+            tree_listings.popitem(last=False)
+    return listings
+
+def tree_listing_items(repository, commit_sha, items):
+    """Shape cached listing tuples like the contents API entries of /api/repository-tree"""
+    return [
+        {
+            'name': name,
+            'path': path,
+            'type': kind,
+            'size': size,
+            'download_url': f"https://raw.githubusercontent.com/{repository}/{commit_sha}/{path}" if kind == 'file' else None,
+            'html_url': f"https://github.com/{repository}/{'tree' if kind == 'dir' else 'blob'}/{commit_sha}/{path}"
+        }
+        for name, path, kind, size in items
+    ]
+
 @app.route('/api/file-content', methods=['POST'])
 def file_content():
-    """API endpoint for file content"""
+    """
+    API endpoint for file content
+    
+    The file is streamed from GitHub as raw bytes and on to the client in
+    chunks. Optional `lines` ([first, last], 1-based, last inclusive or null)
+    or `range` ([start, end] byte offsets) return part of it, stopping the
+    download once the part is complete. Binary files are answered with
+    `binary: true` and no content after their first chunk. With `raw: true`
+    the bytes are returned as they are instead of JSON, and an HTTP Range
+    header is honored: a byte range is answered with 206 and Content-Range,
+    a line selection with 200. Ranges starting past the end get a 416.
+    """
     try:
         data = request.get_json()
         repo_name = data.get('repository')
         file_path = data.get('file_path')
+        ref = data.get('ref')
+        raw = bool(data.get('raw'))
         
         if not repo_name or not file_path:
             return jsonify({'error': 'Repository and file path are required'}), 400
         
-        # Get file content using GitHub API
-        url = f"{searcher.base_url}/repos/{repo_name}/contents/{file_path}"
-        response = searcher.session.get(url)
+        try:
+            line_range = parse_range(data.get('lines'), minimum=1)
+            byte_range = parse_range(data.get('range'), minimum=0)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if raw and byte_range is None and request.range is not None and len(request.range.ranges) == 1:
+            start, stop = request.range.ranges[0]
+            byte_range = (start, stop - 1 if stop is not None else None)
         
-        if response.status_code == 200:
-            content_data = response.json()
-            
-            # Decode content if it's base64 encoded
-            import base64
-            content = content_data.get('content', '')
-            if content_data.get('encoding') == 'base64':
-                try:
-                    content = base64.b64decode(content).decode('utf-8')
-                except:
-                    content = 'Failed to decode content'
-            
+        source = open_file_source(repo_name, file_path, ref, byte_range)
+        if source is None:
+            where = f' at {ref}' if ref else ''
+            return jsonify({'error': f'Failed to fetch file content{where}'}), 500
+        chunks, size, offset, close = source
+        if byte_range is not None and size is not None and byte_range[0] >= size:
+            close()
+            response = jsonify({'error': f'Range starts past the end of the file ({size} bytes)'})
+            response.status_code = 416
+            response.headers['Content-Range'] = f'bytes */{size}'
+            return response
+        
+        # Binary files are told apart by their first chunk, before anything else is downloaded
+        first_chunk = next(chunks, b'')
+        binary = b'\0' in first_chunk[:BINARY_SNIFF_BYTES]
+        if binary and not raw:
+            close()
             return jsonify({
                 'success': True,
-                'content': content,
-                'size': content_data.get('size', 0),
-                'encoding': content_data.get('encoding', '')
+                'binary': True,
+                'content': None,
+                'size': size,
+                'encoding': None
             })
-        else:
-            return jsonify({'error': f'Failed to fetch file content: {response.status_code}'}), 500
+        
+        state = {}
+        pieces = slice_file_chunks(itertools.chain([first_chunk], chunks), offset, byte_range, line_range, state)
+        
+        if raw:
+            headers = {'X-File-Binary': str(binary).lower()}
+            if size is not None:
+                headers['X-File-Size'] = str(size)
+            status = 200
+            # Only a byte range is partial content; a line selection is answered with 200
+            if byte_range is not None and line_range is None:
+                status = 206
+                start = byte_range[0]
+                if size is not None:
+                    end = size - 1 if byte_range[1] is None else min(byte_range[1], size - 1)
+                    headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+                    headers['Content-Length'] = str(end - start + 1)
+                else:
+                    # Without the file size the end of the range is only known once it is read
+                    try:
+                        body = b''.join(pieces)
+                    finally:
+                        close()
+                    if not body:
+                        return jsonify({'error': 'Range starts past the end of the file'}), 416
+                    headers['Content-Range'] = f'bytes {start}-{start + len(body) - 1}/*'
+                    pieces, close = iter([body]), (lambda: None)
+            
+            def generate_raw():
+                try:
+                    yield from pieces
+                finally:
+                    close()
+            return Response(
+                stream_with_context(generate_raw()),
+                status=status,
+                mimetype='application/octet-stream' if binary else 'text/plain; charset=utf-8',
+                headers=headers
+            )
+        
+        def generate_json():
+            # The content is written out as it is decoded; the counts follow it
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            yield '{"success": true, "binary": false, "content": "'
+            try:
+                for piece in pieces:
+                    text = decoder.decode(piece)
+                    if text:
+                        yield json.dumps(text)[1:-1]
+                yield json.dumps(decoder.decode(b'', final=True))[1:-1]
+            except Exception as e:
+                # The 200 is already sent: close the document as a failure (the later "success" wins)
+                print(f"Error streaming {repo_name}/{file_path}: {e}")
+                yield '", "success": false, "error": ' + json.dumps(f'Download failed part way: {e}') + '}'
+                return
+            finally:
+                close()
+            whole_file = byte_range is None and line_range is None
+            summary = {
+                'size': size if size is not None or not whole_file else state['bytes'],
+                'encoding': 'utf-8',
+                'truncated': state['truncated']
+            }
+            if whole_file:
+                summary['total_lines'] = state['newlines'] + 1
+            if line_range is not None:
+                returned = state['newlines'] + (1 if state['partial_line'] else 0)
+                summary['lines'] = [line_range[0], line_range[0] + returned - 1] if returned else None
+            if byte_range is not None:
+                summary['range'] = [byte_range[0], byte_range[0] + state['bytes'] - 1]
+            yield '", ' + json.dumps(summary)[1:]
+        
+        return Response(stream_with_context(generate_json()), mimetype='application/json')
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def parse_range(value, minimum):
+    """Validate a [start, end] pair from a request (end inclusive, or None for "to the end")"""
+    if value is None:
+        return None
+    if not isinstance(value, (list, tuple)) or len(value) != 2:
+        raise ValueError('Ranges are [start, end] pairs')
+    start, end = value
+    if not isinstance(start, int) or start < minimum or (end is not None and (not isinstance(end, int) or end < start)):
+        raise ValueError(f'Invalid range {value}')
+    return start, end
+
+def open_file_source(repository, file_path, ref=None, byte_range=None):
+    """
+    Open the bytes of a file for streaming
+    
+    Files at a full commit SHA the blob cache holds are served from it;
+    anything else is streamed from GitHub with the raw media type, so ranged
+    and binary-sniffed requests stop downloading as early as they can.
+    
+    Returns:
+        tuple: (chunks, size, offset, close): an iterator of byte chunks that
+        starts at byte `offset`, the file size if known, and a function that
+        releases the connection; None if the file could not be fetched
+    """
+    if ref:
+        data = searcher.get_cached_file_bytes(repository, file_path, ref)
+        if data is not None:
+            return iter([data]), len(data), 0, lambda: None
+    
+    response = searcher.open_file(repository, file_path, ref, byte_range)
+    if response is None:
+        return None
+    if response.status_code == 416:
+        # The range starts past the end; all that is left to report is the size
+        response.close()
+        unsatisfied = re.match(r'bytes \*/(\d+)', response.headers.get('Content-Range', ''))
+        return iter(()), int(unsatisfied.group(1)) if unsatisfied else None, byte_range[0], lambda: None
+    offset, size = 0, None
+    content_range = re.match(r'bytes (\d+)-\d+/(\d+|\*)', response.headers.get('Content-Range', ''))
+    if response.status_code == 206 and content_range:
+        offset = int(content_range.group(1))
+        size = int(content_range.group(2)) if content_range.group(2) != '*' else None
+    elif 'Content-Length' in response.headers and 'Content-Encoding' not in response.headers:
+        size = int(response.headers['Content-Length'])
+    return iter(response.iter_content(FILE_CHUNK_SIZE)), size, offset, response.close
+
+def slice_file_chunks(chunks, offset, byte_range=None, line_range=None, state=None):
+    """
+    Yield the part of a file selected by a byte range or a line range
+    
+    `chunks` yields the file's bytes from byte `offset` on. Reading stops as
+    soon as the range is complete. `state`, if given, receives the bytes and
+    newlines yielded, whether the last line yielded is incomplete
+    ('partial_line') and whether the file goes on past the range ('truncated').
+    """
+    state = state if state is not None else {}
+    state.update(bytes=0, newlines=0, partial_line=False, truncated=False)
+    
+    def emit(piece):
+        state['bytes'] += len(piece)
+        state['newlines'] += piece.count(b'\n')
+        state['partial_line'] = not piece.endswith(b'\n')
+        return piece
+    
+    if line_range is not None:
+        first, last = line_range
+        line = 1
+        for chunk in chunks:
+            position = 0
+            while line < first:
+                newline = chunk.find(b'\n', position)
+                if newline < 0:
+                    position = len(chunk)
+                    break
+                line += 1
+                position = newline + 1
+            if line < first:
+                continue
+            if last is None:
+                if position < len(chunk):
+                    yield emit(chunk[position:])
+                continue
+            end = position
+            while line <= last:
+                newline = chunk.find(b'\n', end)
+                if newline < 0:
+                    end = len(chunk)
+                    break
+                end = newline + 1
+                line += 1
+            if end > position:
+                yield emit(chunk[position:end])
+            if line > last:
+                state['truncated'] = end < len(chunk) or next(chunks, None) is not None
+                return
+        return
+    
+    start, end = byte_range if byte_range is not None else (0, None)
+    position = offset
+    for chunk in chunks:
+        chunk_start = position
+        position += len(chunk)
+        if position <= start:
+            continue
+        piece = chunk[max(0, start - chunk_start):None if end is None else max(0, end + 1 - chunk_start)]
+        if piece:
+            yield emit(piece)
+        if end is not None and position > end:
+            state['truncated'] = position > end + 1 or next(chunks, None) is not None
+            return
+
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    """API endpoint for HTTP cache statistics"""
+    return jsonify({
+        'success': True,
+        'cache': searcher.cache_stats(),
+        'blob_cache': searcher.blob_cache_stats(),
+        'search_cache': search_cache.stats(),
+        'single_flight': single_flight_stats()
+    })
+
+def single_flight_stats():
+    """Requests that shared an identical in-flight upstream call, over both clients"""
+    stats = [searcher.single_flight_stats()]
+    if async_client is not None:
+        stats.append(async_client.single_flight.stats())
+    calls = sum(entry['calls'] for entry in stats)
+    shared = sum(entry['shared'] for entry in stats)
+    return {
+        'calls': calls,
+        'shared': shared,
+        'in_flight': sum(entry['in_flight'] for entry in stats),
+        'saved_ratio': round(shared / (calls + shared), 4) if calls + shared else 0.0
+    }
+
+@app.route('/api/rate-limit', methods=['GET'])
+def rate_limit():
+    """API endpoint for the known GitHub rate-limit budgets"""
+    return jsonify({
+        'success': True,
+        'rate_limit': searcher.rate_limit_status()
+    })
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_codebase():
     """API endpoint for codebase analysis"""
@@ -249,27 +832,259 @@ def analyze_codebase():
         if not repository or not search_string:
             return jsonify({'error': 'Repository and search string are required'}), 400
         
-        # Perform codebase analysis
-        analysis_result = perform_codebase_analysis(repository, search_string, file_path)
+        result_format = data.get('format', 'compact')
+        if result_format not in ANALYSIS_FORMATS:
+            return jsonify({'error': "Format must be 'compact' or 'full'"}), 400
         
-        return jsonify({
+        try:
+            matcher = matcher_from_request(data, search_string)
+        except re.error as e:
+            return jsonify({'error': f'Invalid regular expression: {e}'}), 400
+        
+        # Registered as a job so an identical analysis already underway is shared;
+        # a new one runs in this request's thread rather than queueing for the
+        # background pool
+        job, _ = submit_analysis_job(repository, search_string, file_path, data, matcher, inline=True)
+        if job is None:
+            return jsonify({'error': f'Could not resolve the default branch of {repository}'}), 502
+        if job.status != 'done':
+            return jsonify({'error': job.error or f'Analysis {job.status}'}), 500
+        
+        return json_response({
             'success': True,
-            'analysis': analysis_result
+            'analysis': format_analysis(job.result, result_format)
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def perform_codebase_analysis(repository, search_string, original_file_path=None):
-    """Perform comprehensive codebase analysis"""
+@app.route('/api/jobs/analyze', methods=['POST'])
+def submit_analysis():
+    """Start a codebase analysis in the background and return its job right away
+
+    Takes the same body as /api/analyze. Poll GET /api/jobs/<id> for progress
+    and, once its status is 'done', the analysis.
+    """
+    try:
+        data = request.get_json()
+        repository = data.get('repository')
+        file_path = data.get('file_path')
+        search_string = data.get('search_string')
+        
+        if not repository or not search_string:
+            return jsonify({'error': 'Repository and search string are required'}), 400
+        
+        try:
+            matcher = matcher_from_request(data, search_string)
+        except re.error as e:
+            return jsonify({'error': f'Invalid regular expression: {e}'}), 400
+        
+        job, created = submit_analysis_job(repository, search_string, file_path, data, matcher)
+        if job is None:
+            return jsonify({'error': f'Could not resolve the default branch of {repository}'}), 502
+        
+        return jsonify({
+            'success': True,
+            'created': created,
+            'job': job.snapshot()
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """API endpoint listing background jobs (without results)"""
+    return jsonify({
+        'success': True,
+        'jobs': analysis_jobs.jobs(),
+        'stats': analysis_jobs.stats()
+    })
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """API endpoint for the status, progress and (once done) result of a job
+
+    The analysis is compact unless `?format=full` asks for the full one.
+    """
+    result_format = request.args.get('format', 'compact')
+    if result_format not in ANALYSIS_FORMATS:
+        return jsonify({'error': "Format must be 'compact' or 'full'"}), 400
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    snapshot = job.snapshot(include_result=True)
+    if snapshot.get('result') is not None:
+        snapshot['result'] = format_analysis(snapshot['result'], result_format)
+    return json_response({'success': True, 'job': snapshot})
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """API endpoint to cancel a queued or running job"""
+    job = analysis_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify({'success': True, 'job': job.snapshot()})
+
+def submit_analysis_job(repository, search_string, file_path, data, matcher, inline=False):
+    """
+    Submit an analysis job, or attach to the one already running for the same work
+    
+    With `inline`, a new job runs in the calling thread, and either way the
+    call returns once the job has finished.
+    
+    Returns:
+        tuple: (Job, created), or (None, False) if the commit could not be resolved
+    """
+    # The commit is part of the key: a push to the default branch is new work
+    commit_sha = searcher.resolve_commit_sha(repository)
+    if not commit_sha:
+        return None, False
+    
+    key = (
+        'analyze',
+        repository.lower(),
+        commit_sha,
+        search_string,
+        file_path or '',
+        matcher.case_sensitive,
+        matcher.whole_word,
+        matcher.regex
+    )
+    submit = analysis_jobs.run if inline else analysis_jobs.submit
+    return submit(
+        key, 'analyze', run_analysis_job, repository, search_string, file_path, matcher, commit_sha
+    )
+
+def run_analysis_job(job, repository, search_string, file_path, matcher, commit_sha):
+    # Its requests queue behind interactive searches
+    with searcher.session.priority(PRIORITY_BACKGROUND):
+        return perform_codebase_analysis(
+            repository, search_string, file_path, matcher=matcher, commit_sha=commit_sha, progress=job.update_progress
+        )
+
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_codebase_stream():
+    """API endpoint for codebase analysis, streamed as newline-delimited JSON events
+
+    File events carry compact file analyses (see compact_file_analysis) unless
+    the body asks for `"format": "full"`.
+    """
+    data = request.get_json()
+    repository = data.get('repository')
+    file_path = data.get('file_path')
+    search_string = data.get('search_string')
+    
+    if not repository or not search_string:
+        return jsonify({'error': 'Repository and search string are required'}), 400
+    
+    result_format = data.get('format', 'compact')
+    if result_format not in ANALYSIS_FORMATS:
+        return jsonify({'error': "Format must be 'compact' or 'full'"}), 400
+    
+    try:
+        matcher = matcher_from_request(data, search_string)
+    except re.error as e:
+        return jsonify({'error': f'Invalid regular expression: {e}'}), 400
+    
+    def generate():
+        try:
+            with searcher.session.priority(PRIORITY_BACKGROUND):
+                for event in iter_codebase_analysis(repository, search_string, file_path, matcher=matcher):
+                    if event['event'] == 'file' and result_format == 'compact':
+                        event = dict(event, analysis=compact_file_analysis(event['analysis']))
+                    yield dumps(event) + b'\n'
+        except Exception as e:
+            print(f"Analysis error: {e}")
+            yield dumps({'event': 'error', 'error': str(e)}) + b'\n'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def matcher_from_request(data, search_string):
+    """Build the line matcher for the match options of an analysis request"""
+    return get_matcher(
+        search_string,
+        case_sensitive=bool(data.get('case_sensitive', False)),
+        whole_word=bool(data.get('whole_word', False)),
+        regex=bool(data.get('regex', False))
+    )
+
+def format_analysis(analysis, result_format):
+    return compact_analysis(analysis) if result_format == 'compact' else analysis
+
+def compact_analysis(analysis):
+    """
+    Compact form of an analysis from perform_codebase_analysis
+    
+    Every reference appears once, in 'references', pointing at its file by
+    index into 'files'. The renames, declarations and usages lists hold
+    indexes into 'references', as relationships already do, and each
+    file_analysis entry gives the [start, stop) slice of its references and
+    its line count instead of the file's lines.
+    """
+    files = []
+    file_analysis = {}
+    start = 0
+    for file_path, file_entry in analysis['file_analysis'].items():
+        files.append(file_path)
+        stop = start + len(file_entry['references'])
+        file_analysis[file_path] = {'references': [start, stop], 'line_count': len(file_entry['lines'])}
+        start = stop
+    
+    file_ids = {file_path: i for i, file_path in enumerate(files)}
+    ref_ids = {id(ref): i for i, ref in enumerate(analysis['references'])}
+    return {
+        'format': 'compact',
+        'search_string': analysis['search_string'],
+        'repository': analysis['repository'],
+        'commit_sha': analysis['commit_sha'],
+        'files': files,
+        'references': [compact_reference(ref, file=file_ids[ref['file_path']]) for ref in analysis['references']],
+        'renames': [ref_ids[id(ref)] for ref in analysis['renames']],
+        'declarations': [ref_ids[id(ref)] for ref in analysis['declarations']],
+        'usages': [ref_ids[id(ref)] for ref in analysis['usages']],
+        'relationships': analysis['relationships'],
+        'relationship_stats': analysis['relationship_stats'],
+        'file_analysis': file_analysis,
+        'uml_data': analysis['uml_data']
+    }
+
+def compact_file_analysis(file_analysis):
+    """Compact form of one file's analysis: its type lists index its references, and no lines"""
+    ref_ids = {id(ref): i for i, ref in enumerate(file_analysis['references'])}
+    return {
+        'references': [compact_reference(ref) for ref in file_analysis['references']],
+        'renames': [ref_ids[id(ref)] for ref in file_analysis['renames']],
+        'declarations': [ref_ids[id(ref)] for ref in file_analysis['declarations']],
+        'usages': [ref_ids[id(ref)] for ref in file_analysis['usages']],
+        'line_count': len(file_analysis['lines'])
+    }
+
+def compact_reference(ref, **fields):
+    """A reference without what every reference repeats (its file, has_reference and context)"""
+    fields.update(line_num=ref['line_num'], line=ref['line'], type=ref['type'], entity_name=ref['entity_name'])
+    return fields
+
+def perform_codebase_analysis(repository, search_string, original_file_path=None, matcher=None, commit_sha=None, progress=None, archive_max_bytes=None):
+    """Perform comprehensive codebase analysis (see iter_codebase_analysis for the arguments)
+
+    Raises when the analysis cannot run or fails part way, so a job running
+    it ends failed instead of keeping an empty or partial result.
+    """
     analysis = {
         'search_string': search_string,
         'repository': repository,
+        'commit_sha': None,
         'references': [],
         'renames': [],
         'declarations': [],
         'usages': [],
         'relationships': [],
+        'relationship_stats': {},
         'file_analysis': {},
         'uml_data': {
             'classes': [],
@@ -280,66 +1095,317 @@ def perform_codebase_analysis(repository, search_string, original_file_path=None
     }
     
     try:
-        # Get all files in the repository
-        all_files = get_all_repository_files(repository)
-        
-        # Analyze each file for references
-        for file_info in all_files:
-            if should_analyze_file(file_info['path']):
-                file_analysis = analyze_file_for_references(
-                    repository, 
-                    file_info['path'], 
-                    search_string,
-                    original_file_path
-                )
-                
-                if file_analysis['has_references']:
-                    analysis['file_analysis'][file_info['path']] = file_analysis
-                    analysis['references'].extend(file_analysis['references'])
-                    analysis['renames'].extend(file_analysis['renames'])
-                    analysis['declarations'].extend(file_analysis['declarations'])
-                    analysis['usages'].extend(file_analysis['usages'])
+        file_analyses = []
+        for event in iter_codebase_analysis(repository, search_string, original_file_path, matcher, commit_sha, progress, archive_max_bytes):
+            if event['event'] == 'start':
+                analysis['commit_sha'] = event['commit_sha']
+            elif event['event'] == 'file':
+                file_analyses.append((event['order'], event['file_path'], event['analysis']))
+            elif event['event'] == 'relationships':
+                analysis['relationships'] = event['relationships']
+                analysis['relationship_stats'] = event['stats']
+            elif event['event'] == 'uml':
+                analysis['uml_data'] = event['uml_data']
+            elif event['event'] == 'error':
+                raise RuntimeError(event['error'])
         
-        # Build relationships and UML data
-        analysis['relationships'] = build_relationships(analysis)
-        analysis['uml_data'] = build_uml_data(analysis)
+        # Collect results in repository order so every fetch mode gives the same output
+        file_analyses.sort(key=lambda entry: entry[0])
+        for _, file_path, file_analysis in file_analyses:
+            analysis['file_analysis'][file_path] = file_analysis
+            analysis['references'].extend(file_analysis['references'])
+            analysis['renames'].extend(file_analysis['renames'])
+            analysis['declarations'].extend(file_analysis['declarations'])
+            analysis['usages'].extend(file_analysis['usages'])
         
         return analysis
         
     except Exception as e:
         print(f"Analysis error: {e}")
-        return analysis
+        raise
 
-def get_all_repository_files(repository):
-    """Get all files in the repository recursively"""
+def iter_codebase_analysis(repository, search_string, original_file_path=None, matcher=None, commit_sha=None, progress=None, archive_max_bytes=None):
+    """
+    Run a codebase analysis as a stream of events
+    
+    The analysis runs at `commit_sha` (default: the head of the default
+    branch). `progress`, if given, is called with the keyword counters
+    files_listed, files_fetched, bytes_fetched and files_scanned as they
+    change; an exception it raises (e.g. JobCancelled) stops the analysis.
+    The final counters are also recorded in the analysis metrics.
+    `archive_max_bytes` overrides ARCHIVE_MAX_BYTES for this analysis.
+    
+    Yields dicts whose 'event' key is one of:
+        start          commit_sha and the number of files to scan
+        file           analysis of one file with references, as soon as it is scanned
+        progress       number of files scanned so far
+        relationships  relationships between references, by index in repository order
+        uml            UML diagram data
+        done           totals
+        error          the analysis could not run
+    
+    Only the reference lists needed for the final summaries are kept in
+    memory. When the commit is not indexed yet, the bodies read for the scan
+    are parked in a temporary file (TrigramIndexSpill), from which the index
+    is built once the scan completes; an indexed commit fetches only its
+    candidate files again, through the blob cache.
+    """
+    # Pin the analysis to one commit so the listing and contents agree
+    commit_sha = commit_sha or searcher.resolve_commit_sha(repository)
+    if not commit_sha:
+        yield {'event': 'error', 'error': f'Could not resolve the default branch of {repository}'}
+        return
+    
+    counts = {'files_listed': 0, 'files_fetched': 0, 'bytes_fetched': 0, 'files_scanned': 0}
+    
+    def report(**changes):
+        counts.update(changes)
+        if progress is not None:
+            progress(**changes)
+    
+    spill = None
+    index = analysis_index.get(repository, commit_sha) if analysis_index is not None else None
+    if index is not None:
+        # Answer from the commit's index: only candidate files are fetched and candidate lines re-checked
+        ordered_paths = index.paths
+        file_analyses = iter_indexed_file_analyses(
+            index, search_string, original_file_path, matcher, report, archive_max_bytes
+        )
+    else:
+        # Get all files in the repository
+        all_files = get_all_repository_files(repository, commit_sha)
+        if all_files is None:
+            # Not an empty repository: an empty answer here would be kept and shared as "no references"
+            yield {'event': 'error', 'error': f'Could not list the files of {repository}@{commit_sha}'}
+            return
+        candidates = [file_info for file_info in all_files if should_analyze_file(file_info['path'])]
+        ordered_paths = [file_info['path'] for file_info in candidates]
+        if analysis_index is not None:
+            spill = TrigramIndexSpill()
+        file_analyses = iter_fetched_file_analyses(
+            repository, commit_sha, candidates, all_files, search_string, original_file_path, spill, matcher, report,
+            archive_max_bytes
+        )
+    
+    scanned_all = False
+    try:
+        report(**dict(counts, files_listed=len(ordered_paths)))
+        
+        yield {
+            'event': 'start',
+            'repository': repository,
+            'search_string': search_string,
+            'commit_sha': commit_sha,
+            'file_count': len(ordered_paths),
+            'indexed': index is not None
+        }
+        
+        # Analyze each file for references, in whatever order the contents arrive
+        order = {file_path: i for i, file_path in enumerate(ordered_paths)}
+        referenced = []
+        files_scanned = 0
+        reference_count = 0
+        for file_path, file_analysis in file_analyses:
+            files_scanned += 1
+            report(files_scanned=files_scanned)
+            if file_analysis['has_references']:
+                # The summaries only need the references, not the file body
+                referenced.append((
+                    order[file_path],
+                    file_analysis['references'],
+                    file_analysis['renames'],
+                    file_analysis['declarations'],
+                    file_analysis['usages']
+                ))
+                reference_count += len(file_analysis['references'])
+                yield {
+                    'event': 'file',
+                    'file_path': file_path,
+                    'order': order[file_path],
+                    'files_scanned': files_scanned,
+                    'analysis': file_analysis
+                }
+            elif files_scanned % PROGRESS_INTERVAL == 0:
+                yield {'event': 'progress', 'files_scanned': files_scanned}
+        scanned_all = True
+    finally:
+        # The index build takes over the spilled bodies; a cancelled or abandoned scan drops them
+        if spill is not None:
+            if scanned_all:
+                build_index_in_background(repository, commit_sha, ordered_paths, spill)
+            else:
+                spill.close()
+    
+    # Build relationships and UML data over the references in repository order
+    referenced.sort(key=lambda entry: entry[0])
+    summary = {'references': [], 'renames': [], 'declarations': [], 'usages': []}
+    for _, references, renames, declarations, usages in referenced:
+        summary['references'].extend(references)
+        summary['renames'].extend(renames)
+        summary['declarations'].extend(declarations)
+        summary['usages'].extend(usages)
+    summary['relationships'], relationship_stats = build_relationships(summary)
+    yield {'event': 'relationships', 'relationships': summary['relationships'], 'stats': relationship_stats}
+    yield {'event': 'uml', 'uml_data': build_uml_data(summary)}
+    metrics.observe_analysis(**counts)
+    yield {
+        'event': 'done',
+        'files_scanned': files_scanned,
+        'files_with_references': len(referenced),
+        'references': reference_count
+    }
+
+def get_all_repository_files(repository, commit_sha=None):
+    """Get all files in the repository at a commit (the default branch when omitted), or None if they could not be listed"""
+    if commit_sha is None:
+        commit_sha = searcher.resolve_commit_sha(repository)
+        if not commit_sha:
+            return None
+    
+    # One recursive git-trees request, cached per commit SHA by the searcher
+    tree = searcher.get_repository_tree(repository, commit_sha)
+    if tree is None:
+        return None
+    
     files = []
+    for entry in tree:
+        if entry['type'] == 'blob':
+            files.append({
+                'path': entry['path'],
+                'name': entry['path'].split('/')[-1],
+                'size': entry['size'],
+                'sha': entry['sha'],
+                'download_url': f"https://raw.githubusercontent.com/{repository}/{commit_sha}/{entry['path']}"
+            })
+    return files
+
+def iter_fetched_file_analyses(repository, commit_sha, files, all_files, search_string, original_file_path=None, spill=None, matcher=None, progress=None, archive_max_bytes=None):
+    """Yield (path, file analysis) for `files` as their contents are downloaded
+
+    When `spill` (a TrigramIndexSpill) is given, each downloaded body is also parked in it.
+    `progress` is called with files_fetched and bytes_fetched as bodies arrive.
+    """
+    file_infos = {file_info['path']: file_info for file_info in files}
+    files_fetched = 0
+    bytes_fetched = 0
+    contents = iter_file_contents(repository, commit_sha, files, all_files, archive_max_bytes, cache_archive_blobs=spill is not None)
+    for file_path, content, size in contents:
+        files_fetched += 1
+        bytes_fetched += size
+        if progress is not None:
+            progress(files_fetched=files_fetched, bytes_fetched=bytes_fetched)
+        if spill is not None:
+            file_info = file_infos[file_path]
+            spill.add(file_path, file_info.get('sha'), file_info.get('size'), content)
+        yield file_path, analyze_file_for_references(
+            repository,
+            file_path,
+            search_string,
+            original_file_path,
+            ref=commit_sha,
+            content=content,
+            matcher=matcher
+        )
+
+def iter_indexed_file_analyses(index, search_string, original_file_path=None, matcher=None, progress=None, archive_max_bytes=None):
+    """Yield (path, file analysis) for the candidate files of an indexed commit; same result as a full scan
+
+    The index holds no file bodies: candidate files are fetched again by
+    their blob SHA, which the blob cache usually answers without a request.
+    `progress` is called with files_fetched and bytes_fetched as bodies arrive.
+    """
+    matcher = matcher or get_matcher(search_string)
+    # The index narrows down literal searches only; regular expressions scan every indexed line
+    candidates = index.candidate_lines(search_string) if matcher.is_literal else None
+    files = [
+        index.file_info(file_path) for file_path in index.paths
+        if candidates is None or file_path in candidates
+    ]
+    if searcher.blob_cache is not None:
+        # The bodies went to the blob cache when the index was built; reading them by SHA beats another tarball
+        archive_max_bytes = -1
+    files_fetched = 0
+    bytes_fetched = 0
+    for file_path, content, size in iter_file_contents(index.repository, index.commit_sha, files, archive_max_bytes=archive_max_bytes):
+        files_fetched += 1
+        bytes_fetched += size
+        if progress is not None:
+            progress(files_fetched=files_fetched, bytes_fetched=bytes_fetched)
+        yield file_path, analyze_file_for_references(
+            index.repository,
+            file_path,
+            search_string,
+            original_file_path,
+            ref=index.commit_sha,
+            content=content,
+            line_numbers=None if candidates is None else candidates[file_path],
+            matcher=matcher
+        )
+
+def build_index_in_background(repository, commit_sha, paths, spill):
+    """Build and persist the trigram index of a fully fetched commit without delaying the response
+
+    Takes ownership of `spill` (the TrigramIndexSpill of the scan) and closes it.
+    """
+    # An index missing files that failed to download would give incomplete answers later
+    if not spill.complete(paths):
+        spill.close()
+        return
     
-    def get_files_recursive(path=''):
+    def build():
         try:
-            url = f"{searcher.base_url}/repos/{repository}/contents/{path}"
-            response = searcher.session.get(url)
-            
-            if response.status_code == 200:
-                contents = response.json()
-                
-                for item in contents:
-                    if item['type'] == 'file':
-                        files.append({
-                            'path': item['path'],
-                            'name': item['name'],
-                            'size': item.get('size', 0),
-                            'download_url': item.get('download_url', '')
-                        })
-                    elif item['type'] == 'dir':
-                        get_files_recursive(item['path'])
-                        
-                time.sleep(0.1)  # Rate limiting
-                
+            analysis_index.put(TrigramIndex.build(repository, commit_sha, spill.files(paths)))
         except Exception as e:
-            print(f"Error getting files from {path}: {e}")
+            print(f"Error building index for {repository}@{commit_sha}: {e}")
+        finally:
+            spill.close()
     
-    get_files_recursive()
-    return files
+    threading.Thread(target=build, name='index-build', daemon=True).start()
+
+def iter_file_contents(repository, commit_sha, files, all_files=None, archive_max_bytes=None, cache_archive_blobs=False):
+    """
+    Yield (path, content, downloaded bytes) for each of `files` at a commit
+    
+    Small repositories (up to `archive_max_bytes`, default ARCHIVE_MAX_BYTES)
+    are read from one streamed tarball; anything the archive did not deliver
+    (or every file, for larger repositories) is fetched through the contents
+    API, FILE_FETCH_CHUNK files at a time, by the blob SHAs of `files` where
+    they have one. Files read from the archive are only added to the blob
+    cache with `cache_archive_blobs` (for the trigram index to find them again).
+    """
+    if archive_max_bytes is None:
+        archive_max_bytes = ARCHIVE_MAX_BYTES
+    remaining = {file_info['path'] for file_info in files}
+    repository_bytes = sum(file_info.get('size') or 0 for file_info in (all_files or files))
+    
+    if len(remaining) >= ARCHIVE_MIN_FILES and repository_bytes <= archive_max_bytes:
+        try:
+            for file_path, data in searcher.iter_archive_files(repository, commit_sha, remaining):
+                remaining.discard(file_path)
+                if cache_archive_blobs and searcher.blob_cache is not None:
+                    searcher.blob_cache.put(repository, commit_sha, file_path, data)
+                yield file_path, decode_file_content(data), len(data)
+        except Exception as e:
+            print(f"Archive download failed for {repository}, fetching files individually: {e}")
+    
+    pending = [file_info['path'] for file_info in files if file_info['path'] in remaining]
+    blob_shas = {file_info['path']: file_info['sha'] for file_info in files if file_info.get('sha')}
+    for start in range(0, len(pending), FILE_FETCH_CHUNK):
+        chunk = pending[start:start + FILE_FETCH_CHUNK]
+        contents = run_upstream('get_files_at_commit', repository, chunk, commit_sha, blob_shas)
+        for file_path in chunk:
+            data = contents.get(file_path)
+            if data is None:
+                yield file_path, None, 0
+            else:
+                yield file_path, decode_file_content(data), len(data)
+
+def decode_file_content(data):
+    """Decode raw file bytes as UTF-8; files that are not UTF-8 text count as empty"""
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        return ''
 
 def should_analyze_file(file_path):
     """Determine if a file should be analyzed based on its extension"""
@@ -353,8 +1419,14 @@ def should_analyze_file(file_path):
     file_ext = '.' + file_path.split('.')[-1].lower() if '.' in file_path else ''
     return file_ext in code_extensions
 
-def analyze_file_for_references(repository, file_path, search_string, original_file_path=None):
-    """Analyze a single file for references to the search string"""
+def analyze_file_for_references(repository, file_path, search_string, original_file_path=None, ref=None, content=None, line_numbers=None, matcher=None):
+    """Analyze a single file for references to the search string
+
+    The file is fetched through the contents API unless `content` is given.
+    `line_numbers` restricts the scan to known candidate lines (1-based);
+    otherwise the whole content is scanned once with the compiled matcher.
+    """
+    matcher = matcher or get_matcher(search_string)
     analysis = {
         'file_path': file_path,
         'has_references': False,
@@ -367,16 +1439,20 @@ def analyze_file_for_references(repository, file_path, search_string, original_f
     
     try:
         # Get file content
-        content = get_file_content(repository, file_path)
+        if content is None:
+            content = get_file_content(repository, file_path, ref)
         if not content:
             return analysis
         
         lines = content.split('\n')
         analysis['lines'] = lines
         
-        # Analyze each line
-        for line_num, line in enumerate(lines, 1):
-            line_analysis = analyze_line(line, line_num, search_string, file_path)
+        # Analyze only the lines that contain a match
+        if line_numbers is None:
+            line_numbers = matcher.matching_line_numbers(content)
+        for line_num in line_numbers:
+            line = lines[line_num - 1]
+            line_analysis = analyze_line(line, line_num, search_string, file_path, matcher)
             
             if line_analysis['has_reference']:
                 analysis['has_references'] = True
@@ -396,8 +1472,9 @@ def analyze_file_for_references(repository, file_path, search_string, original_f
         print(f"Error analyzing file {file_path}: {e}")
         return analysis
 
-def analyze_line(line, line_num, search_string, file_path):
+def analyze_line(line, line_num, search_string, file_path, matcher=None):
     """Analyze a single line for references to the search string"""
+    matcher = matcher or get_matcher(search_string)
     analysis = {
         'line_num': line_num,
         'line': line,
@@ -409,31 +1486,12 @@ def analyze_line(line, line_num, search_string, file_path):
     }
     
     # Check if the search string appears in this line
-    if search_string.lower() in line.lower():
+    if matcher.matches(line):
         analysis['has_reference'] = True
         
-        # Determine the type of reference
-        line_lower = line.lower()
-        
-        # Check for declarations (function, class, variable declarations)
-        if any(keyword in line_lower for keyword in ['def ', 'class ', 'function ', 'var ', 'let ', 'const ', 'public ', 'private ', 'protected ']):
-            analysis['type'] = 'declaration'
-            analysis['entity_name'] = extract_entity_name(line, search_string)
-            
-        # Check for renames/assignments
-        elif any(keyword in line_lower for keyword in ['=', ':=', '->', '=>', 'as ', 'alias ']):
-            analysis['type'] = 'rename'
-            analysis['entity_name'] = extract_entity_name(line, search_string)
-            
-        # Check for imports
-        elif any(keyword in line_lower for keyword in ['import ', 'from ', 'require ', 'include ']):
-            analysis['type'] = 'import'
-            analysis['entity_name'] = extract_entity_name(line, search_string)
-            
-        # Default to usage
-        else:
-            analysis['type'] = 'usage'
-            analysis['entity_name'] = extract_entity_name(line, search_string)
+        # Determine the type of reference: declaration, rename, import or usage
+        analysis['type'] = classify_line(line)
+        analysis['entity_name'] = matcher.extract_entity_name(line)
         
         # Extract context (surrounding code)
         analysis['context'] = extract_context(line, line_num, file_path)
@@ -442,26 +1500,8 @@ def analyze_line(line, line_num, search_string, file_path):
 
 def extract_entity_name(line, search_string):
     """Extract the entity name from a line"""
-    # Simple extraction - look for the search string and surrounding context
-    import re
-    
-    # Try to find function/class names
-    patterns = [
-        r'def\s+(\w+)',  # Python functions
-        r'class\s+(\w+)',  # Classes
-        r'function\s+(\w+)',  # JavaScript functions
-        r'(\w+)\s*=',  # Variable assignments
-        r'(\w+)\s*:',  # Type annotations
-        r'(\w+)\s*\(',  # Function calls
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, line, re.IGNORECASE)
-        if match and search_string.lower() in match.group(1).lower():
-            return match.group(1)
-    
-    # Fallback: return the search string itself
-    return search_string
+    # Precompiled function/class/assignment patterns live in code_matcher
+    return get_matcher(search_string).extract_entity_name(line)
 
 def extract_context(line, line_num, file_path):
     """Extract context around the line"""
@@ -472,64 +1512,89 @@ def extract_context(line, line_num, file_path):
         'file_path': file_path
     }
 
-def get_file_content(repository, file_path):
-    """Get the content of a file"""
+def get_file_content(repository, file_path, ref=None):
+    """Get the content of a file, optionally at a specific commit"""
     try:
-        url = f"{searcher.base_url}/repos/{repository}/contents/{file_path}"
-        response = searcher.session.get(url)
-        
-        if response.status_code == 200:
-            content_data = response.json()
-            
-            # Decode content if it's base64 encoded
-            import base64
-            content = content_data.get('content', '')
-            if content_data.get('encoding') == 'base64':
-                try:
-                    content = base64.b64decode(content).decode('utf-8')
-                except:
-                    content = ''
-            
-            return content
-        else:
+        response = searcher.open_file(repository, file_path, ref)
+        if response is None:
             return None
+        with response:
+            return decode_file_content(response.content)
             
     except Exception as e:
         print(f"Error getting file content for {file_path}: {e}")
         return None
 
-def build_relationships(analysis):
-    """Build relationships between different references"""
+def build_relationships(analysis, max_relationships=None):
+    """
+    Build relationships between different references
+    
+    References are grouped by entity name so each declaration only meets the
+    usages it can match. Relationships point at their endpoints by index into
+    analysis['references'] instead of embedding the reference dicts.
+    
+    Returns:
+        tuple: (relationships, stats) where stats counts the edges dropped per
+        type once `max_relationships` (default MAX_RELATIONSHIPS) is reached
+    """
+    if max_relationships is None:
+        max_relationships = MAX_RELATIONSHIPS
+    
     relationships = []
+    truncated = {'declaration_usage': 0, 'rename': 0}
     
-    # Find relationships between declarations and usages
+    ref_ids = {id(ref): i for i, ref in enumerate(analysis['references'])}
     declarations = analysis['declarations']
     usages = analysis['usages']
     renames = analysis['renames']
     
-    # Map declarations to usages
+    declarations_by_name = {}
     for decl in declarations:
-        for usage in usages:
-            if decl['entity_name'] == usage['entity_name']:
-                relationships.append({
-                    'type': 'declaration_usage',
-                    'from': decl,
-                    'to': usage,
-                    'strength': 'strong'
-                })
-    
-    # Map renames to original entities
+        declarations_by_name.setdefault(decl['entity_name'], []).append(decl)
+    usages_by_name = {}
+    for usage in usages:
+        usages_by_name.setdefault(usage['entity_name'], []).append(usage)
+    
+    # Map declarations to usages of the same entity
+    for decl in declarations:
+        matches = usages_by_name.get(decl['entity_name'], [])
+        room = max(0, max_relationships - len(relationships))
+        for usage in matches[:room]:
+            relationships.append({
+                'type': 'declaration_usage',
+                'from': ref_ids[id(decl)],
+                'to': ref_ids[id(usage)],
+                'strength': 'strong'
+            })
+        truncated['declaration_usage'] += max(0, len(matches) - room)
+    
+    # Map renames to original entities (every declaration of a different entity)
     for rename in renames:
+        matching = len(declarations) - len(declarations_by_name.get(rename['entity_name'], []))
+        room = min(matching, max(0, max_relationships - len(relationships)))
+        truncated['rename'] += matching - room
+        if not room:
+            continue
+        # In declaration order, as the nested loops produced them, until the room is used up
         for decl in declarations:
-            if rename['entity_name'] != decl['entity_name']:
-                relationships.append({
-                    'type': 'rename',
-                    'from': decl,
-                    'to': rename,
-                    'strength': 'medium'
-                })
+            if decl['entity_name'] == rename['entity_name']:
+                continue
+            relationships.append({
+                'type': 'rename',
+                'from': ref_ids[id(decl)],
+                'to': ref_ids[id(rename)],
+                'strength': 'medium'
+            })
+            room -= 1
+            if not room:
+                break
     
-    return relationships
+    stats = {
+        'total': len(relationships) + sum(truncated.values()),
+        'returned': len(relationships),
+        'truncated': truncated
+    }
+    return relationships, stats
 
 def build_uml_data(analysis):
     """Build UML diagram data from analysis results"""
@@ -564,14 +1629,22 @@ def build_uml_data(analysis):
                 'type': 'property'
             })
     
-    # Build relationships for UML
+    # Build relationships for UML, one per pair of entities
+    references = analysis['references']
+    uml_relationships = {}
     for rel in analysis['relationships']:
-        uml_data['relationships'].append({
-            'from': rel['from']['entity_name'],
-            'to': rel['to']['entity_name'],
-            'type': rel['type'],
-            'strength': rel['strength']
-        })
+        key = (references[rel['from']]['entity_name'], references[rel['to']]['entity_name'], rel['type'])
+        if key in uml_relationships:
+            uml_relationships[key]['count'] += 1
+        else:
+            uml_relationships[key] = {
+                'from': key[0],
+                'to': key[1],
+                'type': rel['type'],
+                'strength': rel['strength'],
+                'count': 1
+            }
+    uml_data['relationships'] = list(uml_relationships.values())
     
     return uml_data
 
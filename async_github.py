@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+Asynchronous GitHub API client
+Awaitable versions of the GitHubCodeSearch calls the web application fans out
+(search, date and config-file enrichment, trees, file contents and commits),
+sent over one pooled keep-alive httpx connection pool. The client shares the
+token pool, rate-limit scheduler, HTTP cache and blob cache of the
+GitHubCodeSearch it wraps, so both clients see the same budgets and cache.
+The synchronous GitHubCodeSearch stays the implementation used by the CLI.
+"""
+
+import asyncio
+import contextvars
+import copy
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from colorama import Fore, Style
+
+from github_code_search import GitHubSession, _COMMIT_SHA_RE
+from http_cache import HTTPCache
+from single_flight import AsyncSingleFlight
+from metrics import observe_upstream
+from rate_limit import resource_for_url, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BACKGROUND
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None
+
+# asyncio counterpart of the scheduler's thread-local priority; tasks inherit it
+_priority = contextvars.ContextVar('github_request_priority', default=PRIORITY_NORMAL)
+
+
+def available():
+    """Whether the optional httpx dependency is installed"""
+    return httpx is not None
+
+
+class AsyncGitHubClient:
+    """
+    Awaitable GitHub API calls for a GitHubCodeSearch instance
+
+    Coroutines run on an event loop owned by the client (on a daemon thread),
+    so synchronous callers such as Flask views can submit work with run()
+    while connections stay alive between requests. Requests go through the
+    same steps as GitHubSession: identical GETs in flight at the same time
+    share one upstream call, GETs are answered or revalidated by the HTTP
+    cache, everything sent below the API root is admitted by the rate-limit
+    scheduler with a token from the pool, and rate-limited responses are
+    retried while the scheduler expects budget back within its max_wait.
+
+    Raises:
+        RuntimeError: If httpx is not installed
+    """
+
+    max_rate_limit_retries = GitHubSession.max_rate_limit_retries
+
+    def __init__(self, searcher, max_connections=64, max_keepalive_connections=32, keepalive_expiry=30.0, http2=False):
+        if httpx is None:
+            raise RuntimeError("The async client needs httpx (pip install httpx)")
+        self.searcher = searcher
+        self.session = searcher.session
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.http2 = http2
+        self.single_flight = AsyncSingleFlight()
+        self._client = None
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        # Created on the loop; the counterpart of the bounded thread pools
+        # GitHubCodeSearch fans out on, shared by every fan-out and caller
+        self._upstream_slots = None
+        # SQLite cache reads block; keep them off the event loop
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix='async-github-io')
+        # Token acquisition can wait up to the scheduler's max_wait; on its own
+        # threads, throttled requests cannot hold up cache lookups
+        self._acquire_executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix='async-github-acquire')
+
+    # -- event loop ---------------------------------------------------------
+
+    def run(self, coro):
+        """Run a coroutine on the client's event loop and wait for its result
+
+        The calling thread's request priority (see GitHubSession.priority)
+        carries over to every request the coroutine makes.
+        """
+        priority = self.session.scheduler.current_priority
+        future = asyncio.run_coroutine_threadsafe(self._with_priority(coro, priority), self._ensure_loop())
+        return future.result()
+
+    @contextmanager
+    def priority(self, priority):
+        """Run the requests awaited inside the block (and tasks started there) at `priority`"""
+        reset = _priority.set(priority)
+        try:
+            yield
+        finally:
+            _priority.reset(reset)
+
+    async def _with_priority(self, coro, priority):
+        with self.priority(priority):
+            return await coro
+
+    def _ensure_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='async-github', daemon=True).start()
+            return self._loop
+
+    async def _blocking(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _http(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=dict(self.session.headers),
+                limits=self.limits,
+                # Waiting for a pooled connection is bounded by the scheduler, not a timeout
+                timeout=httpx.Timeout(self.searcher.request_timeout, pool=None),
+                follow_redirects=True,
+                http2=self.http2
+            )
+        return self._client
+
+    async def aclose(self):
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def close(self):
+        """Close pooled connections and stop the event loop"""
+        if self._loop is None:
+            return
+        self.run(self.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+        self._upstream_slots = None
+        self._executor.shutdown(wait=False)
+        self._acquire_executor.shutdown(wait=False)
+
+    # -- requests -----------------------------------------------------------
+
+    async def request(self, method, url, params=None, headers=None, json=None, cache=True):
+        """
+        Send a request through the shared HTTP cache and rate-limit scheduler
+
+        Args:
+            cache (bool): Answer GETs from the HTTP cache; disable for large
+                bodies that are cached elsewhere (e.g. in the blob cache)
+
+        Returns:
+            httpx.Response: The (possibly cached) response
+        """
+        request = self._http().build_request(method, url, params=params, headers=headers, json=json)
+        if not HTTPCache.is_cacheable(request):
+            return await self._send(request, cache)
+        key = HTTPCache.cache_key(request, self.session.scheduler.pool_id)
+        return await self.single_flight.do(key, lambda: self._send(request, cache), share=copy.copy)
+
+    async def _send(self, request, cache):
+        http_cache = self.session.cache
+        if not cache or http_cache is None or not http_cache.is_cacheable(request):
+            return await self._send_scheduled(request)
+        return await self._send_cached(http_cache, request)
+
+    async def get(self, url, params=None, headers=None, cache=True):
+        return await self.request('GET', url, params=params, headers=headers, cache=cache)
+
+    async def post(self, url, json=None, headers=None):
+        return await self.request('POST', url, json=json, headers=headers)
+
+    async def _send_cached(self, http_cache, request):
+        """HTTPCache.fetch for httpx: serve fresh entries, revalidate stale ones"""
+        # Responses are shared by every token of the pool, but not across pools
+        key = http_cache.cache_key(request, self.session.scheduler.pool_id)
+        entry = await self._blocking(http_cache.lookup, key)
+
+        if entry is not None and http_cache.is_fresh(entry):
+            http_cache.record('hits')
+            return self._cached_response(entry, request)
+
+        if entry is not None:
+            request.headers.update(http_cache.conditional_headers(entry))
+
+        response = await self._send_scheduled(request)
+
+        if response.status_code == 304 and entry is not None:
+            http_cache.record('revalidations')
+            entry = await self._blocking(http_cache.refresh, key, entry, response.headers)
+            return self._cached_response(entry, request)
+
+        http_cache.record('misses')
+        if response.status_code == 200:
+            await self._blocking(http_cache.store, key, response.url, response.headers, response.content)
+        return response
+
+    @staticmethod
+    def _cached_response(entry, request):
+        response = httpx.Response(200, headers=entry['headers'], content=bytes(entry['body']), request=request)
+        response.from_cache = True
+        return response
+
+    async def _send_scheduled(self, request):
+        session = self.session
+        url = str(request.url)
+        if session.api_url and not url.startswith(session.api_url) and url != session.graphql_url:
+            return await self._send_upstream(request)
+        scheduler = session.scheduler
+        resource = resource_for_url(url)
+        explicit_auth = 'Authorization' in request.headers
+        attempt = 0
+        while True:
+            token = await asyncio.get_running_loop().run_in_executor(
+                self._acquire_executor, scheduler.acquire, resource, _priority.get()
+            )
+            if token and not explicit_auth:
+                request.headers['Authorization'] = f'token {token}'
+            response = None
+            try:
+                response = await self._send_upstream(request)
+            finally:
+                scheduler.release(resource, token, response)
+            if attempt >= self.max_rate_limit_retries or not scheduler.should_retry(resource, response):
+                return response
+            await response.aclose()
+            attempt += 1
+
+    async def _send_upstream(self, request):
+        # At most searcher.max_workers requests are on the wire at once, across all fan-outs
+        if self._upstream_slots is None:
+            self._upstream_slots = asyncio.Semaphore(self.searcher.max_workers)
+        async with self._upstream_slots:
+            started = time.perf_counter()
+            status_code = None
+            try:
+                response = await self._http().send(request)
+                status_code = response.status_code
+                return response
+            finally:
+                observe_upstream(request.url, status_code, time.perf_counter() - started)
+
+    # -- GitHubCodeSearch counterparts --------------------------------------
+
+    async def search_code(self, query, language=None, sort='best-match', order='desc', per_page=30, file_filter=None, check_config_files=False):
+        """Awaitable GitHubCodeSearch.search_code; enrichment requests run concurrently"""
+        searcher = self.searcher
+        params = {
+            'q': searcher._build_search_query(query, language, file_filter),
+            'sort': sort,
+            'order': order,
+            'per_page': min(per_page, 100)
+        }
+
+        # Searches are admitted ahead of queued background work
+        with self.priority(PRIORITY_INTERACTIVE):
+            response = await self.get(f"{searcher.base_url}/search/code", params=params)
+
+        if response.status_code != 200:
+            print(f"{Fore.RED}Search failed with status code: {response.status_code}{Style.RESET_ALL}")
+            return None
+
+        results = response.json()
+        results['items'] = await self.enrich_search_items(results['items'], sort, check_config_files)
+        return results
+
+    async def enrich_search_items(self, items, sort='best-match', check_config_files=False, known_config_files=None):
+        """Awaitable GitHubCodeSearch.enrich_search_items; dates and config files are fetched together"""
+        steps = []
+        if sort == 'indexed':
+            steps.append(self.enrich_items_with_dates(items))
+        if check_config_files:
+            steps.append(self.enrich_items_with_config_files(items, known_config_files))
+        await asyncio.gather(*steps)
+        if sort == 'indexed':
+            items.sort(key=lambda x: x.get('_fetched_date', ''), reverse=True)
+        return items
+
+    async def enrich_items_with_dates(self, items):
+        """Awaitable GitHubCodeSearch._enrich_items_with_dates; every item is looked up at once"""
+        if not items:
+            return []
+
+        searcher = self.searcher
+        # Results seen before (e.g. on an earlier page) keep the date they were given
+        pending = searcher._apply_known_dates(items)
+        with self.priority(PRIORITY_BACKGROUND):
+            # GraphQL does not accept unauthenticated requests
+            if pending and searcher.date_backend == 'graphql' and self.session.scheduler.tokens:
+                size = searcher.graphql_batch_size
+                batches = [pending[i:i + size] for i in range(0, len(pending), size)]
+                unresolved = await asyncio.gather(*(self._fetch_dates_graphql(batch) for batch in batches))
+                pending = [item for batch in unresolved for item in batch]
+            await asyncio.gather(*(self.enrich_item_with_date(item) for item in pending))
+        searcher._remember_dates(items)
+        return items
+
+    async def _fetch_dates_graphql(self, batch):
+        searcher = self.searcher
+        query, variables, aliases = searcher._build_dates_query(batch)
+        try:
+            response = await self.post(searcher.graphql_url, json={'query': query, 'variables': variables})
+            if response.status_code != 200:
+                print(f"{Fore.YELLOW}Warning: GraphQL date query failed ({response.status_code}), falling back to REST{Style.RESET_ALL}")
+                return batch
+            data = response.json().get('data') or {}
+        except Exception as e:
+            print(f"{Fore.YELLOW}Warning: GraphQL date query failed ({e}), falling back to REST{Style.RESET_ALL}")
+            return batch
+        return searcher._apply_dates(aliases, data)
+
+    async def enrich_item_with_date(self, item):
+        """Awaitable GitHubCodeSearch._enrich_item_with_date"""
+        item['_fetched_date'] = ''
+        item['updated_at'] = ''
+        try:
+            repo_name = item['repository']['full_name']
+            response = await self.get(
+                f"{self.searcher.base_url}/repos/{repo_name}/commits",
+                params={'path': item['path'], 'per_page': 1}
+            )
+            if response.status_code == 200:
+                commits_data = response.json()
+                if commits_data:
+                    commit_date = commits_data[0].get('commit', {}).get('author', {}).get('date', '')
+                    item['_fetched_date'] = commit_date
+                    item['updated_at'] = commit_date
+            else:
+                item['_enrich_error'] = f"HTTP {response.status_code}"
+        except Exception as e:
+            print(f"{Fore.YELLOW}Warning: Could not fetch date for {item.get('path', 'unknown')}: {e}{Style.RESET_ALL}")
+            item['_enrich_error'] = str(e)
+        return item
+
+    async def enrich_items_with_config_files(self, items, known_config_files=None):
+        """Awaitable GitHubCodeSearch._enrich_items_with_config_files"""
+        checked_repos = {} if known_config_files is None else known_config_files
+        repo_names = [
+            repo_name for repo_name in dict.fromkeys(item['repository']['full_name'] for item in items)
+            if repo_name not in checked_repos
+        ]
+
+        with self.priority(PRIORITY_BACKGROUND):
+            found = await asyncio.gather(*(self.find_config_files_in_repo(repo_name) for repo_name in repo_names))
+        checked_repos.update(zip(repo_names, found))
+        for item in items:
+            item['config_files'] = checked_repos[item['repository']['full_name']]
+        return items
+
+    async def find_config_files_in_repo(self, repo_name):
+        """Awaitable GitHubCodeSearch._find_config_files_in_repo; a truncated tree is never walked in full"""
+        searcher = self.searcher
+        tree_data = await self._fetch_tree_listing(repo_name, 'HEAD')
+        if tree_data is None:
+            print(f"{Fore.YELLOW}Warning: Could not check config files for {repo_name}{Style.RESET_ALL}")
+            return {'env_files': [], 'config_files': []}
+
+        entries = searcher._listed_tree_entries(tree_data)
+        if tree_data.get('truncated'):
+            root = await self._list_tree_level(repo_name, tree_data['sha'], '')
+            directories = searcher._config_directories(root)
+            listed = await asyncio.gather(*(
+                self._list_tree_level(repo_name, directory['sha'], directory['path']) for directory in directories
+            ))
+            entries = searcher._merge_tree_entries(entries, root + [entry for children in listed for entry in children])
+        return searcher._match_config_files(entries)
+
+    async def get_repository_tree(self, repo_name, ref):
+        """Awaitable GitHubCodeSearch.get_repository_tree; shares its in-memory tree cache"""
+        searcher = self.searcher
+        entries = searcher._cached_tree(repo_name, ref)
+        if entries is not None:
+            return entries
+
+        tree_data = await self._fetch_tree_listing(repo_name, ref)
+        if tree_data is None:
+            return None
+
+        if tree_data.get('truncated'):
+            entries = await self._walk_tree(repo_name, tree_data['sha'])
+        else:
+            entries = searcher._listed_tree_entries(tree_data)
+
+        searcher._remember_tree(repo_name, ref, entries)
+        return entries
+
+    async def _fetch_tree_listing(self, repo_name, ref):
+        """Awaitable GitHubCodeSearch._fetch_tree_listing"""
+        try:
+            response = await self.get(f"{self.searcher.base_url}/repos/{repo_name}/git/trees/{ref}", params={'recursive': 1})
+            if response.status_code != 200:
+                print(f"{Fore.YELLOW}Warning: Could not fetch tree for {repo_name}@{ref}: {response.status_code}{Style.RESET_ALL}")
+                return None
+            return response.json()
+        except Exception as e:
+            print(f"{Fore.YELLOW}Warning: Could not fetch tree for {repo_name}@{ref}: {e}{Style.RESET_ALL}")
+            return None
+
+    async def _walk_tree(self, repo_name, tree_sha):
+        """List a truncated tree level by level, every directory of a level at once"""
+        entries = []
+        level = [(tree_sha, '')]
+        while level:
+            listed = await asyncio.gather(*(self._list_tree_level(repo_name, sha, prefix) for sha, prefix in level))
+            level = []
+            for children in listed:
+                entries.extend(children)
+                level.extend((entry['sha'], entry['path']) for entry in children if entry['type'] == 'tree')
+        entries.sort(key=lambda entry: entry['path'])
+        return entries
+
+    async def _list_tree_level(self, repo_name, tree_sha, prefix):
+        try:
+            response = await self.get(f"{self.searcher.base_url}/repos/{repo_name}/git/trees/{tree_sha}")
+            if response.status_code == 200:
+                entries = []
+                for entry in response.json().get('tree', []):
+                    if entry.get('type') in ('blob', 'tree'):
+                        entry = self.searcher._tree_entry(entry)
+                        entry['path'] = f"{prefix}/{entry['path']}" if prefix else entry['path']
+                        entries.append(entry)
+                return entries
+            print(f"{Fore.YELLOW}Warning: Could not list {repo_name}/{prefix}: {response.status_code}{Style.RESET_ALL}")
+        except Exception as e:
+            print(f"{Fore.YELLOW}Warning: Could not list {repo_name}/{prefix}: {e}{Style.RESET_ALL}")
+        return []
+
+    async def get_file_commits(self, repo_name, file_path, per_page=10):
+        """
+        List the latest commits that touched a file
+
+        Returns:
+            httpx.Response: The commits API response
+        """
+        return await self.get(
+            f"{self.searcher.base_url}/repos/{repo_name}/commits",
+            params={'path': file_path, 'per_page': per_page}
+        )
+
+    async def get_file_changes_at_commits(self, repo_name, file_path, commit_shas):
+        """Awaitable GitHubCodeSearch.get_file_changes_at_commits"""
+        unique_shas = list(dict.fromkeys(sha for sha in commit_shas if sha))
+        changes = await asyncio.gather(*(self.get_file_change_at_commit(repo_name, file_path, sha) for sha in unique_shas))
+        return dict(zip(unique_shas, changes))
+
+    async def get_file_change_at_commit(self, repo_name, file_path, commit_sha):
+        """Get the change a commit made to a file, parsed into hunks"""
+        try:
+            response = await self.get(f"{self.searcher.base_url}/repos/{repo_name}/commits/{commit_sha}")
+            if response.status_code != 200:
+                return None
+            return self.searcher._file_change_from_commit(response.json(), file_path)
+        except Exception as e:
+            print(f"{Fore.YELLOW}Warning: Could not fetch changes at commit {commit_sha}: {e}{Style.RESET_ALL}")
+            return None
+
+    async def get_file_contents_at_commits(self, repo_name, file_path, commit_shas):
+        """Awaitable GitHubCodeSearch.get_file_contents_at_commits"""
+        unique_shas = list(dict.fromkeys(sha for sha in commit_shas if sha))
+        contents = await asyncio.gather(*(self.get_file_bytes_at_commit(repo_name, file_path, sha) for sha in unique_shas))
+        return {sha: None if data is None else data.decode('utf-8', errors='ignore') for sha, data in zip(unique_shas, contents)}
+
+    async def get_files_at_commit(self, repo_name, file_paths, commit_sha, blob_shas=None):
+        """Awaitable GitHubCodeSearch.get_files_at_commit"""
+        unique_paths = list(dict.fromkeys(file_paths))
+        blob_shas = blob_shas or {}
+        contents = await asyncio.gather(
+            *(self.get_file_bytes_at_commit(repo_name, path, commit_sha, blob_shas.get(path)) for path in unique_paths)
+        )
+        return dict(zip(unique_paths, contents))
+
+    async def get_file_bytes_at_commit(self, repo_name, file_path, commit_sha, blob_sha=None):
+        """Get the raw bytes of a file at a specific commit, through the shared blob cache"""
+        blob_cache = self.searcher.blob_cache
+        # Only full SHAs pin the content; branch names and short SHAs are never cached
+        cacheable = blob_cache is not None and bool(_COMMIT_SHA_RE.match(commit_sha))
+        if cacheable:
+            blob_sha = blob_sha or self.searcher._known_blob_sha(repo_name, commit_sha, file_path)
+            data = await self._blocking(blob_cache.get, repo_name, commit_sha, file_path, blob_sha)
+            if data is not None:
+                return data
+
+        try:
+            # Raw media type; the body goes to the blob cache only, not the HTTP cache too
+            response = await self.get(
+                f"{self.searcher.base_url}/repos/{repo_name}/contents/{file_path}",
+                params={'ref': commit_sha},
+                headers={'Accept': 'application/vnd.github.raw'},
+                cache=False
+            )
+            if response.status_code != 200:
+                return None
+            data = response.content
+            if cacheable:
+                await self._blocking(blob_cache.put, repo_name, commit_sha, file_path, data)
+            return data
+        except Exception as e:
+            print(f"{Fore.YELLOW}Warning: Could not fetch file content at commit {commit_sha}: {e}{Style.RESET_ALL}")
+            return None
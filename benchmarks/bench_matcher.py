@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-file scan cost of codebase analysis
+Compares the original line-by-line path (lowercase and test every line, then
+run six regexes on each hit) with the compiled single-pass matcher used by
+analyze_file_for_references.
+
+Usage:
+    python benchmarks/bench_matcher.py [--lines 5000] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Keep the benchmark from touching the on-disk caches
+os.environ.setdefault('GITGUTTER_CACHE_DIR', '')
+os.environ.setdefault('GITGUTTER_INDEX_DIR', '')
+
+import app  # noqa: E402
+from code_matcher import get_matcher  # noqa: E402
+
+
+def legacy_analyze_line(line, line_num, search_string, file_path):
+    """The line analysis as it was before the compiled matcher"""
+    analysis = {
+        'line_num': line_num,
+        'line': line,
+        'file_path': file_path,
+        'has_reference': False,
+        'type': None,
+        'context': None,
+        'entity_name': None
+    }
+    if search_string.lower() in line.lower():
+        analysis['has_reference'] = True
+        line_lower = line.lower()
+        if any(keyword in line_lower for keyword in ['def ', 'class ', 'function ', 'var ', 'let ', 'const ', 'public ', 'private ', 'protected ']):
+            analysis['type'] = 'declaration'
+        elif any(keyword in line_lower for keyword in ['=', ':=', '->', '=>', 'as ', 'alias ']):
+            analysis['type'] = 'rename'
+        elif any(keyword in line_lower for keyword in ['import ', 'from ', 'require ', 'include ']):
+            analysis['type'] = 'import'
+        else:
+            analysis['type'] = 'usage'
+        analysis['entity_name'] = legacy_extract_entity_name(line, search_string)
+        analysis['context'] = app.extract_context(line, line_num, file_path)
+    return analysis
+
+
+def legacy_extract_entity_name(line, search_string):
+    import re
+    patterns = [
+        r'def\s+(\w+)',
+        r'class\s+(\w+)',
+        r'function\s+(\w+)',
+        r'(\w+)\s*=',
+        r'(\w+)\s*:',
+        r'(\w+)\s*\(',
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, line, re.IGNORECASE)
+        if match and search_string.lower() in match.group(1).lower():
+            return match.group(1)
+    return search_string
+
+
+def legacy_scan(content, search_string, file_path):
+    references = []
+    for line_num, line in enumerate(content.split('\n'), 1):
+        line_analysis = legacy_analyze_line(line, line_num, search_string, file_path)
+        if line_analysis['has_reference']:
+            references.append(line_analysis)
+    return references
+
+
+def compiled_scan(content, search_string, file_path):
+    analysis = app.analyze_file_for_references('bench/repo', file_path, search_string, content=content)
+    return analysis['references']
+
+
+def make_file(lines, hit_ratio, needle, seed=0):
+    """Synthetic source file where roughly `hit_ratio` of lines mention `needle`"""
+    rng = random.Random(seed)
+    templates = [
+        '    result = compute_value(alpha, beta)',
+        '    for item in collection:',
+        '        total += item.weight * factor',
+        'def helper_function(arg, other):',
+        'class DataProcessor(object):',
+        '    return {"status": "ok", "count": count}',
+        'import os, sys',
+        '    # just a comment explaining things',
+    ]
+    hit_templates = [
+        'def {n}(self):',
+        '    value = {n}(data)',
+        '    self.{n} = None',
+        'from module import {n}',
+        '    {n}.run()',
+    ]
+    out = []
+    for _ in range(lines):
+        if rng.random() < hit_ratio:
+            out.append(rng.choice(hit_templates).format(n=needle))
+        else:
+            out.append(rng.choice(templates))
+    return '\n'.join(out)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--lines', type=int, default=5000, help='lines per synthetic file')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='timing repetitions (best is reported)')
+    args = arg_parser.parse_args()
+
+    needle = 'fetchUser'
+    print(f"{'hit ratio':>10} {'legacy ms':>11} {'compiled ms':>12} {'speedup':>8}")
+    for hit_ratio in (0.0, 0.001, 0.01, 0.1, 0.5):
+        content = make_file(args.lines, hit_ratio, needle)
+        expected = legacy_scan(content, needle, 'bench.py')
+        actual = compiled_scan(content, needle, 'bench.py')
+        if expected != actual:
+            raise SystemExit(f"Compiled matcher disagrees with the legacy scan at hit ratio {hit_ratio}")
+
+        legacy = min(timeit.repeat(lambda: legacy_scan(content, needle, 'bench.py'), number=1, repeat=args.repeat))
+        compiled = min(timeit.repeat(lambda: compiled_scan(content, needle, 'bench.py'), number=1, repeat=args.repeat))
+        print(f"{hit_ratio:>10} {legacy * 1000:>11.2f} {compiled * 1000:>12.2f} {legacy / compiled:>7.1f}x")
+
+    # Match modes the legacy path could not express
+    content = make_file(args.lines, 0.01, needle)
+    for options in ({'case_sensitive': True}, {'whole_word': True}, {'regex': True}):
+        search = r'fetch\w+' if options.get('regex') else needle
+        matcher = get_matcher(search, **options)
+        seconds = min(timeit.repeat(lambda: matcher.matching_line_numbers(content), number=1, repeat=args.repeat))
+        print(f"{str(options):>32} scan {seconds * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-item cost of shaping search results
+Compares the original per-item code (a dict built by hand, dates parsed with
+dateutil's generic parser, a colored snippet built for every item) with the
+SearchResult model, for date parsing and the items of /api/search.
+
+Usage:
+    python benchmarks/bench_search_result.py [--items 1000] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from colorama import Fore, Style  # noqa: E402
+from dateutil import parser  # noqa: E402
+
+from search_result import SearchResult, parse_timestamp  # noqa: E402
+
+_ANSI_RE = re.compile(r'\x1b\[[0-9;]*m')
+
+
+def legacy_snippet(item):
+    """The colored snippet as _get_code_snippet_with_context built it"""
+    text_matches = item.get('text_matches', [])
+    if not text_matches:
+        return ""
+    match = text_matches[0]
+    fragment = match.get('fragment', '')
+    matched_text = match.get('text', '')
+    if not fragment or not matched_text:
+        return fragment or ""
+    lines = fragment.split('\n')
+    match_indices = [i for i, line in enumerate(lines) if matched_text in line]
+    if not match_indices:
+        return fragment.replace(matched_text, f"{Fore.RED}{matched_text}{Style.RESET_ALL}")
+    idx = match_indices[0]
+    start_line = max(0, idx - 2)
+    end_line = min(len(lines), idx + 3)
+    result_lines = []
+    for i, line in enumerate(lines[start_line:end_line]):
+        line_num = start_line + i + 1
+        if start_line + i == idx:
+            highlighted_line = line.replace(matched_text, f"{Fore.RED}{matched_text}{Style.RESET_ALL}")
+            result_lines.append(f"   >> {line_num:3d}: {highlighted_line}")
+        else:
+            result_lines.append(f"      {line_num:3d}: {line}")
+    return '\n'.join(result_lines)
+
+
+def legacy_is_old(updated_at):
+    if updated_at and updated_at != 'Unknown':
+        try:
+            from datetime import datetime, timedelta
+            from dateutil import parser
+            update_date = parser.parse(updated_at)
+            now_utc = datetime.utcnow().replace(tzinfo=update_date.tzinfo)
+            return update_date < now_utc - timedelta(days=30)
+        except Exception:
+            pass
+    return False
+
+
+def legacy_process_search_item(item):
+    """process_search_item as it was before SearchResult"""
+    return {
+        'repository': item['repository']['full_name'],
+        'file_path': item['path'],
+        'file_name': item['path'].split('/')[-1] if '/' in item['path'] else item['path'],
+        'language': item.get('language', 'Unknown'),
+        'size': item.get('size', 'Unknown'),
+        'updated_at': item.get('updated_at', 'Unknown'),
+        'html_url': item['html_url'],
+        'code_snippet': legacy_snippet(item),
+        'is_old': legacy_is_old(item.get('updated_at', 'Unknown')),
+        'config_files': item.get('config_files', {})
+    }
+
+
+def make_items(count, seed=0):
+    """Search API items like enriched ones: text matches, commit dates, some config files"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    items = []
+    for i in range(count):
+        updated = now - timedelta(days=rng.randint(0, 120), seconds=rng.randint(0, 86400))
+        lines = [f'    line_{n} = compute(value_{n})' for n in range(9)]
+        hit = rng.randint(0, 8)
+        lines[hit] = '    result = fetchUser(user_id)'
+        items.append({
+            'repository': {'full_name': f'owner{i % 50}/repo{i % 7}'},
+            'path': f'src/pkg{i % 10}/module_{i}.py',
+            'html_url': f'https://github.com/owner{i % 50}/repo{i % 7}/blob/main/src/pkg{i % 10}/module_{i}.py',
+            'language': 'Python',
+            'size': rng.randint(100, 50000),
+            'updated_at': updated.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'text_matches': [{'fragment': '\n'.join(lines), 'text': 'fetchUser'}],
+            'config_files': {'env_files': ['.env'], 'config_files': []} if i % 5 == 0 else {}
+        })
+    return items
+
+
+def check(items):
+    """The model must give the legacy output, minus the terminal colors in the JSON snippet"""
+    for item in items:
+        expected = legacy_process_search_item(item)
+        expected['code_snippet'] = _ANSI_RE.sub('', expected['code_snippet'])
+        if SearchResult.from_item(item).to_json() != expected:
+            raise SystemExit(f"SearchResult disagrees with the legacy JSON for {item['path']}")
+        if SearchResult.from_item(item).snippet_text() != _ANSI_RE.sub('', legacy_snippet(item)):
+            raise SystemExit(f"SearchResult disagrees with the legacy snippet for {item['path']}")
+    for value in ('2024-05-01T12:34:56Z', '2024-05-01T12:34:56.123456Z', '2024-05-01T12:34:56+02:00',
+                  '2024-05-01 12:34:56', 'May 1 2024 12:34'):
+        expected = parser.parse(value)
+        expected = expected if expected.tzinfo else expected.replace(tzinfo=timezone.utc)
+        if parse_timestamp(value) != expected:
+            raise SystemExit(f"parse_timestamp disagrees with dateutil on {value!r}")
+
+
+def per_item_us(fn, items, repeat):
+    seconds = min(timeit.repeat(lambda: [fn(item) for item in items], number=1, repeat=repeat))
+    return seconds / len(items) * 1e6
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--items', type=int, default=1000, help='search items per timing run')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='timing repetitions (best is reported)')
+    args = arg_parser.parse_args()
+
+    items = make_items(args.items)
+    check(items)
+
+    timestamps = [item['updated_at'] for item in items]
+    cases = [
+        ('parse date', lambda value: parser.parse(value), parse_timestamp, timestamps),
+        ('JSON item', legacy_process_search_item, lambda item: SearchResult.from_item(item).to_json(), items),
+    ]
+    print(f"{'case':<12} {'legacy us':>10} {'model us':>10} {'speedup':>8}")
+    for name, legacy, model, inputs in cases:
+        before = per_item_us(legacy, inputs, args.repeat)
+        after = per_item_us(model, inputs, args.repeat)
+        print(f"{name:<12} {before:>10.2f} {after:>10.2f} {before / after:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
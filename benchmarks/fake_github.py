@@ -0,0 +1,746 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the GitHub REST and GraphQL APIs used by the benchmarks
+Serves the code search, commits, contents, git trees, tarball, rate-limit and
+GraphQL (last-commit dates) endpoints from synthetic repositories, local
+directories or recorded responses, with configurable latency, jitter,
+bandwidth, rate-limit budgets and injected 403/429 responses. Every request
+is counted by endpoint type so benchmarks can report upstream calls.
+
+Usage:
+    python benchmarks/fake_github.py [--port 8000] [--repos 3] [--files 200] [--latency 0.05]
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import tarfile
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from metrics import upstream_endpoint  # noqa: E402
+
+# Budgets per window as GitHub grants them to an authenticated user
+GITHUB_RATE_LIMITS = {
+    'core': (5000, 3600),
+    'search': (30, 60),
+    'code_search': (10, 60),
+    'graphql': (5000, 3600),
+}
+# Large enough that only injected errors get in the way
+UNLIMITED_RATE_LIMITS = {resource: (1000000, 3600) for resource in GITHUB_RATE_LIMITS}
+
+SEARCH_RESULT_LIMIT = 1000
+FIRST_COMMIT_DATE = datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc)
+
+_LINE_TEMPLATES = [
+    '    result = compute_value(alpha, beta)',
+    '    for item in collection:',
+    '        total += item.weight * factor',
+    'def helper_function(arg, other):',
+    'class DataProcessor(object):',
+    '    return {"status": "ok", "count": count}',
+    'import os, sys',
+    '    # just a comment explaining things',
+]
+_HIT_TEMPLATES = [
+    'def {n}(self):',
+    '    value = {n}(data)',
+    '    self.{n} = None',
+    'from module import {n}',
+    '    {n}.run()',
+]
+_EXTENSIONS = ('py', 'js', 'go', 'java', 'rb')
+_CONFIG_FILES = ('.env', 'config.yml', 'settings.json', 'docker-compose.yml')
+
+
+def git_blob_sha(data):
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+class FakeRepository:
+    """
+    Files and history of one repository
+
+    Every file is touched by a deterministic subset of `commits` commits
+    (always including the oldest one), so commit lists, commit details and
+    GraphQL histories agree with each other. File contents are the same at
+    every commit.
+    """
+
+    def __init__(self, full_name, files, commits=20):
+        self.full_name = full_name
+        self.files = {path: data if isinstance(data, bytes) else data.encode('utf-8') for path, data in files.items()}
+        self.commits = []
+        for i in range(max(1, commits)):
+            self.commits.append({
+                'sha': hashlib.sha1(f'{full_name}:{i}'.encode()).hexdigest(),
+                'date': (FIRST_COMMIT_DATE - timedelta(hours=7 * i)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'message': f'Change {commits - i} to {full_name}',
+                'author': f'dev{i % 5}',
+            })
+        self.head = self.commits[0]['sha']
+        self._commit_index = {commit['sha']: i for i, commit in enumerate(self.commits)}
+        self._blob_shas = {path: git_blob_sha(data) for path, data in self.files.items()}
+        self._blob_paths = {sha: path for path, sha in self._blob_shas.items()}
+        self._directories = self._build_directories()
+        self._tarball = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def synthetic(cls, full_name, files=200, lines=200, directories=10, hit_ratio=0.01, needle='fetchUser', commits=20, seed=0):
+        """Generated source files, about `hit_ratio` of their lines mentioning `needle`"""
+        rng = random.Random(f'{full_name}:{seed}')
+        contents = {}
+        for i in range(files):
+            directory = f'pkg{i % directories}/mod{(i // directories) % 3}' if directories else ''
+            path = f'{directory}/file{i}.{_EXTENSIONS[i % len(_EXTENSIONS)]}'.lstrip('/')
+            out = []
+            for _ in range(lines):
+                if rng.random() < hit_ratio:
+                    out.append(rng.choice(_HIT_TEMPLATES).format(n=needle))
+                else:
+                    out.append(rng.choice(_LINE_TEMPLATES))
+            contents[path] = '\n'.join(out) + '\n'
+        for name in _CONFIG_FILES:
+            contents[name] = f'# {name} of {full_name}\nkey = value\n'
+        return cls(full_name, contents, commits)
+
+    @classmethod
+    def from_directory(cls, full_name, root, commits=20):
+        """Serve the files of a local checkout (dot-directories such as .git skipped)"""
+        contents = {}
+        for directory, subdirectories, filenames in os.walk(root):
+            subdirectories[:] = sorted(name for name in subdirectories if not name.startswith('.'))
+            for filename in sorted(filenames):
+                full_path = os.path.join(directory, filename)
+                with open(full_path, 'rb') as handle:
+                    contents[os.path.relpath(full_path, root).replace(os.sep, '/')] = handle.read()
+        return cls(full_name, contents, commits)
+
+    @property
+    def size(self):
+        return sum(len(data) for data in self.files.values())
+
+    def resolve(self, ref):
+        """Commit index of a SHA, branch or 'HEAD', or None"""
+        if ref in self._commit_index:
+            return self._commit_index[ref]
+        if ref in ('HEAD', 'main', 'master'):
+            return 0
+        return None
+
+    def file_history(self, path):
+        """Indexes of the commits that touched `path`, newest first"""
+        seed = zlib.crc32(path.encode('utf-8'))
+        last = len(self.commits) - 1
+        return [i for i in range(len(self.commits)) if (seed + i) % 4 == 0 or i == last]
+
+    def commit_files(self, index):
+        return [path for path in self.files if index in self.file_history(path)]
+
+    def tree_sha(self, directory):
+        return hashlib.sha1(f'tree:{self.full_name}:{directory}'.encode()).hexdigest()
+
+    def tree_entries(self, directory='', recursive=False):
+        if recursive:
+            entries = []
+            for path in sorted(self._directories):
+                if path:
+                    entries.append({'path': path, 'mode': '040000', 'type': 'tree', 'sha': self.tree_sha(path)})
+            for path in sorted(self.files):
+                entries.append(self._blob_entry(path, path))
+            return entries
+        entries = []
+        for name, (kind, path) in sorted(self._directories[directory].items()):
+            if kind == 'tree':
+                entries.append({'path': name, 'mode': '040000', 'type': 'tree', 'sha': self.tree_sha(path)})
+            else:
+                entries.append(self._blob_entry(name, path))
+        return entries
+
+    def directory_for_tree(self, sha):
+        for directory in self._directories:
+            if self.tree_sha(directory) == sha:
+                return directory
+        return None
+
+    def listing(self, directory):
+        """Entries of a directory in the contents API format, or None"""
+        if directory not in self._directories:
+            return None
+        entries = []
+        for name, (kind, path) in sorted(self._directories[directory].items()):
+            entry = {
+                'name': name,
+                'path': path,
+                'type': 'dir' if kind == 'tree' else 'file',
+                'size': len(self.files[path]) if kind == 'blob' else 0,
+                'sha': self.tree_sha(path) if kind == 'tree' else self._blob_shas[path],
+                'html_url': f'https://github.com/{self.full_name}/blob/{self.head}/{path}',
+                'download_url': None if kind == 'tree' else f'https://raw.githubusercontent.com/{self.full_name}/{self.head}/{path}',
+            }
+            entries.append(entry)
+        return entries
+
+    def tarball(self):
+        """Gzipped tar of every file, built once"""
+        with self._lock:
+            if self._tarball is None:
+                prefix = f"{self.full_name.replace('/', '-')}-{self.head[:7]}"
+                buffer = io.BytesIO()
+                with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+                    for path, data in sorted(self.files.items()):
+                        info = tarfile.TarInfo(f'{prefix}/{path}')
+                        info.size = len(data)
+                        archive.addfile(info, io.BytesIO(data))
+                self._tarball = buffer.getvalue()
+            return self._tarball
+
+    def commit_json(self, index, with_files=False):
+        commit = self.commits[index]
+        data = {
+            'sha': commit['sha'],
+            'html_url': f"https://github.com/{self.full_name}/commit/{commit['sha']}",
+            'commit': {
+                'author': {'name': commit['author'], 'date': commit['date']},
+                'committer': {'name': commit['author'], 'date': commit['date']},
+                'message': commit['message'],
+            },
+            'author': {'login': commit['author']},
+        }
+        if with_files:
+            data['files'] = [
+                {
+                    'filename': path,
+                    'status': 'added' if index == len(self.commits) - 1 else 'modified',
+                    'additions': 2,
+                    'deletions': 1,
+                    'changes': 3,
+                    'patch': f'@@ -1,1 +1,2 @@\n-old line of {path}\n+new line {index}\n+another line',
+                }
+                for path in self.commit_files(index)
+            ]
+        return data
+
+    def _blob_entry(self, name, path):
+        return {'path': name, 'mode': '100644', 'type': 'blob', 'sha': self._blob_shas[path], 'size': len(self.files[path])}
+
+    def _build_directories(self):
+        directories = {'': {}}
+        for path in self.files:
+            parts = path.split('/')
+            for depth in range(1, len(parts)):
+                directory = '/'.join(parts[:depth])
+                if directory not in directories:
+                    directories[directory] = {}
+                    parent = '/'.join(parts[:depth - 1])
+                    directories[parent][parts[depth - 1]] = ('tree', directory)
+            directories['/'.join(parts[:-1])][parts[-1]] = ('blob', path)
+        return directories
+
+
+class FakeGitHub:
+    """
+    Threaded HTTP server answering like api.github.com
+
+    Args:
+        repositories (list): FakeRepository instances to serve
+        latency (float): Seconds added to every response
+        jitter (float): Latency varies uniformly by up to this many seconds either way
+        bandwidth (float, optional): Bytes per second at which bodies are sent
+        error_rate (float): Share of requests answered with an injected error
+        error_statuses (tuple): Status codes injected errors pick from (403, 429)
+        retry_after (int): Retry-After seconds sent with injected errors
+        rate_limits (dict): Resource -> (limit, window seconds) budgets, shared
+            by every client; exhausted budgets answer 403 until the window resets
+        recorded (dict, optional): 'METHOD /path?query' -> {'status', 'headers',
+            'body'} responses served as is before anything else
+        contents_max_bytes (int): Files above this size are refused by the
+            contents API ("too_large") and must be read from the blobs API
+        truncate_trees (int, optional): Recursive tree listings longer than
+            this are cut short and marked truncated, as GitHub does for big trees
+    """
+
+    def __init__(self, repositories, latency=0.0, jitter=0.0, bandwidth=None, error_rate=0.0, error_statuses=(403, 429),
+                 retry_after=1, rate_limits=UNLIMITED_RATE_LIMITS, recorded=None, seed=0, contents_max_bytes=100 * 1024 * 1024,
+                 truncate_trees=None):
+        self.repositories = {repo.full_name.lower(): repo for repo in repositories}
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.retry_after = retry_after
+        self.rate_limits = dict(rate_limits)
+        self.recorded = recorded or {}
+        self.contents_max_bytes = contents_max_bytes
+        self.truncate_trees = truncate_trees
+        self.calls = Counter()
+        self.statuses = Counter()
+        self.injected = 0
+        self._budgets = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self, host='127.0.0.1', port=0):
+        """Serve in a daemon thread; returns the base URL"""
+        handler = type('FakeGitHubHandler', (_Handler,), {'fake': self})
+        self._server = _Server((host, port), handler)
+        threading.Thread(target=self._server.serve_forever, name='fake-github', daemon=True).start()
+        return self.url
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.statuses.clear()
+            self.injected = 0
+
+    def counters(self):
+        with self._lock:
+            return {
+                'calls': sum(self.calls.values()),
+                'by_endpoint': dict(self.calls),
+                'by_status': dict(self.statuses),
+                'injected_errors': self.injected,
+            }
+
+    def _record(self, endpoint, status):
+        with self._lock:
+            self.calls[endpoint] += 1
+            self.statuses[status] += 1
+
+    def _delay(self):
+        with self._lock:
+            delay = self.latency + self._rng.uniform(-self.jitter, self.jitter) if self.jitter else self.latency
+        if delay > 0:
+            time.sleep(delay)
+
+    def _inject_error(self):
+        if not self.error_rate:
+            return None
+        with self._lock:
+            if self._rng.random() >= self.error_rate:
+                return None
+            self.injected += 1
+            return self._rng.choice(self.error_statuses)
+
+    def _spend(self, resource, conditional_hit=False):
+        """Charge one request to a budget; returns (headers, allowed)"""
+        limit, window = self.rate_limits.get(resource, UNLIMITED_RATE_LIMITS['core'])
+        now = time.time()
+        with self._lock:
+            budget = self._budgets.get(resource)
+            if budget is None or now >= budget['reset']:
+                budget = self._budgets[resource] = {'remaining': limit, 'reset': now + window}
+            # Like GitHub, 304 answers to conditional requests are free
+            allowed = budget['remaining'] > 0
+            if allowed and not conditional_hit:
+                budget['remaining'] -= 1
+            headers = {
+                'X-RateLimit-Limit': str(limit),
+                'X-RateLimit-Remaining': str(budget['remaining']),
+                'X-RateLimit-Reset': str(int(budget['reset'])),
+                'X-RateLimit-Resource': resource,
+                'X-RateLimit-Used': str(limit - budget['remaining']),
+            }
+            return headers, allowed
+
+    def rate_limit_json(self):
+        now = time.time()
+        resources = {}
+        with self._lock:
+            for resource, (limit, window) in self.rate_limits.items():
+                budget = self._budgets.get(resource)
+                if budget is None or now >= budget['reset']:
+                    budget = {'remaining': limit, 'reset': now + window}
+                resources[resource] = {
+                    'limit': limit,
+                    'remaining': budget['remaining'],
+                    'used': limit - budget['remaining'],
+                    'reset': int(budget['reset']),
+                }
+        return {'resources': resources, 'rate': resources['core']}
+
+    # -- Endpoints ----------------------------------------------------------
+
+    def search_code(self, query, per_page, page, base_url):
+        terms = [term for term in query.split() if ':' not in term]
+        qualifiers = dict(term.split(':', 1) for term in query.split() if ':' in term)
+        needle = (terms[0] if terms else '').strip('"').lower()
+        extension = qualifiers.get('extension')
+        repo_filter = qualifiers.get('repo', '').lower()
+
+        matches = []
+        for repo_key, repo in sorted(self.repositories.items()):
+            if repo_filter and repo_key != repo_filter:
+                continue
+            for path, data in sorted(repo.files.items()):
+                if extension and not path.endswith('.' + extension):
+                    continue
+                text = data.decode('utf-8', errors='replace')
+                position = text.lower().find(needle) if needle else -1
+                if position >= 0:
+                    matches.append((repo, path, text, position))
+
+        start = (page - 1) * per_page
+        items = [self._search_item(repo, path, text, position, needle, base_url) for repo, path, text, position in matches[start:start + per_page]]
+        return {'total_count': len(matches), 'incomplete_results': False, 'items': items}
+
+    def _search_item(self, repo, path, text, position, needle, base_url):
+        # Like GitHub, the fragment is the matching line with a line of context either side
+        lines = text.split('\n')
+        line_number = text.count('\n', 0, position)
+        first = max(0, line_number - 1)
+        fragment = '\n'.join(lines[first:line_number + 2])
+        offset = position - sum(len(line) + 1 for line in lines[:first])
+        owner = repo.full_name.split('/')[0]
+        return {
+            'name': path.rsplit('/', 1)[-1],
+            'path': path,
+            'sha': repo._blob_shas[path],
+            'url': f'{base_url}/repos/{repo.full_name}/contents/{path}?ref={repo.head}',
+            'html_url': f'https://github.com/{repo.full_name}/blob/{repo.head}/{path}',
+            'repository': {
+                'full_name': repo.full_name,
+                'name': repo.full_name.split('/')[1],
+                'owner': {'login': owner},
+                'html_url': f'https://github.com/{repo.full_name}',
+                'private': False,
+            },
+            'score': 1.0,
+            'text_matches': [{
+                'object_type': 'FileContent',
+                'property': 'content',
+                'fragment': fragment,
+                'matches': [{'text': text[position:position + len(needle)], 'indices': [offset, offset + len(needle)]}],
+            }],
+        }
+
+    def graphql(self, payload):
+        """Answer the aliased last-commit-date queries of the GraphQL date backend"""
+        query = payload.get('query', '')
+        variables = payload.get('variables') or {}
+        data = {}
+        errors = []
+        repo_matches = list(re.finditer(r'(r\d+): repository\(owner: \$(\w+), name: \$(\w+)\)', query))
+        for position, match in enumerate(repo_matches):
+            alias, owner_var, name_var = match.groups()
+            section_end = repo_matches[position + 1].start() if position + 1 < len(repo_matches) else len(query)
+            section = query[match.end():section_end]
+            full_name = f'{variables.get(owner_var)}/{variables.get(name_var)}'
+            repo = self.repositories.get(full_name.lower())
+            if repo is None:
+                data[alias] = None
+                errors.append({'type': 'NOT_FOUND', 'path': [alias], 'message': f'Could not resolve to a Repository with the name {full_name!r}.'})
+                continue
+            target = {}
+            for file_alias, path_var in re.findall(r'(f\d+): history\(first: \d+, path: \$(\w+)\)', section):
+                path = variables.get(path_var)
+                history = repo.file_history(path) if path in repo.files else []
+                target[file_alias] = {'nodes': [{'author': {'date': repo.commits[history[0]]['date']}}] if history else []}
+            data[alias] = {'defaultBranchRef': {'target': target}}
+        body = {'data': data}
+        if errors:
+            body['errors'] = errors
+        return body
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Benchmarks open many connections at once; the default backlog of 5
+    # turns bursts into SYN retransmits that dwarf any server latency
+    request_queue_size = 256
+
+    def handle_error(self, request, client_address):
+        # Clients hang up on purpose, e.g. once they have read the lines they wanted
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    fake = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method):
+        fake = self.fake
+        url = urlsplit(self.path)
+        path = unquote(url.path).rstrip('/') or '/'
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0)) if method == 'POST' else b''
+        endpoint = upstream_endpoint(path)
+
+        fake._delay()
+        recorded = fake.recorded.get(f'{method} {self.path}') or fake.recorded.get(f'{method} {path}')
+        if recorded is not None:
+            payload = recorded.get('body', '')
+            if not isinstance(payload, (str, bytes)):
+                payload = json.dumps(payload)
+            return self._send(endpoint, recorded.get('status', 200), payload, recorded.get('headers'))
+
+        resource = 'graphql' if endpoint == 'graphql' else 'code_search' if path == '/search/code' else 'search' if endpoint == 'search' else 'core'
+        injected = fake._inject_error()
+        if injected:
+            headers, _ = fake._spend(resource)
+            headers['Retry-After'] = str(fake.retry_after)
+            return self._send(endpoint, injected, {'message': 'You have exceeded a secondary rate limit.'}, headers)
+
+        try:
+            status, payload, content_type = self._route(method, path, query, body)
+        except Exception as e:
+            status, payload, content_type = 500, {'message': f'Fake server error: {e}'}, None
+
+        etag = None
+        if method == 'GET' and status == 200:
+            raw = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8') if not isinstance(payload, str) else payload.encode('utf-8')
+            etag = '"%s"' % hashlib.sha1(raw).hexdigest()
+        not_modified = etag is not None and etag in (self.headers.get('If-None-Match') or '')
+
+        headers, allowed = fake._spend(resource, conditional_hit=not_modified)
+        if path == '/rate_limit':
+            allowed = True
+        if not allowed:
+            return self._send(endpoint, 403, {'message': 'API rate limit exceeded.'}, headers)
+        if etag is not None:
+            headers['ETag'] = etag
+        if not_modified:
+            return self._send(endpoint, 304, b'', headers)
+        if content_type:
+            headers['Content-Type'] = content_type
+        return self._send(endpoint, status, payload, headers)
+
+    def _route(self, method, path, query, body):
+        fake = self.fake
+        if method == 'POST':
+            if path == '/graphql':
+                return 200, fake.graphql(json.loads(body or b'{}')), None
+            return 404, {'message': 'Not Found'}, None
+        if path == '/rate_limit':
+            return 200, fake.rate_limit_json(), None
+        if path == '/search/code':
+            per_page = min(int(query.get('per_page', 30)), 100)
+            page = int(query.get('page', 1))
+            if page * per_page > SEARCH_RESULT_LIMIT:
+                return 422, {'message': 'Cannot access beyond the first 1000 results.'}, None
+            return 200, fake.search_code(query.get('q', ''), per_page, page, fake.url), None
+
+        match = re.match(r'/repos/([^/]+/[^/]+)(?:/(.*))?$', path)
+        repo = fake.repositories.get(match.group(1).lower()) if match else None
+        if repo is None:
+            return 404, {'message': 'Not Found'}, None
+        rest = match.group(2) or ''
+        accept = self.headers.get('Accept') or ''
+
+        if rest == '':
+            return 200, {'full_name': repo.full_name, 'default_branch': 'main', 'size': repo.size // 1024}, None
+        if rest == 'commits':
+            file_path = query.get('path')
+            indexes = repo.file_history(file_path) if file_path else range(len(repo.commits))
+            per_page = int(query.get('per_page', 30))
+            return 200, [repo.commit_json(i) for i in list(indexes)[:per_page]], None
+        if rest.startswith('commits/'):
+            index = repo.resolve(rest[len('commits/'):])
+            if index is None:
+                return 422, {'message': 'No commit found'}, None
+            if 'sha' in accept:
+                return 200, repo.commits[index]['sha'], 'application/vnd.github.sha'
+            return 200, repo.commit_json(index, with_files=True), None
+        if rest.startswith('git/trees/'):
+            ref = rest[len('git/trees/'):]
+            recursive = 'recursive' in query
+            directory = '' if repo.resolve(ref) is not None else repo.directory_for_tree(ref)
+            if directory is None:
+                return 404, {'message': 'Not Found'}, None
+            sha = repo.tree_sha(directory)
+            entries = repo.tree_entries(directory, recursive)
+            truncated = recursive and fake.truncate_trees is not None and len(entries) > fake.truncate_trees
+            if truncated:
+                entries = entries[:fake.truncate_trees]
+            return 200, {'sha': sha, 'tree': entries, 'truncated': truncated}, None
+        if rest.startswith('tarball'):
+            return 200, repo.tarball(), 'application/x-gzip'
+        if rest.startswith('git/blobs/'):
+            blob_path = repo._blob_paths.get(rest[len('git/blobs/'):])
+            if blob_path is None:
+                return 404, {'message': 'Not Found'}, None
+            data = repo.files[blob_path]
+            if 'raw' in accept:
+                return 200, data, 'application/vnd.github.raw'
+            return 200, {'sha': repo._blob_shas[blob_path], 'size': len(data), 'encoding': 'base64',
+                         'content': base64.encodebytes(data).decode('ascii')}, None
+        if rest == 'contents' or rest.startswith('contents/'):
+            file_path = rest[len('contents/'):] if rest.startswith('contents/') else ''
+            if repo.resolve(query.get('ref', 'HEAD')) is None:
+                return 404, {'message': 'No commit found for the ref'}, None
+            data = repo.files.get(file_path)
+            if data is None:
+                listing = repo.listing(file_path)
+                return (200, listing, None) if listing is not None else (404, {'message': 'Not Found'}, None)
+            if len(data) > fake.contents_max_bytes:
+                return 403, {
+                    'message': 'This API returns blobs up to 100 MB in size. The requested blob is too large to fetch via the API.',
+                    'errors': [{'resource': 'Blob', 'field': 'data', 'code': 'too_large'}],
+                }, None
+            if 'raw' in accept:
+                return 200, data, 'application/vnd.github.raw'
+            return 200, {
+                'type': 'file',
+                'name': file_path.rsplit('/', 1)[-1],
+                'path': file_path,
+                'sha': repo._blob_shas[file_path],
+                'size': len(data),
+                'encoding': 'base64',
+                'content': base64.encodebytes(data).decode('ascii'),
+                'html_url': f'https://github.com/{repo.full_name}/blob/{repo.head}/{file_path}',
+            }, None
+        return 404, {'message': 'Not Found'}, None
+
+    def _send(self, endpoint, status, payload, headers=None):
+        if isinstance(payload, bytes):
+            data = payload
+        elif isinstance(payload, str):
+            data = payload.encode('utf-8')
+        else:
+            data = json.dumps(payload).encode('utf-8')
+        headers = dict(headers or {})
+        headers.setdefault('Content-Type', 'application/json; charset=utf-8')
+        if 'gzip' in (self.headers.get('Accept-Encoding') or '') and len(data) > 1024 and status == 200 \
+                and headers['Content-Type'] != 'application/x-gzip':
+            data = gzip.compress(data, compresslevel=1)
+            headers['Content-Encoding'] = 'gzip'
+
+        self.fake._record(endpoint, status)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if not data:
+            return
+        bandwidth = self.fake.bandwidth
+        if not bandwidth:
+            self.wfile.write(data)
+            return
+        # Throttled in 64 KiB chunks to mimic a slower link
+        chunk = 64 * 1024
+        for start in range(0, len(data), chunk):
+            piece = data[start:start + chunk]
+            self.wfile.write(piece)
+            time.sleep(len(piece) / bandwidth)
+
+
+def build_repositories(count=3, files=200, lines=200, directories=10, hit_ratio=0.01, needle='fetchUser', commits=20, local=()):
+    """`count` synthetic repositories ('bench/repo0', ...) plus ('owner/name', path) local checkouts"""
+    repositories = [
+        FakeRepository.synthetic(f'bench/repo{i}', files, lines, directories, hit_ratio, needle, commits, seed=i)
+        for i in range(count)
+    ]
+    repositories += [FakeRepository.from_directory(name, path, commits) for name, path in local]
+    return repositories
+
+
+def add_server_arguments(arg_parser):
+    """Options shared by this script and the benchmark runner"""
+    group = arg_parser.add_argument_group('fake GitHub server')
+    group.add_argument('--repos', type=int, default=3, help='synthetic repositories to serve')
+    group.add_argument('--files', type=int, default=200, help='files per synthetic repository')
+    group.add_argument('--file-lines', type=int, default=200, help='lines per synthetic file')
+    group.add_argument('--hit-ratio', type=float, default=0.01, help='share of lines mentioning the search needle')
+    group.add_argument('--commits', type=int, default=20, help='commits per repository')
+    group.add_argument('--local-repo', action='append', default=[], metavar='OWNER/NAME=PATH',
+                       help='also serve the files of a local directory as a repository')
+    group.add_argument('--recorded', help='JSON file of recorded responses keyed by "METHOD /path?query"')
+    group.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    group.add_argument('--jitter', type=float, default=0.0, help='latency varies by up to this many seconds')
+    group.add_argument('--bandwidth', type=float, default=0.0, help='response bandwidth in MB/s (0: unlimited)')
+    group.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered 403/429')
+    group.add_argument('--error-status', type=int, action='append', choices=(403, 429),
+                       help='status code of injected errors (repeatable; default: both)')
+    group.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds of injected errors')
+    group.add_argument('--contents-max-mb', type=float, default=100,
+                       help='files above this size must be read from the blobs API, as on GitHub')
+    group.add_argument('--truncate-trees', type=int, metavar='ENTRIES',
+                       help='cut recursive tree listings to this many entries and mark them truncated')
+    group.add_argument('--github-limits', action='store_true',
+                       help="enforce GitHub's own rate limits (e.g. 10 code searches a minute)")
+    return group
+
+
+def server_from_arguments(args, needle='fetchUser'):
+    local = [tuple(spec.split('=', 1)) for spec in args.local_repo]
+    repositories = build_repositories(args.repos, args.files, args.file_lines, hit_ratio=args.hit_ratio,
+                                      needle=needle, commits=args.commits, local=local)
+    recorded = None
+    if args.recorded:
+        with open(args.recorded, encoding='utf-8') as handle:
+            recorded = json.load(handle)
+    return FakeGitHub(
+        repositories,
+        latency=args.latency,
+        jitter=args.jitter,
+        bandwidth=args.bandwidth * 1024 * 1024 or None,
+        error_rate=args.error_rate,
+        error_statuses=args.error_status or (403, 429),
+        retry_after=args.retry_after,
+        rate_limits=GITHUB_RATE_LIMITS if args.github_limits else UNLIMITED_RATE_LIMITS,
+        recorded=recorded,
+        contents_max_bytes=int(args.contents_max_mb * 1024 * 1024),
+        truncate_trees=args.truncate_trees,
+    )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8000)
+    add_server_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    fake = server_from_arguments(args)
+    url = fake.start(args.host, args.port)
+    print(f"Serving {', '.join(fake.repositories)} at {url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(fake.counters()))
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
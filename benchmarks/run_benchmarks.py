@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Benchmark: searches, enrichment, analyses and web routes against a fake GitHub
+Starts the local stand-in API from fake_github.py, points the application at
+it and runs each scenario in rounds of concurrent operations, reporting
+throughput, latency percentiles and the upstream calls it took. Results can
+be saved as JSON and compared with an earlier run to measure a change.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--scenario search-dates] [--iterations 10] [--concurrency 4]
+        [--latency 0.05 --jitter 0.02] [--error-rate 0.05] [--cold] [--save after.json --compare before.json]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Caches are set up per scenario below; keep the application's own off the disk
+os.environ['GITGUTTER_CACHE_DIR'] = ''
+os.environ.setdefault('GITGUTTER_INDEX_DIR', '')
+
+import app  # noqa: E402
+import async_github  # noqa: E402
+from github_code_search import GitHubCodeSearch  # noqa: E402
+from fake_github import add_server_arguments, server_from_arguments  # noqa: E402
+
+NEEDLE = 'fetchUser'
+
+SCENARIOS = OrderedDict()
+
+
+def scenario(name, description):
+    def register(setup):
+        SCENARIOS[name] = (description, setup)
+        return setup
+    return register
+
+
+class Bench:
+    """What scenarios get to work with: the fake server, its repositories and the options"""
+
+    def __init__(self, fake, args):
+        self.fake = fake
+        self.args = args
+        self.repositories = list(fake.repositories.values())
+        self.client = app.app.test_client()
+        self._cache_root = tempfile.mkdtemp(prefix='gitgutter-bench-')
+
+    def repository(self, i):
+        return self.repositories[i % len(self.repositories)]
+
+    def file_path(self, i):
+        repo = self.repository(i)
+        paths = sorted(repo.files)
+        return repo.full_name, paths[(i // len(self.repositories)) % len(paths)]
+
+    def fresh_state(self):
+        """Point the application at a new searcher with empty caches"""
+        cache_dir = None if self.args.no_http_cache else tempfile.mkdtemp(dir=self._cache_root)
+        searcher = GitHubCodeSearch(
+            max_workers=self.args.max_workers,
+            cache_dir=cache_dir,
+            date_backend=self.args.date_backend
+        )
+        searcher.base_url = self.fake.url
+        # Any token will do; the fake server only counts them
+        searcher.set_tokens(['bench-token'])
+
+        old_client = app.async_client
+        app.searcher = searcher
+        app.async_client = async_github.AsyncGitHubClient(searcher) if old_client is not None else None
+        if old_client is not None:
+            old_client.close()
+        app.search_cache.clear()
+
+    def cleanup(self):
+        shutil.rmtree(self._cache_root, ignore_errors=True)
+
+
+def ok_response(response):
+    return response.status_code == 200
+
+
+@scenario('search', 'one page of code search results, best match')
+def search(bench):
+    return lambda i: app.searcher.search_code(NEEDLE, per_page=30) is not None
+
+
+@scenario('search-dates', 'search sorted by date: one last-commit date per result')
+def search_dates(bench):
+    return lambda i: app.searcher.search_code(NEEDLE, sort='indexed', per_page=30) is not None
+
+
+@scenario('search-config', 'search with config file detection per repository')
+def search_config(bench):
+    return lambda i: app.searcher.search_code(NEEDLE, per_page=30, check_config_files=True) is not None
+
+
+@scenario('search-async', 'search sorted by date through the async client (needs httpx)')
+def search_async(bench):
+    if app.async_client is None:
+        return None
+    return lambda i: app.run_upstream('search_code', NEEDLE, sort='indexed', per_page=30) is not None
+
+
+@scenario('analysis', 'codebase analysis of one repository (tarball when small enough)')
+def analysis(bench):
+    return lambda i: app.perform_codebase_analysis(bench.repository(i).full_name, NEEDLE) is not None
+
+
+@scenario('analysis-files', 'codebase analysis fetching files one by one')
+def analysis_files(bench):
+    def run(i):
+        # Per call, so concurrent operations and later scenarios keep the archive path
+        return app.perform_codebase_analysis(bench.repository(i).full_name, NEEDLE, archive_max_bytes=-1) is not None
+    return run
+
+
+@scenario('analyze-route', 'POST /api/analyze with gzip/brotli accepted: serialization and compression of the result')
+def analyze_route(bench):
+    def run(i):
+        body = {'repository': bench.repository(i).full_name, 'search_string': NEEDLE}
+        return ok_response(bench.client.post('/api/analyze', json=body, headers={'Accept-Encoding': 'br, gzip'}))
+    return run
+
+
+@scenario('commit-history', 'POST /api/commit-history for 10 commits of a file')
+def commit_history(bench):
+    def run(i):
+        repository, file_path = bench.file_path(i)
+        return ok_response(bench.client.post('/api/commit-history', json={
+            'repository': repository, 'file_path': file_path, 'max_commits': 10
+        }))
+    return run
+
+
+@scenario('routes', 'mix of POST /api/search, /api/repository-tree and /api/file-content')
+def routes(bench):
+    def run(i):
+        repository, file_path = bench.file_path(i)
+        kind = i % 3
+        if kind == 0:
+            body = {'query': NEEDLE, 'sort': 'best-match', 'per_page': 30}
+            return ok_response(bench.client.post('/api/search', json=body))
+        if kind == 1:
+            return ok_response(bench.client.post('/api/repository-tree', json={'repository': repository, 'path': ''}))
+        return ok_response(bench.client.post('/api/file-content', json={'repository': repository, 'file_path': file_path}))
+    return run
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(bench, name, setup):
+    args = bench.args
+    bench.fresh_state()
+    op = setup(bench)
+    if op is None:
+        return None
+
+    def timed(i):
+        started = time.perf_counter()
+        try:
+            succeeded = bool(op(i))
+        except Exception as e:
+            print(f"{name} operation {i} failed: {e}", file=sys.__stderr__)
+            succeeded = False
+        return time.perf_counter() - started, succeeded
+
+    latencies = []
+    failures = 0
+    wall = 0.0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for round_index in range(args.warmup + args.iterations):
+            if round_index == args.warmup:
+                bench.fake.reset_counters()
+            elif args.cold and round_index:
+                bench.fresh_state()
+            first = round_index * args.concurrency
+            started = time.perf_counter()
+            results = list(executor.map(timed, range(first, first + args.concurrency)))
+            if round_index < args.warmup:
+                continue
+            wall += time.perf_counter() - started
+            latencies += [seconds for seconds, _ in results]
+            failures += sum(1 for _, succeeded in results if not succeeded)
+
+    upstream = bench.fake.counters()
+    latencies.sort()
+    ops = len(latencies)
+    return {
+        'ops': ops,
+        'failures': failures,
+        'seconds': round(wall, 4),
+        'throughput': round(ops / wall, 3) if wall else 0.0,
+        'mean_ms': round(sum(latencies) / ops * 1000, 2) if ops else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p90_ms': round(percentile(latencies, 0.90) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        'upstream_calls': upstream['calls'],
+        'upstream_per_op': round(upstream['calls'] / ops, 2) if ops else 0.0,
+        'upstream_by_endpoint': upstream['by_endpoint'],
+        'upstream_by_status': {str(status): count for status, count in upstream['by_status'].items()},
+        'injected_errors': upstream['injected_errors'],
+    }
+
+
+def print_results(results, baseline=None):
+    print(f"{'scenario':<16} {'ops':>5} {'fail':>5} {'ops/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'upstream':>9} {'/op':>7}")
+    for name, result in results.items():
+        print(
+            f"{name:<16} {result['ops']:>5} {result['failures']:>5} {result['throughput']:>9.2f} {result['p50_ms']:>9.1f} "
+            f"{result['p90_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['max_ms']:>9.1f} {result['upstream_calls']:>9} {result['upstream_per_op']:>7.2f}"
+        )
+        endpoints = ' '.join(f'{endpoint}={count}' for endpoint, count in sorted(result['upstream_by_endpoint'].items()))
+        statuses = ' '.join(f'{status}={count}' for status, count in sorted(result['upstream_by_status'].items()))
+        print(f"{'':<16} upstream: {endpoints or '-'} | status: {statuses or '-'}")
+
+        before = (baseline or {}).get(name)
+        if before:
+            print(
+                f"{'':<16} vs baseline: throughput {change(before['throughput'], result['throughput'])}, "
+                f"p50 {change(before['p50_ms'], result['p50_ms'])}, p99 {change(before['p99_ms'], result['p99_ms'])}, "
+                f"upstream/op {change(before['upstream_per_op'], result['upstream_per_op'])}"
+            )
+
+
+def change(before, after):
+    if not before:
+        return f'{before} -> {after}'
+    return f'{(after - before) / before * 100:+.1f}%'
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--scenario', action='append', choices=list(SCENARIOS), help='scenario to run (repeatable; default: all)')
+    arg_parser.add_argument('--list', action='store_true', help='list the scenarios and exit')
+    arg_parser.add_argument('--iterations', type=int, default=5, help='measured rounds per scenario')
+    arg_parser.add_argument('--warmup', type=int, default=0, help='unmeasured rounds run first')
+    arg_parser.add_argument('--concurrency', type=int, default=1, help='operations run in parallel per round')
+    arg_parser.add_argument('--cold', action='store_true', help='start every round with empty caches')
+    arg_parser.add_argument('--no-http-cache', action='store_true', help='run without the persistent HTTP and blob caches')
+    arg_parser.add_argument('--max-workers', type=int, default=8, help='GitHub calls in flight per fan-out')
+    arg_parser.add_argument('--date-backend', choices=('rest', 'graphql'), default='rest')
+    arg_parser.add_argument('--save', help='write the results to this JSON file')
+    arg_parser.add_argument('--compare', help='JSON file of an earlier run to compare against')
+    arg_parser.add_argument('--verbose', action='store_true', help="show the application's own output")
+    add_server_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    if args.list:
+        for name, (description, _) in SCENARIOS.items():
+            print(f"{name:<16} {description}")
+        return
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as handle:
+            baseline = json.load(handle)['results']
+
+    fake = server_from_arguments(args, needle=NEEDLE)
+    fake.start()
+    bench = Bench(fake, args)
+    print(f"Fake GitHub at {fake.url}: {len(bench.repositories)} repositories, "
+          f"latency {args.latency}s +/- {args.jitter}s, error rate {args.error_rate}")
+
+    results = OrderedDict()
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    try:
+        for name in args.scenario or SCENARIOS:
+            description, setup = SCENARIOS[name]
+            with quiet:
+                result = run_scenario(bench, name, setup)
+            if result is None:
+                print(f"{name:<16} skipped")
+                continue
+            results[name] = result
+    finally:
+        fake.stop()
+        bench.cleanup()
+
+    print_results(results, baseline)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as handle:
+            json.dump({'config': vars(args), 'results': results}, handle, indent=2)
+        print(f"Saved to {args.save}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Compiled matcher for codebase analysis
+Finds the lines of a file that reference a search string with one pass over
+the whole decoded content, then classifies only those lines using
+precompiled keyword patterns.
+"""
+
+import re
+from functools import lru_cache
+
+DECLARATION_KEYWORDS = ['def ', 'class ', 'function ', 'var ', 'let ', 'const ', 'public ', 'private ', 'protected ']
+RENAME_KEYWORDS = ['=', ':=', '->', '=>', 'as ', 'alias ']
+IMPORT_KEYWORDS = ['import ', 'from ', 'require ', 'include ']
+
+# One alternation per keyword group: a single scan of the line instead of
+# one substring test per keyword
+_DECLARATION_RE = re.compile('|'.join(re.escape(keyword) for keyword in DECLARATION_KEYWORDS))
+_RENAME_RE = re.compile('|'.join(re.escape(keyword) for keyword in RENAME_KEYWORDS))
+_IMPORT_RE = re.compile('|'.join(re.escape(keyword) for keyword in IMPORT_KEYWORDS))
+
+_ENTITY_PATTERNS = [
+    re.compile(r'def\s+(\w+)', re.IGNORECASE),  # Python functions
+    re.compile(r'class\s+(\w+)', re.IGNORECASE),  # Classes
+    re.compile(r'function\s+(\w+)', re.IGNORECASE),  # JavaScript functions
+    re.compile(r'(\w+)\s*=', re.IGNORECASE),  # Variable assignments
+    re.compile(r'(\w+)\s*:', re.IGNORECASE),  # Type annotations
+    re.compile(r'(\w+)\s*\(', re.IGNORECASE),  # Function calls
+]
+
+
+class LineMatcher:
+    """
+    Matches a search string against file contents
+
+    Modes:
+        default         case-insensitive substring (same as `s.lower() in line.lower()`)
+        case_sensitive  exact-case matching
+        whole_word      the match may not be preceded or followed by a word character
+        regex           `search_string` is a regular expression, matched per line
+
+    Raises:
+        re.error: If `regex` is set and the pattern does not compile
+    """
+
+    def __init__(self, search_string, case_sensitive=False, whole_word=False, regex=False):
+        self.search_string = search_string
+        self.case_sensitive = case_sensitive
+        self.whole_word = whole_word
+        self.regex = regex
+
+        # Case-insensitive literal modes match a lowercased needle against
+        # lowercased text, which is exactly what `in` on .lower() does
+        self._fold = not case_sensitive and not regex
+        self._needle = search_string if case_sensitive else search_string.lower()
+
+        if regex:
+            flags = re.MULTILINE if case_sensitive else re.MULTILINE | re.IGNORECASE
+            self._pattern = re.compile(search_string, flags)
+        elif whole_word:
+            self._pattern = re.compile(r'(?<!\w)' + re.escape(self._needle) + r'(?!\w)')
+        else:
+            self._pattern = None
+
+    @property
+    def is_literal(self):
+        """Whether a case-insensitive substring index can narrow down candidates"""
+        return not self.regex
+
+    def matches(self, text):
+        """Check whether a single line (or any text) contains a match"""
+        if self._fold:
+            text = text.lower()
+        if self._pattern is None:
+            return self._needle in text
+        return self._pattern.search(text) is not None
+
+    def matching_line_numbers(self, content):
+        """
+        Scan a whole file once and return the 1-based numbers of lines with a match
+
+        Line numbers refer to `content.split('\\n')`.
+        """
+        haystack = content.lower() if self._fold else content
+        if self._pattern is None:
+            needle = self._needle
+
+            def search(pos):
+                return haystack.find(needle, pos)
+        else:
+            pattern = self._pattern
+
+            def search(pos):
+                match = pattern.search(haystack, pos)
+                return -1 if match is None else match.start()
+
+        line_numbers = []
+        line_num = 1
+        counted_to = 0
+        pos = search(0)
+        while pos != -1:
+            line_num += haystack.count('\n', counted_to, pos)
+            counted_to = pos
+            line_numbers.append(line_num)
+            # One hit per line is enough; resume at the start of the next line
+            next_line = haystack.find('\n', pos)
+            if next_line == -1:
+                break
+            pos = search(next_line + 1)
+        return line_numbers
+
+    def extract_entity_name(self, line):
+        """Extract the entity name from a line, falling back to the search string"""
+        for pattern in _ENTITY_PATTERNS:
+            match = pattern.search(line)
+            if match and self.matches(match.group(1)):
+                return match.group(1)
+        return self.search_string
+
+
+def classify_line(line):
+    """Classify a referencing line as 'declaration', 'rename', 'import' or 'usage'"""
+    line_lower = line.lower()
+    if _DECLARATION_RE.search(line_lower):
+        return 'declaration'
+    if _RENAME_RE.search(line_lower):
+        return 'rename'
+    if _IMPORT_RE.search(line_lower):
+        return 'import'
+    return 'usage'
+
+
+@lru_cache(maxsize=128)
+def get_matcher(search_string, case_sensitive=False, whole_word=False, regex=False):
+    """Return a (cached) LineMatcher for the given search options"""
+    return LineMatcher(search_string, case_sensitive, whole_word, regex)
@@ -6,33 +6,437 @@ Results are ordered by date (descending).
 """
 
 import requests
+import copy
+import fnmatch
 import json
+import os
+import re
+import tarfile
+import threading
 import time
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
 from dateutil import parser
 import sys
 from colorama import init, Fore, Style
+from http_cache import HTTPCache, BlobCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from single_flight import SingleFlight
+from metrics import observe_upstream
+from search_result import SearchResult, terminal_highlight
+from rate_limit import RateLimitScheduler, resource_for_url, is_rate_limited, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
 
 # Initialize colorama for cross-platform colored output
 init()
 
+_COMMIT_SHA_RE = re.compile(r'^[0-9a-f]{40}$')
+
+# The search API serves at most this many results of a query, whatever the page size
+SEARCH_RESULT_LIMIT = 1000
+
+# File names (matched case-insensitively, without the directory) reported as
+# environment and configuration files when check_config_files is enabled
+ENV_FILE_PATTERNS = ['.env', '.env.*', '*.env', 'env', 'env.*', 'environment', 'environment.*']
+CONFIG_FILE_SUFFIXES = ('.config', '.cfg', '.conf', '.ini', '.yaml', '.yml', '.toml', '.json', '.xml')
+CONFIG_FILE_PATTERNS = ['config', 'config.*', '*.config.*', 'configuration*', 'settings', 'settings.*']
+
+# Top-level directories (matched case-insensitively) also listed for config
+# files when a repository's recursive tree listing comes back truncated
+CONFIG_DIRECTORIES = ('config', 'configs', 'conf', 'configuration', 'settings', 'env', 'environments', '.config', 'deploy')
+
+_ENV_FILE_RE = re.compile('|'.join(fnmatch.translate(pattern) for pattern in ENV_FILE_PATTERNS))
+_CONFIG_FILE_RE = re.compile('|'.join(fnmatch.translate(pattern) for pattern in CONFIG_FILE_PATTERNS))
+
+_HUNK_HEADER_RE = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@ ?(.*)$')
+
+def parse_patch(patch):
+    """
+    Split a unified diff of one file (GitHub's files[].patch) into hunks
+    
+    Returns:
+        list: Dicts with 'old_start', 'old_lines', 'new_start', 'new_lines',
+        'section' (the text after the hunk header) and 'lines', each line a
+        dict with 'type' ('add', 'del' or 'context'), 'text', 'old_line' and
+        'new_line' (None on the side the line does not exist)
+    """
+    hunks = []
+    hunk = None
+    old_line = new_line = 0
+    patch_lines = patch.split('\n')
+    if patch_lines and patch_lines[-1] == '':
+        patch_lines.pop()
+    
+    for line in patch_lines:
+        match = _HUNK_HEADER_RE.match(line)
+        if match:
+            old_line = int(match.group(1))
+            new_line = int(match.group(3))
+            hunk = {
+                'old_start': old_line,
+                'old_lines': int(match.group(2) or 1),
+                'new_start': new_line,
+                'new_lines': int(match.group(4) or 1),
+                'section': match.group(5).strip(),
+                'lines': []
+            }
+            hunks.append(hunk)
+        elif hunk is None or line.startswith('\\'):
+            # Preamble, or "\ No newline at end of file"
+            continue
+        elif line.startswith('+'):
+            hunk['lines'].append({'type': 'add', 'text': line[1:], 'old_line': None, 'new_line': new_line})
+            new_line += 1
+        elif line.startswith('-'):
+            hunk['lines'].append({'type': 'del', 'text': line[1:], 'old_line': old_line, 'new_line': None})
+            old_line += 1
+        else:
+            hunk['lines'].append({'type': 'context', 'text': line[1:], 'old_line': old_line, 'new_line': new_line})
+            old_line += 1
+            new_line += 1
+    
+    return hunks
+
+def _utc_timestamp(value):
+    """Normalize a GraphQL GitTimestamp (author's UTC offset) to REST's UTC 'Z' form"""
+    try:
+        return parser.isoparse(value).astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    except (TypeError, ValueError):
+        return value or ''
+
+def load_tokens(environ=None):
+    """
+    Read personal access tokens from the environment
+    
+    GITHUB_TOKENS holds comma- or whitespace-separated tokens, GITHUB_TOKEN a
+    single one and GITHUB_TOKENS_FILE names a file with one token per line
+    ('#' starts a comment). Duplicates are dropped, order is kept.
+    """
+    environ = os.environ if environ is None else environ
+    tokens = re.split(r'[\s,]+', environ.get('GITHUB_TOKENS', ''))
+    tokens.append(environ.get('GITHUB_TOKEN', ''))
+    tokens_file = environ.get('GITHUB_TOKENS_FILE')
+    if tokens_file:
+        try:
+            with open(os.path.expanduser(tokens_file), encoding='utf-8') as fh:
+                tokens.extend(line.split('#', 1)[0].strip() for line in fh)
+        except OSError as e:
+            print(f"{Fore.YELLOW}Warning: Could not read tokens from {tokens_file}: {e}{Style.RESET_ALL}")
+    return list(dict.fromkeys(token.strip() for token in tokens if token.strip()))
+
+class GitHubSession(requests.Session):
+    """
+    requests.Session that answers GET requests through an optional HTTPCache
+    and sends everything else through a RateLimitScheduler
+    
+    Identical GET requests sent at the same time share one upstream call
+    (see SingleFlight). Cache hits never reach the scheduler, so they neither
+    wait for nor spend rate-limit budget. Requests below `api_url` (and to `graphql_url`) are
+    sent with the token the scheduler picks from its pool; requests to other
+    hosts (archive and raw downloads) are neither scheduled nor given a token.
+    """
+    
+    # Rate-limited responses are retried when the budget returns within the scheduler's max_wait
+    max_rate_limit_retries = 2
+    
+    def __init__(self, cache=None, scheduler=None, api_url="https://api.github.com"):
+        super().__init__()
+        self.cache = cache
+        self.scheduler = scheduler or RateLimitScheduler()
+        self.api_url = api_url
+        self.graphql_url = None
+        self.single_flight = SingleFlight()
+    
+    def priority(self, priority):
+        """Context manager: requests made on this thread inside it use `priority`"""
+        return self.scheduler.priority(priority)
+    
+    def bind_priority(self, fn, priority=None):
+        """Wrap `fn` for a worker thread so its requests use `priority` (default: the caller's)"""
+        return self.scheduler.bind(fn, priority)
+    
+    def send(self, request, **kwargs):
+        # Streamed bodies can only be read once, so streams are never shared
+        if kwargs.get('stream') or not HTTPCache.is_cacheable(request):
+            return self._send_cached(request, **kwargs)
+        # Keyed like the cache: same URL, Accept and token pool means the same answer
+        key = HTTPCache.cache_key(request, self.scheduler.pool_id)
+        return self.single_flight.do(key, lambda: self._send_cached(request, **kwargs), share=copy.copy)
+    
+    def _send_cached(self, request, **kwargs):
+        if self.cache is None or kwargs.get('stream') or not self.cache.is_cacheable(request):
+            return self._send_scheduled(request, **kwargs)
+        # Responses are shared by every token of the pool, but not across pools
+        return self.cache.fetch(
+            request,
+            lambda prepared: self._send_scheduled(prepared, **kwargs),
+            namespace=self.scheduler.pool_id
+        )
+    
+    def _send_scheduled(self, request, **kwargs):
+        if self.api_url and not request.url.startswith(self.api_url) and request.url != self.graphql_url:
+            return self._send_upstream(request, **kwargs)
+        resource = resource_for_url(request.url)
+        explicit_auth = 'Authorization' in request.headers
+        attempt = 0
+        while True:
+            token = self.scheduler.acquire(resource)
+            if token and not explicit_auth:
+                request.headers['Authorization'] = f'token {token}'
+            response = None
+            try:
+                response = self._send_upstream(request, **kwargs)
+            finally:
+                self.scheduler.release(resource, token, response)
+            if attempt >= self.max_rate_limit_retries or not self.scheduler.should_retry(resource, response):
+                return response
+            response.close()
+            attempt += 1
+    
+    def _send_upstream(self, request, **kwargs):
+        """Send over the network, recording the call's endpoint, status and latency"""
+        started = time.perf_counter()
+        status_code = None
+        try:
+            response = super().send(request, **kwargs)
+            status_code = response.status_code
+            return response
+        finally:
+            observe_upstream(request.url, status_code, time.perf_counter() - started)
+
+class SearchCursor:
+    """
+    Position in the pages of one code search (see GitHubCodeSearch.search_pages)
+    
+    Each next_page() call enriches one page while the following page is
+    already being fetched in the background. Pages passed to skip_page()
+    (served from a cache) start no read-ahead, so code search quota is only
+    spent on pages somebody asked for. A result that shows up again on
+    a later page (search pages shift as the index changes) is dropped, and
+    each repository's config files are listed once for the whole search.
+    Cursors may be shared between threads; pages are handed out in order.
+    
+    `enrich` replaces searcher.enrich_search_items (same arguments), e.g. to
+    enrich through an async client.
+    """
+    
+    def __init__(self, searcher, search_query, sort='best-match', order='desc', per_page=30, check_config_files=False, max_results=SEARCH_RESULT_LIMIT, enrich=None):
+        self.searcher = searcher
+        self.enrich = enrich or searcher.enrich_search_items
+        self.search_query = search_query
+        self.sort = sort
+        self.order = order
+        self.per_page = max(1, min(int(per_page), 100))
+        self.check_config_files = check_config_files
+        self.max_results = min(int(max_results), SEARCH_RESULT_LIMIT)
+        self.page = 1
+        self.total_count = None
+        self.exhausted = False
+        self.last_used = time.time()
+        self._seen = set()
+        self._config_files = {}
+        self._prefetched = None
+        self._lock = threading.Lock()
+    
+    @property
+    def has_more(self):
+        return not self.exhausted
+    
+    def next_page(self):
+        """
+        Fetch and enrich the next page
+        
+        Returns:
+            dict: 'items' (new results only), 'page', 'total_count' and
+            'has_more', or None once the search is exhausted or a page failed
+        """
+        with self._lock:
+            self.last_used = time.time()
+            if self.exhausted:
+                return None
+            
+            future, self._prefetched = self._prefetched, None
+            results = future.result() if future is not None else self._fetch(self.page)
+            if results is None:
+                self.exhausted = True
+                return None
+            
+            page, new_items = self._advance_locked(results, read_ahead=True)
+            new_items = self.enrich(new_items, self.sort, self.check_config_files, self._config_files)
+            return {
+                'items': new_items,
+                'page': page,
+                'total_count': self.total_count,
+                'has_more': not self.exhausted
+            }
+    
+    def skip_page(self, results):
+        """
+        Continue past a page that was served from elsewhere, e.g. a result cache
+        
+        Args:
+            results (dict): The page's (already enriched) search response, as
+                returned by search_code for the same search
+        
+        Returns:
+            bool: Whether more pages are available
+        """
+        with self._lock:
+            self.last_used = time.time()
+            _, items = self._advance_locked(results)
+            for item in items:
+                if 'config_files' in item:
+                    self._config_files.setdefault(item['repository']['full_name'], item['config_files'])
+            return not self.exhausted
+    
+    def _advance_locked(self, results, read_ahead=False):
+        """Account for the next page's raw results; returns (page number, results not seen before)"""
+        page = self.page
+        items = results.get('items', [])
+        self.total_count = results.get('total_count', 0)
+        self.page += 1
+        limit = min(self.total_count, self.max_results)
+        self.exhausted = len(items) < self.per_page or page * self.per_page >= limit
+        if read_ahead and not self.exhausted:
+            # Read ahead: fetch the next page while this one is enriched
+            self._prefetched = self.searcher._search_prefetch.submit(self._fetch, self.page)
+        
+        new_items = []
+        for item in items:
+            key = (item['repository']['full_name'], item['path'], item.get('sha', ''))
+            if key not in self._seen:
+                self._seen.add(key)
+                new_items.append(item)
+        return page, new_items
+    
+    def __iter__(self):
+        while True:
+            page = self.next_page()
+            if page is None:
+                return
+            yield page
+    
+    def close(self):
+        """Drop the read-ahead page, cancelling its request if it has not started"""
+        with self._lock:
+            if self._prefetched is not None:
+                self._prefetched.cancel()
+                self._prefetched = None
+            self.exhausted = True
+    
+    def _fetch(self, page):
+        return self.searcher.fetch_search_page(self.search_query, self.sort, self.order, self.per_page, page)
+
 class GitHubCodeSearch:
-    def __init__(self):
+    def __init__(self, max_workers=8, request_timeout=15, cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES, rate_limit_max_wait=60, tokens=None, blob_cache_max_bytes=DEFAULT_MAX_BYTES, date_backend='rest', graphql_url=None, graphql_batch_size=50):
+        """
+        Args:
+            max_workers (int): Maximum number of concurrent API calls used by
+                the enrichment passes
+            request_timeout (float): Timeout in seconds for enrichment calls,
+                so a single slow call cannot stall a whole batch
+            cache_dir (str, optional): Directory for the persistent HTTP cache;
+                responses are not cached when omitted
+            cache_max_bytes (int): Size cap of the HTTP cache before LRU eviction
+            rate_limit_max_wait (float): Longest a request is held back waiting
+                for rate-limit budget before it is sent anyway
+            tokens (list, optional): Personal access tokens to spread requests
+                over; each token's budget is tracked separately
+            blob_cache_max_bytes (int): Size cap of the file-content cache
+                (kept in `cache_dir`) before LRU eviction
+            date_backend (str): How search results get their last-commit dates:
+                'rest' (one commits request per item) or 'graphql' (batched
+                queries, needs a token; items GraphQL cannot answer fall back to REST)
+            graphql_url (str, optional): GraphQL endpoint; defaults to
+                `base_url` + '/graphql'
+            graphql_batch_size (int): Items per GraphQL date query
+        """
+        self.max_workers = max(1, int(max_workers))
+        self.request_timeout = request_timeout
+        cache = HTTPCache(cache_dir, cache_max_bytes) if cache_dir else None
+        # File contents at a commit never change; keep them by blob SHA
+        self.blob_cache = BlobCache(cache_dir, blob_cache_max_bytes) if cache_dir else None
+        scheduler = RateLimitScheduler(max_wait=rate_limit_max_wait, tokens=tokens)
+        self.session = GitHubSession(cache=cache, scheduler=scheduler)
         self.base_url = "https://api.github.com"
-        self.session = requests.Session()
+        self.graphql_url = graphql_url
+        if date_backend not in ('rest', 'graphql'):
+            raise ValueError(f"Unknown date backend: {date_backend}")
+        self.date_backend = date_backend
+        self.graphql_batch_size = max(1, int(graphql_batch_size))
+        # Trees are immutable per commit SHA, so keep the most recent ones in memory
+        self.tree_cache_size = 32
+        self._tree_cache = OrderedDict()
+        # Path -> blob SHA of cached trees, built on first use
+        self._tree_blob_shas = {}
+        self._tree_cache_lock = threading.Lock()
+        # Last-commit dates of search results, by blob, so later pages and searches skip them
+        self.date_cache_size = 5000
+        self._date_cache = OrderedDict()
+        self._date_cache_lock = threading.Lock()
+        # Fetches the next page of search cursors while the current one is enriched
+        self._search_prefetch = ThreadPoolExecutor(max_workers=4, thread_name_prefix='search-prefetch')
         self.session.headers.update({
             'User-Agent': 'GitHub-Code-Search-Tool/1.0',
             'Accept': 'application/vnd.github.v3.text-match+json'
         })
+        # Size the connection pool so concurrent workers can reuse connections
+        adapter = requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=max(10, self.max_workers))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         
+    @property
+    def base_url(self):
+        """GitHub API root; only requests below it are authenticated and rate-limit scheduled"""
+        return self.session.api_url
+    
+    @base_url.setter
+    def base_url(self, url):
+        self.session.api_url = url
+    
+    @property
+    def graphql_url(self):
+        """GitHub GraphQL endpoint used by the 'graphql' date backend"""
+        return self.session.graphql_url or f"{self.base_url}/graphql"
+    
+    @graphql_url.setter
+    def graphql_url(self, url):
+        self.session.graphql_url = url
+    
     def set_token(self, token):
         """Set GitHub personal access token for authenticated requests"""
-        if token:
-            self.session.headers.update({'Authorization': f'token {token}'})
+        self.set_tokens([token] if token else [])
+    
+    def set_tokens(self, tokens):
+        """Replace the token pool; requests go to the token with the most remaining budget"""
+        self.session.scheduler.set_tokens(tokens)
+        count = len(self.session.scheduler.tokens)
+        if count == 1:
             print(f"{Fore.GREEN}✓ GitHub token set successfully{Style.RESET_ALL}")
+        elif count:
+            print(f"{Fore.GREEN}✓ {count} GitHub tokens in the pool{Style.RESET_ALL}")
         else:
             print(f"{Fore.YELLOW}⚠ No token provided - using unauthenticated requests (rate limited){Style.RESET_ALL}")
     
+    def cache_stats(self):
+        """Return HTTP cache hit, miss and revalidation counts"""
+        if self.session.cache is None:
+            return {'enabled': False}
+        return self.session.cache.stats()
+    
+    def blob_cache_stats(self):
+        """Return file-content cache hit and miss counts"""
+        if self.blob_cache is None:
+            return {'enabled': False}
+        return self.blob_cache.stats()
+    
+    def single_flight_stats(self):
+        """Return how many GET requests shared another caller's in-flight upstream call"""
+        return self.session.single_flight.stats()
+    
+    def rate_limit_status(self):
+        """Return the last known budget of each rate-limit resource"""
+        return self.session.scheduler.snapshot()
+    
     def search_code(self, query, language=None, sort='best-match', order='desc', per_page=30, file_filter=None, check_config_files=False):
         """
         Search for code on GitHub
@@ -51,6 +455,98 @@ class GitHubCodeSearch:
             check_config_files (bool): Whether to check for config files in repositories
         """
         # Build search query
+        search_query = self._build_search_query(query, language, file_filter)
+        
+        print(f"{Fore.BLUE}Searching for: {search_query}{Style.RESET_ALL}")
+        
+        results = self.fetch_search_page(search_query, sort, order, per_page)
+        if results is not None:
+            results['items'] = self.enrich_search_items(results['items'], sort, check_config_files)
+        return results
+    
+    def search_pages(self, query, language=None, sort='best-match', order='desc', per_page=30, file_filter=None, check_config_files=False, max_results=SEARCH_RESULT_LIMIT, enrich=None):
+        """
+        Walk the pages of a code search, one enriched page at a time
+        
+        Takes the same arguments as search_code, plus the number of results
+        to stop after (GitHub serves at most the first 1,000) and an optional
+        replacement for enrich_search_items (see SearchCursor).
+        
+        Returns:
+            SearchCursor: Call next_page() (or iterate) for each page
+        """
+        return SearchCursor(
+            self,
+            self._build_search_query(query, language, file_filter),
+            sort=sort,
+            order=order,
+            per_page=per_page,
+            check_config_files=check_config_files,
+            max_results=max_results,
+            enrich=enrich
+        )
+    
+    def fetch_search_page(self, search_query, sort='best-match', order='desc', per_page=30, page=1):
+        """
+        Fetch one page of raw code search results (without enrichment)
+        
+        Args:
+            search_query (str): Full query, qualifiers included (see _build_search_query)
+        
+        Returns:
+            dict: The search API response, or None if the search failed
+        """
+        url = f"{self.base_url}/search/code"
+        params = {
+            'q': search_query,
+            'sort': sort,
+            'order': order,
+            'per_page': min(per_page, 100)
+        }
+        if page > 1:
+            params['page'] = page
+        
+        # Make request; searches are admitted ahead of queued background work
+        with self.session.priority(PRIORITY_INTERACTIVE):
+            response = self.session.get(url, params=params)
+        
+        if response.status_code == 200:
+            return response.json()
+        
+        print(f"{Fore.RED}Search failed with status code: {response.status_code}{Style.RESET_ALL}")
+        if response.status_code == 403:
+            print(f"{Fore.RED}Rate limit exceeded. Please wait or use authentication.{Style.RESET_ALL}")
+        return None
+    
+    def enrich_search_items(self, items, sort='best-match', check_config_files=False, known_config_files=None):
+        """
+        Add commit dates (when sorting by date) and config files to search results
+        
+        Args:
+            items (list): Search result items; enriched in place
+            known_config_files (dict, optional): Repository -> config files
+                already found, e.g. for an earlier page; filled in as repositories
+                are checked so each repository is listed once per search
+        """
+        # If sorting by date, enrich results with commit dates
+        if sort == 'indexed':
+            print(f"{Fore.YELLOW}Enriching results with commit dates...{Style.RESET_ALL}")
+            items = self._enrich_items_with_dates(items)
+            
+            # Sort by the fetched dates (descending by default)
+            items.sort(key=lambda x: x.get('_fetched_date', ''), reverse=True)
+            print(f"{Fore.GREEN}Results sorted by commit date (newest first){Style.RESET_ALL}")
+        
+        # Check for config files if enabled
+        if check_config_files:
+            print(f"{Fore.YELLOW}Checking for configuration files in repositories...{Style.RESET_ALL}")
+            items = self._enrich_items_with_config_files(items, known_config_files)
+        
+        return items
+    
+    @staticmethod
+    def _build_search_query(query, language=None, file_filter=None):
+        """Add the language and file extension qualifiers to a code search query"""
         search_query = query
         
         if language:
@@ -81,228 +577,438 @@ class GitHubCodeSearch:
                         extension_filters.append(f'-extension:{ext}')
                 search_query += f" {' '.join(extension_filters)}"
         
-        # Build URL
-        url = f"{self.base_url}/search/code"
-        params = {
-            'q': search_query,
-            'sort': sort,
-            'order': order,
-            'per_page': min(per_page, 100)
-        }
-        
-        print(f"{Fore.BLUE}Searching for: {search_query}{Style.RESET_ALL}")
+        return search_query
+    
+    def _enrich_items_with_dates(self, items):
+        """Fetch additional file information to get proper last modified dates using the commits API
+
+        Items are enriched concurrently on a bounded worker pool (see
+        ``max_workers``); the returned list keeps the order of ``items``.
+        With the 'graphql' date backend, items are first answered in batched
+        GraphQL queries and only the rest go through the commits API.
+        """
+        if not items:
+            return []
         
-        # Make request
-        response = self.session.get(url, params=params)
+        # Results seen before (e.g. on an earlier page) keep the date they were given
+        pending = self._apply_known_dates(items)
+        # GraphQL does not accept unauthenticated requests
+        if pending and self.date_backend == 'graphql' and self.session.scheduler.tokens:
+            pending = self._enrich_items_with_dates_graphql(pending)
         
-        if response.status_code == 200:
-            results = response.json()
-            
-            # If sorting by date, enrich results with commit dates
-            if sort == 'indexed':
-                print(f"{Fore.YELLOW}Enriching results with commit dates...{Style.RESET_ALL}")
-                results['items'] = self._enrich_items_with_dates(results['items'])
-                
-                # Sort by the fetched dates (descending by default)
-                results['items'].sort(key=lambda x: x.get('_fetched_date', ''), reverse=True)
-                print(f"{Fore.GREEN}Results sorted by commit date (newest first){Style.RESET_ALL}")
-            
-            # Check for config files if enabled
-            if check_config_files:
-                print(f"{Fore.YELLOW}Checking for configuration files in repositories...{Style.RESET_ALL}")
-                results['items'] = self._enrich_items_with_config_files(results['items'])
-            
-            return results
-        else:
-            print(f"{Fore.RED}Search failed with status code: {response.status_code}{Style.RESET_ALL}")
-            if response.status_code == 403:
-                print(f"{Fore.RED}Rate limit exceeded. Please wait or use authentication.{Style.RESET_ALL}")
-            return None
+        if pending:
+            workers = min(self.max_workers, len(pending))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='enrich-dates') as executor:
+                list(executor.map(self.session.bind_priority(self._enrich_item_with_date, PRIORITY_BACKGROUND), pending))
+        self._remember_dates(items)
+        return items
     
-    def _enrich_items_with_dates(self, items):
-        """Fetch additional file information to get proper last modified dates using the commits API"""
-        enriched_items = []
-        for item in items:
-            try:
-                repo_name = item['repository']['full_name']
-                file_path = item['path']
-                # Get the latest commit for this file
-                commits_url = f"{self.base_url}/repos/{repo_name}/commits?path={file_path}&per_page=1"
-                commit_response = self.session.get(commits_url)
-                if commit_response.status_code == 200:
-                    commits_data = commit_response.json()
-                    if commits_data:
-                        latest_commit = commits_data[0]
-                        commit_date = latest_commit.get('commit', {}).get('author', {}).get('date', '')
-                        item['_fetched_date'] = commit_date
-                        item['updated_at'] = commit_date
-                    else:
-                        item['_fetched_date'] = ''
-                        item['updated_at'] = ''
+    @staticmethod
+    def _date_key(item):
+        # The blob SHA pins the file version, so its last-commit date cannot change
+        return (item['repository']['full_name'].lower(), item['path'], item.get('sha', ''))
+    
+    def _apply_known_dates(self, items):
+        """Set remembered dates on items; returns the items that still need a lookup"""
+        pending = []
+        with self._date_cache_lock:
+            for item in items:
+                if item.get('_fetched_date'):
+                    continue
+                commit_date = self._date_cache.get(self._date_key(item))
+                if commit_date:
+                    self._date_cache.move_to_end(self._date_key(item))
+                    item['_fetched_date'] = commit_date
+                    item['updated_at'] = commit_date
                 else:
-                    item['_fetched_date'] = ''
-                    item['updated_at'] = ''
-                enriched_items.append(item)
-                time.sleep(0.1)  # avoid rate limiting
-            except Exception as e:
-                print(f"{Fore.YELLOW}Warning: Could not fetch date for {item.get('path', 'unknown')}: {e}{Style.RESET_ALL}")
-                item['_fetched_date'] = ''
-                item['updated_at'] = ''
-                enriched_items.append(item)
-        return enriched_items
-    
-    def _enrich_items_with_config_files(self, items):
-        """Check for environment and configuration files in each repository"""
-        enriched_items = []
+                    pending.append(item)
+        return pending
+    
+    def _remember_dates(self, items):
+        with self._date_cache_lock:
+            for item in items:
+                if item.get('_fetched_date') and 'sha' in item:
+                    self._date_cache[self._date_key(item)] = item['_fetched_date']
+            while len(self._date_cache) > self.date_cache_size:
+                self._date_cache.popitem(last=False)
+    
+    def _enrich_items_with_dates_graphql(self, items):
+        """
+        Set '_fetched_date' and 'updated_at' on items with batched GraphQL queries
+        
+        Returns:
+            list: Items GraphQL could not answer, to be enriched over REST
+        """
+        batches = [items[i:i + self.graphql_batch_size] for i in range(0, len(items), self.graphql_batch_size)]
+        workers = min(self.max_workers, len(batches))
+        fetch = self.session.bind_priority(self._fetch_dates_graphql, PRIORITY_BACKGROUND)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='enrich-dates-graphql') as executor:
+            return [item for unresolved in executor.map(fetch, batches) for item in unresolved]
+    
+    def _fetch_dates_graphql(self, batch):
+        """Fetch the last-commit dates of one batch of items in a single aliased query; returns the unresolved items"""
+        query, variables, aliases = self._build_dates_query(batch)
         
-        # Track repositories we've already checked to avoid duplicate API calls
-        checked_repos = {}
+        try:
+            response = self.session.post(
+                self.graphql_url,
+                json={'query': query, 'variables': variables},
+                timeout=self.request_timeout
+            )
+            if response.status_code != 200:
+                print(f"{Fore.YELLOW}Warning: GraphQL date query failed ({response.status_code}), falling back to REST{Style.RESET_ALL}")
+                return batch
+            data = response.json().get('data') or {}
+        except Exception as e:
+            print(f"{Fore.YELLOW}Warning: GraphQL date query failed ({e}), falling back to REST{Style.RESET_ALL}")
+            return batch
         
-        for item in items:
+        return self._apply_dates(aliases, data)
+    
+    @staticmethod
+    def _build_dates_query(batch):
+        """
+        Build one aliased GraphQL query for the last-commit dates of a batch of items
+        
+        Returns:
+            tuple: (query, variables, aliases), aliases being (repository alias,
+            history alias, item) triples for _apply_dates
+        """
+        # One repository alias per repository, one history alias per file in it
+        repos = OrderedDict()
+        for item in batch:
+            repos.setdefault(item['repository']['full_name'], []).append(item)
+        
+        declarations = []
+        selections = []
+        variables = {}
+        aliases = []
+        file_index = 0
+        for repo_index, (repo_name, repo_items) in enumerate(repos.items()):
+            owner, _, name = repo_name.partition('/')
+            variables[f'o{repo_index}'] = owner
+            variables[f'n{repo_index}'] = name
+            declarations += [f'$o{repo_index}: String!', f'$n{repo_index}: String!']
+            histories = []
+            for item in repo_items:
+                variables[f'p{file_index}'] = item['path']
+                declarations.append(f'$p{file_index}: String!')
+                histories.append(f'f{file_index}: history(first: 1, path: $p{file_index}) {{ nodes {{ author {{ date }} }} }}')
+                aliases.append((f'r{repo_index}', f'f{file_index}', item))
+                file_index += 1
+            selections.append(
+                f'r{repo_index}: repository(owner: $o{repo_index}, name: $n{repo_index}) '
+                f'{{ defaultBranchRef {{ target {{ ... on Commit {{ {" ".join(histories)} }} }} }} }}'
+            )
+        query = f'query({", ".join(declarations)}) {{ {" ".join(selections)} }}'
+        return query, variables, aliases
+    
+    @staticmethod
+    def _apply_dates(aliases, data):
+        """Set the dates from a GraphQL response's data on their items; returns the unresolved items"""
+        unresolved = []
+        for repo_alias, file_alias, item in aliases:
+            target = ((data.get(repo_alias) or {}).get('defaultBranchRef') or {}).get('target') or {}
+            history = target.get(file_alias)
+            if history is None:
+                # Partial errors null out single repositories or fields
+                unresolved.append(item)
+                continue
+            nodes = history.get('nodes') or []
+            commit_date = _utc_timestamp(nodes[0].get('author', {}).get('date', '')) if nodes else ''
+            item['_fetched_date'] = commit_date
+            item['updated_at'] = commit_date
+        return unresolved
+    
+    def _enrich_item_with_date(self, item):
+        """Set '_fetched_date' and 'updated_at' on a single item from its latest commit
+
+        Failures are recorded on the item under '_enrich_error' instead of being raised.
+        """
+        item['_fetched_date'] = ''
+        item['updated_at'] = ''
+        try:
             repo_name = item['repository']['full_name']
-            
-            # Check if we've already examined this repository
-            if repo_name in checked_repos:
-                item['config_files'] = checked_repos[repo_name]
+            file_path = item['path']
+            # Get the latest commit for this file
+            commits_url = f"{self.base_url}/repos/{repo_name}/commits"
+            commit_response = self.session.get(
+                commits_url,
+                params={'path': file_path, 'per_page': 1},
+                timeout=self.request_timeout
+            )
+            if commit_response.status_code == 200:
+                commits_data = commit_response.json()
+                if commits_data:
+                    latest_commit = commits_data[0]
+                    commit_date = latest_commit.get('commit', {}).get('author', {}).get('date', '')
+                    item['_fetched_date'] = commit_date
+                    item['updated_at'] = commit_date
             else:
-                config_files = self._find_config_files_in_repo(repo_name)
-                item['config_files'] = config_files
-                checked_repos[repo_name] = config_files
-            
-            enriched_items.append(item)
+                item['_enrich_error'] = f"HTTP {commit_response.status_code}"
+        except Exception as e:
+            print(f"{Fore.YELLOW}Warning: Could not fetch date for {item.get('path', 'unknown')}: {e}{Style.RESET_ALL}")
+            item['_enrich_error'] = str(e)
+        return item
+    
+    def _enrich_items_with_config_files(self, items, known_config_files=None):
+        """Check for environment and configuration files in each repository"""
+        checked_repos = {} if known_config_files is None else known_config_files
+        # Each repository is listed once, however many results it has
+        repo_names = [
+            repo_name for repo_name in dict.fromkeys(item['repository']['full_name'] for item in items)
+            if repo_name not in checked_repos
+        ]
+        
+        if repo_names:
+            workers = min(self.max_workers, len(repo_names))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='config-files') as executor:
+                find_config_files = self.session.bind_priority(self._find_config_files_in_repo, PRIORITY_BACKGROUND)
+                checked_repos.update(zip(repo_names, executor.map(find_config_files, repo_names)))
+        
+        for item in items:
+            item['config_files'] = checked_repos[item['repository']['full_name']]
         
-        return enriched_items
+        return items
     
     def _find_config_files_in_repo(self, repo_name):
-        """Find environment and configuration files in a repository"""
+        """
+        Find environment and configuration files in a repository
+        
+        Matches file names from one recursive tree listing of the default
+        branch (revalidated through the HTTP cache) against ENV_FILE_PATTERNS
+        and CONFIG_FILE_PATTERNS, so every file is found with a single
+        core-API request instead of one code search per pattern.
+        
+        A truncated listing is used as returned, plus the root level and the
+        top-level CONFIG_DIRECTORIES; the tree is never walked in full for this.
+        """
         config_files = {
             'env_files': [],
             'config_files': []
         }
         
-        # Define file patterns to search for
-        env_patterns = [
-            '.env', '.env.local', '.env.development', '.env.production', 
-            '.env.test', '.env.staging', 'environment', 'env'
-        ]
+        tree_data = self._fetch_tree_listing(repo_name, 'HEAD')
+        if tree_data is None:
+            print(f"{Fore.YELLOW}Warning: Could not check config files for {repo_name}{Style.RESET_ALL}")
+            return config_files
         
-        config_patterns = [
-            '.config', '.cfg', '.conf', '.ini', '.yaml', '.yml', '.toml', 
-            '.json', '.xml', 'config', 'configuration', 'settings'
-        ]
+        entries = self._listed_tree_entries(tree_data)
+        if tree_data.get('truncated'):
+            root = self._list_tree_level(repo_name, tree_data['sha'], '')
+            for directory in self._config_directories(root):
+                root += self._list_tree_level(repo_name, directory['sha'], directory['path'])
+            entries = self._merge_tree_entries(entries, root)
         
-        try:
-            # Search for environment files
-            for pattern in env_patterns:
-                env_results = self._search_files_in_repo(repo_name, pattern)
-                if env_results:
-                    config_files['env_files'].extend(env_results)
-                time.sleep(0.1)  # Rate limiting
-            
-            # Search for configuration files
-            for pattern in config_patterns:
-                config_results = self._search_files_in_repo(repo_name, pattern)
-                if config_results:
-                    config_files['config_files'].extend(config_results)
-                time.sleep(0.1)  # Rate limiting
-            
-            # Remove duplicates
-            config_files['env_files'] = list(set(config_files['env_files']))
-            config_files['config_files'] = list(set(config_files['config_files']))
-            
-        except Exception as e:
-            print(f"{Fore.YELLOW}Warning: Could not check config files for {repo_name}: {e}{Style.RESET_ALL}")
+        return self._match_config_files(entries)
+    
+    @staticmethod
+    def _config_directories(root_entries):
+        """The CONFIG_DIRECTORIES among the entries of a repository's root level"""
+        return [entry for entry in root_entries if entry['type'] == 'tree' and entry['path'].lower() in CONFIG_DIRECTORIES]
+    
+    @staticmethod
+    def _merge_tree_entries(entries, extra):
+        """Entries plus those of `extra` whose path is not among them yet"""
+        known = {entry['path'] for entry in entries}
+        return entries + [entry for entry in extra if entry['path'] not in known]
+    
+    @staticmethod
+    def _match_config_files(entries):
+        """Pick environment and configuration files out of tree entries by file name"""
+        config_files = {
+            'env_files': [],
+            'config_files': []
+        }
+        
+        for entry in entries:
+            if entry['type'] != 'blob':
+                continue
+            filename = entry['path'].rsplit('/', 1)[-1].lower()
+            if _ENV_FILE_RE.match(filename):
+                config_files['env_files'].append(entry['path'])
+            elif filename.endswith(CONFIG_FILE_SUFFIXES) or _CONFIG_FILE_RE.match(filename):
+                config_files['config_files'].append(entry['path'])
         
         return config_files
     
-    def _search_files_in_repo(self, repo_name, filename):
-        """Search for specific files in a repository"""
+    def resolve_commit_sha(self, repo_name, ref='HEAD'):
+        """Resolve a branch, tag or 'HEAD' (the default branch) to a full commit SHA"""
         try:
-            url = f"{self.base_url}/search/code"
-            params = {
-                'q': f'repo:{repo_name} filename:{filename}',
-                'per_page': 10
-            }
-            
-            response = self.session.get(url, params=params)
-            
+            url = f"{self.base_url}/repos/{repo_name}/commits/{ref}"
+            response = self.session.get(
+                url,
+                headers={'Accept': 'application/vnd.github.sha'},
+                timeout=self.request_timeout
+            )
             if response.status_code == 200:
-                results = response.json()
-                return [item['path'] for item in results.get('items', [])]
-            else:
-                return []
-                
+                return response.text.strip()
+            print(f"{Fore.YELLOW}Warning: Could not resolve {ref} in {repo_name}: {response.status_code}{Style.RESET_ALL}")
         except Exception as e:
-            print(f"{Fore.YELLOW}Warning: Error searching for {filename} in {repo_name}: {e}{Style.RESET_ALL}")
-            return []
+            print(f"{Fore.YELLOW}Warning: Could not resolve {ref} in {repo_name}: {e}{Style.RESET_ALL}")
+        return None
     
-    def format_result(self, item, index):
-        """Format a single search result for display"""
-        repo_name = item['repository']['full_name']
-        file_path = item['path']
-        file_url = item['html_url']
+    def get_repository_tree(self, repo_name, ref):
+        """
+        Get every entry of a repository tree with a single recursive git-trees request
+        
+        Falls back to a parallel directory walk when GitHub truncates the
+        recursive listing. Results for full commit SHAs are cached in memory.
         
-        # Extract file name from path
-        file_name = file_path.split('/')[-1] if '/' in file_path else file_path
+        Args:
+            repo_name (str): Repository full name ('owner/repo')
+            ref (str): Commit SHA, branch name or 'HEAD'
         
-        # Show original values from API
-        size = item.get('size', 'Unknown')
-        language = item.get('language', 'Unknown')
-        updated_at = item.get('updated_at', 'Unknown')
+        Returns:
+            list: Dicts with 'path', 'type' ('blob' or 'tree'), 'size' and 'sha',
+            or None if the tree could not be fetched
+        """
+        entries = self._cached_tree(repo_name, ref)
+        if entries is not None:
+            return entries
         
-        # Check if result is older than 1 month (use UTC for both)
-        is_old = False
-        if updated_at and updated_at != 'Unknown':
-            try:
-                update_date = parser.parse(updated_at)
-                now_utc = datetime.utcnow().replace(tzinfo=update_date.tzinfo)
-                one_month_ago = now_utc - timedelta(days=30)
-                is_old = update_date < one_month_ago
-            except Exception as e:
-                pass
-        
-        # Get code snippet with context
-        code_snippet = self._get_code_snippet_with_context(item)
-        
-        # Format the result
-        result = f"{Fore.CYAN}{index + 1}.{Style.RESET_ALL} "
-        
-        # Add red indicator for old results
-        if is_old:
-            result += f"{Fore.RED}[OLD]{Style.RESET_ALL} "
-        
-        result += f"{Fore.GREEN}{repo_name}/{file_path}{Style.RESET_ALL}\n"
-        result += f"   {Fore.YELLOW}Repository:{Style.RESET_ALL} {repo_name}\n"
-        result += f"   {Fore.YELLOW}File:{Style.RESET_ALL} {file_name}\n"
-        result += f"   {Fore.YELLOW}Language:{Style.RESET_ALL} {language} | {Fore.YELLOW}Size:{Style.RESET_ALL} {size}\n"
-        
-        # Color the date red if old
-        date_color = Fore.RED if is_old else Fore.YELLOW
-        result += f"   {date_color}Updated:{Style.RESET_ALL} {updated_at}\n"
-        result += f"   {Fore.YELLOW}URL:{Style.RESET_ALL} {file_url}\n"
-        
-        # Add config file indicators if available
-        config_files = item.get('config_files', {})
-        if config_files:
-            env_files = config_files.get('env_files', [])
-            config_files_list = config_files.get('config_files', [])
-            
-            if env_files:
-                result += f"   {Fore.MAGENTA}🔧 Env Files:{Style.RESET_ALL} {', '.join(env_files[:3])}"
-                if len(env_files) > 3:
-                    result += f" (+{len(env_files) - 3} more)"
-                result += "\n"
-            
-            if config_files_list:
-                result += f"   {Fore.MAGENTA}⚙️  Config Files:{Style.RESET_ALL} {', '.join(config_files_list[:3])}"
-                if len(config_files_list) > 3:
-                    result += f" (+{len(config_files_list) - 3} more)"
-                result += "\n"
+        tree_data = self._fetch_tree_listing(repo_name, ref)
+        if tree_data is None:
+            return None
+        
+        if tree_data.get('truncated'):
+            print(f"{Fore.YELLOW}Tree for {repo_name} is truncated, walking directories instead...{Style.RESET_ALL}")
+            entries = self._walk_tree(repo_name, tree_data['sha'])
+        else:
+            entries = self._listed_tree_entries(tree_data)
+        
+        self._remember_tree(repo_name, ref, entries)
+        return entries
+    
+    def _fetch_tree_listing(self, repo_name, ref):
+        """The recursive git-trees response of a ref (possibly truncated), or None"""
+        try:
+            url = f"{self.base_url}/repos/{repo_name}/git/trees/{ref}"
+            response = self.session.get(url, params={'recursive': 1}, timeout=self.request_timeout)
+            if response.status_code != 200:
+                print(f"{Fore.YELLOW}Warning: Could not fetch tree for {repo_name}@{ref}: {response.status_code}{Style.RESET_ALL}")
+                return None
+            return response.json()
+        except Exception as e:
+            print(f"{Fore.YELLOW}Warning: Could not fetch tree for {repo_name}@{ref}: {e}{Style.RESET_ALL}")
+            return None
+    
+    def _listed_tree_entries(self, tree_data):
+        return [self._tree_entry(entry) for entry in tree_data.get('tree', []) if entry.get('type') in ('blob', 'tree')]
+    
+    def _cached_tree(self, repo_name, ref):
+        """Return the in-memory tree of a full commit SHA, or None"""
+        if not _COMMIT_SHA_RE.match(ref):
+            return None
+        cache_key = (repo_name.lower(), ref)
+        with self._tree_cache_lock:
+            if cache_key in self._tree_cache:
+                self._tree_cache.move_to_end(cache_key)
+                return self._tree_cache[cache_key]
+        return None
+    
+    def _remember_tree(self, repo_name, ref, entries):
+        """Keep the tree of a full commit SHA in the in-memory LRU"""
+        if not _COMMIT_SHA_RE.match(ref):
+            return
+        with self._tree_cache_lock:
+            self._tree_cache[(repo_name.lower(), ref)] = entries
+            self._tree_blob_shas.pop((repo_name.lower(), ref), None)
+            while len(self._tree_cache) > self.tree_cache_size:
+                evicted, _ = self._tree_cache.popitem(last=False)
+                self._tree_blob_shas.pop(evicted, None)
+    
+    def _known_blob_sha(self, repo_name, commit_sha, file_path):
+        """Blob SHA of a file from the in-memory tree of its commit, without a request; None if that tree is not loaded"""
+        cache_key = (repo_name.lower(), commit_sha)
+        with self._tree_cache_lock:
+            blob_shas = self._tree_blob_shas.get(cache_key)
+            if blob_shas is None:
+                entries = self._tree_cache.get(cache_key)
+                if entries is None:
+                    return None
+                blob_shas = self._tree_blob_shas[cache_key] = {
+                    entry['path']: entry['sha'] for entry in entries if entry['type'] == 'blob'
+                }
+        return blob_shas.get(file_path)
+    
+    def _walk_tree(self, repo_name, tree_sha):
+        """List a tree level by level, fetching sibling directories concurrently"""
+        entries = []
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='tree-walk') as executor:
+            list_tree_level = self.session.bind_priority(self._list_tree_level)
+            pending = {executor.submit(list_tree_level, repo_name, tree_sha, '')}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for entry in future.result():
+                        entries.append(entry)
+                        if entry['type'] == 'tree':
+                            pending.add(executor.submit(list_tree_level, repo_name, entry['sha'], entry['path']))
+        entries.sort(key=lambda entry: entry['path'])
+        return entries
+    
+    def _list_tree_level(self, repo_name, tree_sha, prefix):
+        """List the direct children of one tree object, with paths relative to the repository root"""
+        try:
+            url = f"{self.base_url}/repos/{repo_name}/git/trees/{tree_sha}"
+            response = self.session.get(url, timeout=self.request_timeout)
+            if response.status_code == 200:
+                entries = []
+                for entry in response.json().get('tree', []):
+                    if entry.get('type') in ('blob', 'tree'):
+                        entry = self._tree_entry(entry)
+                        entry['path'] = f"{prefix}/{entry['path']}" if prefix else entry['path']
+                        entries.append(entry)
+                return entries
+            print(f"{Fore.YELLOW}Warning: Could not list {repo_name}/{prefix}: {response.status_code}{Style.RESET_ALL}")
+        except Exception as e:
+            print(f"{Fore.YELLOW}Warning: Could not list {repo_name}/{prefix}: {e}{Style.RESET_ALL}")
+        return []
+    
+    def iter_archive_files(self, repo_name, ref, paths=None):
+        """
+        Stream the repository tarball and yield (path, bytes) for its regular files
         
-        if code_snippet:
-            result += f"   {Fore.YELLOW}Code Snippet:{Style.RESET_ALL}\n{Fore.WHITE}{code_snippet}{Style.RESET_ALL}\n"
+        The archive is decompressed while it downloads, so nothing is written
+        to disk and only one file body is held in memory at a time.
         
-        return result
+        Args:
+            repo_name (str): Repository full name ('owner/repo')
+            ref (str): Commit SHA or branch to archive
+            paths (set, optional): Only yield these repository-relative paths
+        
+        Raises:
+            requests.HTTPError: If the archive cannot be downloaded
+        """
+        url = f"{self.base_url}/repos/{repo_name}/tarball/{ref}"
+        with self.session.get(url, stream=True, timeout=self.request_timeout) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            with tarfile.open(fileobj=response.raw, mode='r|gz') as archive:
+                for member in archive:
+                    if not member.isfile() or '/' not in member.name:
+                        continue
+                    # Strip the '<owner>-<repo>-<sha>/' prefix GitHub puts on every entry
+                    path = member.name.split('/', 1)[1]
+                    if paths is not None and path not in paths:
+                        continue
+                    handle = archive.extractfile(member)
+                    if handle is not None:
+                        yield path, handle.read()
+    
+    @staticmethod
+    def _tree_entry(entry):
+        return {
+            'path': entry['path'],
+            'type': entry['type'],
+            'size': entry.get('size', 0),
+            'sha': entry.get('sha', '')
+        }
+    
+    def format_result(self, item, index):
+        """Format a single search result for display"""
+        return SearchResult.from_item(item).to_terminal(index)
     
     def display_results(self, results):
         """Display search results in a formatted way"""
@@ -326,9 +1032,12 @@ class GitHubCodeSearch:
         print(f"{Fore.CYAN}GitHub Code Search Tool{Style.RESET_ALL}")
         print("=" * 50)
         
-        # Get GitHub token (optional)
-        token = input(f"{Fore.YELLOW}Enter GitHub Personal Access Token (optional, press Enter to skip):{Style.RESET_ALL} ").strip()
-        self.set_token(token)
+        # Get GitHub token (optional) unless a pool was loaded from the environment
+        if self.session.scheduler.tokens:
+            self.set_tokens(self.session.scheduler.tokens)
+        else:
+            token = input(f"{Fore.YELLOW}Enter GitHub Personal Access Token (optional, press Enter to skip):{Style.RESET_ALL} ").strip()
+            self.set_token(token)
         
         while True:
             print(f"\n{Fore.CYAN}Enter your search query (or 'quit' to exit):{Style.RESET_ALL}")
@@ -375,9 +1084,10 @@ class GitHubCodeSearch:
             else:
                 print(f"{Fore.RED}Search failed. Please try again.{Style.RESET_ALL}")
             
-            # Rate limiting info
-            remaining = self.session.headers.get('X-RateLimit-Remaining', 'Unknown')
-            reset_time = self.session.headers.get('X-RateLimit-Reset', 'Unknown')
+            # Rate limiting info, as reported on the last code search response
+            budget = self.rate_limit_status()['resources']['code_search']
+            remaining = budget['remaining'] if budget['remaining'] is not None else 'Unknown'
+            reset_time = budget['reset'] if budget['reset'] is not None else 'Unknown'
             
             if reset_time != 'Unknown':
                 reset_time = datetime.fromtimestamp(int(reset_time)).strftime('%Y-%m-%d %H:%M:%S')
@@ -414,8 +1124,10 @@ class GitHubCodeSearch:
                     except ValueError:
                         pass
                 
+                patch_only = input(f"{Fore.YELLOW}Show only the changes of each commit? (y/N):{Style.RESET_ALL} ").strip().lower() == 'y'
+                
                 # Show commit history
-                self.get_file_commit_history(repo_name, file_path, max_commits)
+                self.get_file_commit_history(repo_name, file_path, max_commits, patch_only=patch_only)
                 
                 # Ask if user wants to continue
                 input(f"\n{Fore.CYAN}Press Enter to continue...{Style.RESET_ALL}")
@@ -428,45 +1140,19 @@ class GitHubCodeSearch:
     
     def _get_code_snippet_with_context(self, item):
         """Get code snippet with 2 lines before and after the matched text, always highlighting the match"""
-        text_matches = item.get('text_matches', [])
-        if not text_matches:
-            return ""
-        
-        # Use the first text match
-        match = text_matches[0]
-        fragment = match.get('fragment', '')
-        matched_text = match.get('text', '')
-        
-        if not fragment or not matched_text:
-            return fragment or ""
-        
-        # Find all lines containing the matched text
-        lines = fragment.split('\n')
-        match_indices = [i for i, line in enumerate(lines) if matched_text in line]
-        if not match_indices:
-            # fallback: highlight all occurrences in the fragment
-            highlighted = fragment.replace(matched_text, f"{Fore.RED}{matched_text}{Style.RESET_ALL}")
-            return highlighted
-        
-        # For each match, show 2 lines before and after (but only the first match for now)
-        idx = match_indices[0]
-        start_line = max(0, idx - 2)
-        end_line = min(len(lines), idx + 3)
-        context_lines = lines[start_line:end_line]
-        
-        result_lines = []
-        for i, line in enumerate(context_lines):
-            line_num = start_line + i + 1
-            if start_line + i == idx:
-                # Highlight all occurrences of the matched text in the line
-                highlighted_line = line.replace(matched_text, f"{Fore.RED}{matched_text}{Style.RESET_ALL}")
-                result_lines.append(f"   >> {line_num:3d}: {highlighted_line}")
-            else:
-                result_lines.append(f"      {line_num:3d}: {line}")
-        return '\n'.join(result_lines)
+        return SearchResult.from_item(item).snippet_text(highlight=terminal_highlight)
 
-    def get_file_commit_history(self, repo_name, file_path, max_commits=10):
-        """Get the full commit history for a specific file"""
+    def get_file_commit_history(self, repo_name, file_path, max_commits=10, patch_only=False):
+        """
+        Get the full commit history for a specific file
+        
+        Args:
+            repo_name (str): Repository full name ('owner/repo')
+            file_path (str): Path of the file in the repository
+            max_commits (int): Number of most recent commits to show
+            patch_only (bool): Show the lines each commit changed instead of
+                the first lines of the whole file at every commit
+        """
         commits_url = f"{self.base_url}/repos/{repo_name}/commits?path={file_path}&per_page={max_commits}"
         
         try:
@@ -482,6 +1168,15 @@ class GitHubCodeSearch:
                 print(f"\n{Fore.GREEN}Found {len(commits)} commits for {repo_name}/{file_path}{Style.RESET_ALL}")
                 print("=" * 80)
                 
+                # Fetch the file (or only its changes) at every commit up front, in parallel
+                commit_shas = [commit.get('sha', '') for commit in commits]
+                if patch_only:
+                    changes = self.get_file_changes_at_commits(repo_name, file_path, commit_shas)
+                    contents = {}
+                else:
+                    changes = {}
+                    contents = self.get_file_contents_at_commits(repo_name, file_path, commit_shas)
+                
                 for i, commit in enumerate(commits):
                     commit_sha = commit.get('sha', '')[:8]  # Short SHA
                     commit_date = commit.get('commit', {}).get('author', {}).get('date', '')
@@ -501,9 +1196,14 @@ class GitHubCodeSearch:
                     print(f"   {Fore.YELLOW}Author:{Style.RESET_ALL} {author_name}")
                     print(f"   {Fore.YELLOW}Message:{Style.RESET_ALL} {commit_message}")
                     
-                    # Get the file content for this commit
+                    if patch_only:
+                        self._print_file_change(changes.get(commit.get('sha', '')))
+                        print("-" * 80)
+                        continue
+                    
+                    # Show the file content for this commit
                     try:
-                        file_content = self._get_file_content_at_commit(repo_name, file_path, commit_sha)
+                        file_content = contents.get(commit.get('sha', ''))
                         if file_content:
                             print(f"   {Fore.YELLOW}File Content:{Style.RESET_ALL}")
                             # Show first 10 lines of the file
@@ -525,31 +1225,267 @@ class GitHubCodeSearch:
         except Exception as e:
             print(f"{Fore.RED}Error: {e}{Style.RESET_ALL}")
     
+    def _print_file_change(self, change, max_lines=20):
+        """Print the diff lines of one commit's change to a file"""
+        if change is None:
+            print(f"   {Fore.RED}Could not fetch the changes of this commit{Style.RESET_ALL}")
+            return
+        print(f"   {Fore.YELLOW}Changes:{Style.RESET_ALL} {change['status']}, "
+              f"{Fore.GREEN}+{change['additions']}{Style.RESET_ALL} {Fore.RED}-{change['deletions']}{Style.RESET_ALL}")
+        if not change['hunks']:
+            print(f"      {Fore.YELLOW}(no textual diff available){Style.RESET_ALL}")
+            return
+        
+        shown = 0
+        total = sum(len(hunk['lines']) for hunk in change['hunks'])
+        for hunk in change['hunks']:
+            if shown >= max_lines:
+                break
+            print(f"      {Fore.CYAN}@@ -{hunk['old_start']},{hunk['old_lines']} +{hunk['new_start']},{hunk['new_lines']} @@ {hunk['section']}{Style.RESET_ALL}")
+            for line in hunk['lines'][:max_lines - shown]:
+                if line['type'] == 'add':
+                    print(f"      {Fore.GREEN}{line['new_line']:4d} + {line['text']}{Style.RESET_ALL}")
+                elif line['type'] == 'del':
+                    print(f"      {Fore.RED}{line['old_line']:4d} - {line['text']}{Style.RESET_ALL}")
+                else:
+                    print(f"      {line['new_line']:4d}   {line['text']}")
+                shown += 1
+        if total > shown:
+            print(f"      ... ({total - shown} more diff lines)")
+    
+    def get_file_changes_at_commits(self, repo_name, file_path, commit_shas):
+        """
+        Get only what each commit changed in a file, fetching in parallel
+        
+        Reads files[].patch from the commit endpoint, so the cost per commit
+        is the size of its diff rather than the size of the file.
+        
+        Returns:
+            dict: Commit SHA -> dict with 'filename', 'status', 'additions',
+            'deletions', 'changes', 'patch_available' and 'hunks' (see
+            parse_patch), or None where the commit could not be fetched
+        """
+        unique_shas = list(dict.fromkeys(sha for sha in commit_shas if sha))
+        if not unique_shas:
+            return {}
+        
+        fetch = self.session.bind_priority(
+            lambda sha: self._get_file_change_at_commit(repo_name, file_path, sha)
+        )
+        workers = min(self.max_workers, len(unique_shas))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='file-changes') as executor:
+            return dict(zip(unique_shas, executor.map(fetch, unique_shas)))
+    
+    def _get_file_change_at_commit(self, repo_name, file_path, commit_sha):
+        """Get the change a commit made to a file, parsed into hunks"""
+        try:
+            url = f"{self.base_url}/repos/{repo_name}/commits/{commit_sha}"
+            response = self.session.get(url, timeout=self.request_timeout)
+            if response.status_code != 200:
+                return None
+            return self._file_change_from_commit(response.json(), file_path)
+            
+        except Exception as e:
+            print(f"{Fore.YELLOW}Warning: Could not fetch changes at commit {commit_sha}: {e}{Style.RESET_ALL}")
+            return None
+    
+    @staticmethod
+    def _file_change_from_commit(commit_data, file_path):
+        """Extract one file's change (parsed into hunks) from a commit's files[]"""
+        for file_data in commit_data.get('files', []):
+            if file_path in (file_data.get('filename'), file_data.get('previous_filename')):
+                # GitHub leaves out the patch of binary files and very large diffs
+                patch = file_data.get('patch')
+                return {
+                    'filename': file_data.get('filename'),
+                    'status': file_data.get('status', 'modified'),
+                    'additions': file_data.get('additions', 0),
+                    'deletions': file_data.get('deletions', 0),
+                    'changes': file_data.get('changes', 0),
+                    'patch_available': patch is not None,
+                    'hunks': parse_patch(patch) if patch else []
+                }
+        
+        # The history only lists commits that touched the file, so it is missing
+        # because GitHub cut files[] off (300 files per page): the change is unknown
+        return {
+            'filename': file_path,
+            'status': 'unknown',
+            'additions': 0,
+            'deletions': 0,
+            'changes': 0,
+            'patch_available': False,
+            'hunks': []
+        }
+    
+    def get_file_contents_at_commits(self, repo_name, file_path, commit_shas):
+        """
+        Get a file's content at several commits, fetching in parallel
+        
+        Args:
+            repo_name (str): Repository full name ('owner/repo')
+            file_path (str): Path of the file in the repository
+            commit_shas (list): Commit SHAs (full SHAs are served from the blob cache)
+        
+        Returns:
+            dict: Commit SHA -> decoded content, or None where it could not be fetched
+        """
+        unique_shas = list(dict.fromkeys(sha for sha in commit_shas if sha))
+        if not unique_shas:
+            return {}
+        
+        fetch = self.session.bind_priority(
+            lambda sha: self._get_file_content_at_commit(repo_name, file_path, sha)
+        )
+        workers = min(self.max_workers, len(unique_shas))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='file-history') as executor:
+            return dict(zip(unique_shas, executor.map(fetch, unique_shas)))
+    
+    def get_files_at_commit(self, repo_name, file_paths, commit_sha, blob_shas=None):
+        """
+        Get the raw bytes of several files at one commit, fetching in parallel
+        
+        Args:
+            blob_shas (dict, optional): Path -> blob SHA where already known,
+                so blobs stored under another commit or path are cache hits
+        
+        Returns:
+            dict: Path -> bytes, or None where the file could not be fetched
+        """
+        unique_paths = list(dict.fromkeys(file_paths))
+        if not unique_paths:
+            return {}
+        
+        fetch = self.session.bind_priority(
+            lambda file_path: self._get_file_bytes_at_commit(repo_name, file_path, commit_sha, (blob_shas or {}).get(file_path))
+        )
+        workers = min(self.max_workers, len(unique_paths))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='file-contents') as executor:
+            return dict(zip(unique_paths, executor.map(fetch, unique_paths)))
+    
     def _get_file_content_at_commit(self, repo_name, file_path, commit_sha):
         """Get the file content at a specific commit"""
+        data = self._get_file_bytes_at_commit(repo_name, file_path, commit_sha)
+        return None if data is None else data.decode('utf-8', errors='ignore')
+    
+    def get_cached_file_bytes(self, repo_name, file_path, commit_sha, blob_sha=None):
+        """Get the raw bytes of a file at a full commit SHA from the blob cache only, or None"""
+        # Only full SHAs pin the content; branch names and short SHAs are never cached
+        if self.blob_cache is None or not _COMMIT_SHA_RE.match(commit_sha):
+            return None
+        # With the commit's tree at hand, the same blob stored for another commit or path is a hit too
+        blob_sha = blob_sha or self._known_blob_sha(repo_name, commit_sha, file_path)
+        return self.blob_cache.get(repo_name, commit_sha, file_path, blob_sha)
+    
+    def _get_file_bytes_at_commit(self, repo_name, file_path, commit_sha, blob_sha=None):
+        """Get the raw bytes of a file at a specific commit, through the blob cache"""
+        data = self.get_cached_file_bytes(repo_name, file_path, commit_sha, blob_sha)
+        if data is not None:
+            return data
+        
+        cacheable = self.blob_cache is not None and bool(_COMMIT_SHA_RE.match(commit_sha))
+        # The download is streamed, so concurrent requests for one file are coalesced here instead
+        return self.session.single_flight.do(
+            ('file', repo_name.lower(), commit_sha, file_path),
+            lambda: self._download_file_bytes(repo_name, file_path, commit_sha, cacheable)
+        )
+    
+    def _download_file_bytes(self, repo_name, file_path, commit_sha, cacheable):
         try:
-            # Get the file content at the specific commit
-            file_url = f"{self.base_url}/repos/{repo_name}/contents/{file_path}?ref={commit_sha}"
-            response = self.session.get(file_url)
+            # Raw media type: the file bytes themselves instead of base64-encoded JSON.
+            # Streamed so the body lands in the blob cache only, not the HTTP cache too
+            file_url = f"{self.base_url}/repos/{repo_name}/contents/{file_path}"
+            response = self.session.get(
+                file_url,
+                params={'ref': commit_sha},
+                headers={'Accept': 'application/vnd.github.raw'},
+                timeout=self.request_timeout,
+                stream=True
+            )
             
-            if response.status_code == 200:
-                file_data = response.json()
-                if file_data.get('type') == 'file':
-                    # Decode the content (it's base64 encoded)
-                    import base64
-                    content = base64.b64decode(file_data.get('content', '')).decode('utf-8', errors='ignore')
-                    return content
+            with response:
+                if response.status_code != 200:
+                    return None
+                data = response.content
             
-            return None
+            if cacheable:
+                self.blob_cache.put(repo_name, commit_sha, file_path, data)
+            return data
             
         except Exception as e:
             print(f"{Fore.YELLOW}Warning: Could not fetch file content at commit {commit_sha}: {e}{Style.RESET_ALL}")
             return None
+    
+    def open_file(self, repo_name, file_path, ref=None, byte_range=None):
+        """
+        Open a file for streaming as raw bytes instead of base64-encoded JSON
+        
+        Files the contents API refuses as too large are read from the git
+        blobs API instead, by their blob SHA from the repository tree.
+        
+        Args:
+            ref (str, optional): Commit SHA or branch (default branch if omitted)
+            byte_range (tuple, optional): (start, end) byte offsets, end
+                inclusive or None; sent as a Range header, which GitHub may ignore
+        
+        Returns:
+            requests.Response: Open streamed response (206 when the range was
+            honored, 416 when it starts past the end of the file) that the
+            caller must close, or None if the file could not be fetched
+        """
+        headers = {'Accept': 'application/vnd.github.raw'}
+        if byte_range:
+            start, end = byte_range
+            headers['Range'] = f"bytes={start}-{'' if end is None else end}"
+        
+        try:
+            url = f"{self.base_url}/repos/{repo_name}/contents/{file_path}"
+            response = self.session.get(
+                url,
+                params={'ref': ref} if ref else None,
+                headers=headers,
+                timeout=self.request_timeout,
+                stream=True
+            )
+            if response.status_code in (200, 206) or (byte_range and response.status_code == 416):
+                return response
+            response.close()
+            # The contents API answers 403 "too_large" above its size limit
+            if response.status_code not in (403, 413, 422) or is_rate_limited(response):
+                print(f"{Fore.YELLOW}Warning: Could not fetch {repo_name}/{file_path}: {response.status_code}{Style.RESET_ALL}")
+                return None
+            
+            blob_sha = self._blob_sha(repo_name, file_path, ref)
+            if blob_sha is None:
+                return None
+            print(f"{Fore.BLUE}{repo_name}/{file_path} is too large for the contents API, reading its blob...{Style.RESET_ALL}")
+            response = self.session.get(
+                f"{self.base_url}/repos/{repo_name}/git/blobs/{blob_sha}",
+                headers=headers,
+                timeout=self.request_timeout,
+                stream=True
+            )
+            if response.status_code in (200, 206):
+                return response
+            response.close()
+            print(f"{Fore.YELLOW}Warning: Could not fetch blob of {repo_name}/{file_path}: {response.status_code}{Style.RESET_ALL}")
+            
+        except Exception as e:
+            print(f"{Fore.YELLOW}Warning: Could not fetch {repo_name}/{file_path}: {e}{Style.RESET_ALL}")
+        return None
+    
+    def _blob_sha(self, repo_name, file_path, ref=None):
+        """Look up the blob SHA of a file in the (cached) repository tree"""
+        entries = self.get_repository_tree(repo_name, ref or 'HEAD')
+        for entry in entries or []:
+            if entry['path'] == file_path and entry['type'] == 'blob':
+                return entry['sha']
+        return None
 
 def main():
     """Main function"""
     try:
-        searcher = GitHubCodeSearch()
+        searcher = GitHubCodeSearch(cache_dir=DEFAULT_CACHE_DIR, tokens=load_tokens())
         searcher.interactive_search()
     except KeyboardInterrupt:
         print(f"\n{Fore.YELLOW}Search interrupted by user{Style.RESET_ALL}")
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Persistent conditional-request cache for the GitHub API
+Stores response bodies together with their validators (ETag / Last-Modified)
+on disk so repeated GET requests are answered locally or revalidated with a
+304, which GitHub does not count against the rate limit. File contents at a
+commit are immutable and kept separately, by git blob SHA, in a BlobCache.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'gitgutter')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Headers that describe the original transfer rather than the stored body
+_TRANSFER_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection'}
+
+_MAX_AGE_RE = re.compile(r'(?:^|,)\s*max-age\s*=\s*(\d+)', re.IGNORECASE)
+
+
+def normalize_url(url):
+    """Decode the path and query of a URL and encode them again one way (query
+    spaces as %20, reserved characters escaped) so equal requests compare equal"""
+    parts = urlsplit(url)
+    path = quote(unquote(parts.path), safe="/!$&'()*+,;=:@~")
+    query = urlencode(parse_qsl(parts.query, keep_blank_values=True), quote_via=quote)
+    return urlunsplit((parts.scheme, parts.netloc.lower(), path, query, ''))
+
+
+class HTTPCache:
+    """Disk-backed cache of GET responses with LRU eviction under a size cap
+
+    Entries are fresh for the ``max-age`` the server sent; stale entries are
+    revalidated with ``If-None-Match`` / ``If-Modified-Since``. Counters:
+
+        hits           served from disk without touching the network
+        revalidations  served from disk after a 304 from the server
+        misses         full body downloaded from the server
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, 'http_cache.sqlite3')
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' key TEXT PRIMARY KEY, url TEXT, etag TEXT, last_modified TEXT,'
+            ' headers TEXT, body BLOB, size INTEGER, stored_at REAL, max_age REAL,'
+            ' last_access REAL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+        self._total_bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    @staticmethod
+    def is_cacheable(request):
+        """Only plain GETs without caller-supplied validators or ranges are cached"""
+        if request.method != 'GET':
+            return False
+        headers = request.headers
+        return not any(h in headers for h in ('Range', 'If-None-Match', 'If-Modified-Since'))
+
+    @staticmethod
+    def cache_key(request, namespace=''):
+        """Key a request by URL plus the headers GitHub varies its responses on
+
+        Works for requests' and httpx's requests alike: the URL is re-encoded
+        by normalize_url first, since the two libraries encode query strings
+        differently and the same search would otherwise get two keys.
+        """
+        parts = [
+            namespace,
+            request.method,
+            normalize_url(str(request.url)),
+            request.headers.get('Accept', ''),
+            request.headers.get('Authorization', ''),
+        ]
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def fetch(self, request, send, namespace=''):
+        """
+        Answer a prepared request from the cache, revalidating when stale
+
+        Args:
+            request (requests.PreparedRequest): The outgoing request
+            send (callable): Sends a prepared request and returns the response
+            namespace (str): Extra key component, e.g. the credential scope
+        """
+        key = self.cache_key(request, namespace)
+        entry = self.lookup(key)
+
+        if entry is not None and self.is_fresh(entry):
+            self.record('hits')
+            return self._build_response(entry, request)
+
+        if entry is not None:
+            request.headers.update(self.conditional_headers(entry))
+
+        response = send(request)
+
+        if response.status_code == 304 and entry is not None:
+            self.record('revalidations')
+            entry = self.refresh(key, entry, response.headers)
+            return self._build_response(entry, request, elapsed=response.elapsed)
+
+        self.record('misses')
+        if response.status_code == 200:
+            self.store(key, response.url, response.headers, response.content)
+        return response
+
+    def stats(self):
+        """Return hit/miss/revalidation counters and the current disk usage"""
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            served = self.hits + self.revalidations
+            total = served + self.misses
+            return {
+                'enabled': True,
+                'entries': entries,
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'revalidations': self.revalidations,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(served / total, 4) if total else 0.0,
+            }
+
+    def clear(self):
+        """Drop every cached response"""
+        with self._lock:
+            self._conn.execute('DELETE FROM responses')
+            self._total_bytes = 0
+
+    # The primitives below let clients other than requests (see async_github.py)
+    # share the cache: lookup, send with conditional_headers, then refresh on a
+    # 304 or store a 200, recording the outcome
+
+    def record(self, counter):
+        """Count a 'hits', 'revalidations' or 'misses' outcome"""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    @staticmethod
+    def is_fresh(entry):
+        """Whether an entry may be served without revalidation"""
+        return time.time() - entry['stored_at'] < entry['max_age']
+
+    @staticmethod
+    def conditional_headers(entry):
+        """Validators to revalidate a stale entry with"""
+        headers = {}
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def lookup(self, key):
+        """Return the stored entry for a key, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT url, etag, last_modified, headers, body, stored_at, max_age FROM responses WHERE key = ?',
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (time.time(), key))
+        return {
+            'url': row[0],
+            'etag': row[1],
+            'last_modified': row[2],
+            'headers': json.loads(row[3]),
+            'body': row[4],
+            'stored_at': row[5],
+            'max_age': row[6],
+        }
+
+    def store(self, key, url, response_headers, body):
+        """Store the headers and (decoded) body of a 200 response, if it is cacheable"""
+        cache_control = response_headers.get('Cache-Control', '')
+        if 'no-store' in cache_control.lower():
+            return
+        etag = response_headers.get('ETag')
+        last_modified = response_headers.get('Last-Modified')
+        max_age = _parse_max_age(cache_control)
+        if not etag and not last_modified and not max_age:
+            return
+
+        size = len(body)
+        if size > self.max_bytes:
+            return
+
+        headers = {k: v for k, v in response_headers.items() if k.lower() not in _TRANSFER_HEADERS}
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses'
+                ' (key, url, etag, last_modified, headers, body, size, stored_at, max_age, last_access)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, str(url), etag, last_modified, json.dumps(headers), sqlite3.Binary(body),
+                 size, now, max_age, now)
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._evict_locked()
+
+    def refresh(self, key, entry, response_headers):
+        """Merge a 304's headers (rate limit, freshness) into the stored entry"""
+        headers = dict(entry['headers'])
+        for k, v in response_headers.items():
+            if k.lower() not in _TRANSFER_HEADERS:
+                headers[k] = v
+        entry = dict(entry)
+        entry['headers'] = headers
+        entry['etag'] = response_headers.get('ETag') or entry['etag']
+        entry['last_modified'] = response_headers.get('Last-Modified') or entry['last_modified']
+        entry['max_age'] = _parse_max_age(response_headers.get('Cache-Control', headers.get('Cache-Control', '')))
+        entry['stored_at'] = time.time()
+        with self._lock:
+            self._conn.execute(
+                'UPDATE responses SET etag = ?, last_modified = ?, headers = ?, stored_at = ?, max_age = ? WHERE key = ?',
+                (entry['etag'], entry['last_modified'], json.dumps(headers), entry['stored_at'], entry['max_age'], key)
+            )
+        return entry
+
+    def _evict_locked(self):
+        """Delete least recently used entries until the cache fits its size cap"""
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                'SELECT key, size FROM responses ORDER BY last_access LIMIT 64'
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            for key, size in rows:
+                self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    @staticmethod
+    def _build_response(entry, request, elapsed=None):
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response._content = bytes(entry['body'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = entry['url'] or request.url
+        response.request = request
+        response.elapsed = elapsed or timedelta(0)
+        response.from_cache = True
+        return response
+
+
+def _parse_max_age(cache_control):
+    match = _MAX_AGE_RE.search(cache_control or '')
+    return float(match.group(1)) if match else 0.0
+
+
+class BlobCache:
+    """Disk-backed store of file contents keyed by git blob SHA
+
+    Contents at a commit never change, so entries are never revalidated.
+    Each (repository, commit, path) is resolved to a blob SHA once; versions
+    of a file that several commits share are stored a single time, and a
+    caller that knows the blob SHA up front (e.g. from the commit's tree) is
+    served the stored blob whichever commit or path it was stored under. Least
+    recently used blobs are evicted once the store exceeds ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, 'blob_cache.sqlite3')
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS blobs (sha TEXT PRIMARY KEY, content BLOB, size INTEGER, last_access REAL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS blobs_last_access ON blobs (last_access)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS refs (key TEXT PRIMARY KEY, sha TEXT)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS refs_sha ON refs (sha)')
+        self._total_bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+
+    def get(self, repository, commit_sha, path, blob_sha=None):
+        """Return the stored bytes of `path` at a full commit SHA (or of blob `blob_sha`), or None"""
+        ref_key = _ref_key(repository, commit_sha, path)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT blobs.sha, blobs.content FROM refs JOIN blobs ON blobs.sha = refs.sha WHERE refs.key = ?',
+                (ref_key,)
+            ).fetchone()
+            if row is None and blob_sha:
+                row = self._conn.execute('SELECT sha, content FROM blobs WHERE sha = ?', (blob_sha,)).fetchone()
+                if row is not None:
+                    self._conn.execute('INSERT OR REPLACE INTO refs (key, sha) VALUES (?, ?)', (ref_key, blob_sha))
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute('UPDATE blobs SET last_access = ? WHERE sha = ?', (time.time(), row[0]))
+            self.hits += 1
+        return bytes(row[1])
+
+    def put(self, repository, commit_sha, path, data):
+        """Store the bytes of `path` at a full commit SHA; returns their blob SHA"""
+        sha = git_blob_sha(data)
+        size = len(data)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO refs (key, sha) VALUES (?, ?)',
+                (_ref_key(repository, commit_sha, path), sha)
+            )
+            if size > self.max_bytes:
+                return sha
+            stored = self._conn.execute('SELECT 1 FROM blobs WHERE sha = ?', (sha,)).fetchone()
+            if stored is None:
+                self._conn.execute(
+                    'INSERT INTO blobs (sha, content, size, last_access) VALUES (?, ?, ?, ?)',
+                    (sha, sqlite3.Binary(data), size, time.time())
+                )
+                self._total_bytes += size
+                self._evict_locked()
+        return sha
+
+    def stats(self):
+        """Return hit/miss counters and the current disk usage"""
+        with self._lock:
+            blobs = self._conn.execute('SELECT COUNT(*) FROM blobs').fetchone()[0]
+            refs = self._conn.execute('SELECT COUNT(*) FROM refs').fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                'enabled': True,
+                'blobs': blobs,
+                'refs': refs,
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def _evict_locked(self):
+        """Delete least recently used blobs (and the refs to them) until the store fits its size cap"""
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute('SELECT sha, size FROM blobs ORDER BY last_access LIMIT 64').fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            for sha, size in rows:
+                self._conn.execute('DELETE FROM blobs WHERE sha = ?', (sha,))
+                self._conn.execute('DELETE FROM refs WHERE sha = ?', (sha,))
+                self._total_bytes -= size
+                self.evictions += 1
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+
+def git_blob_sha(data):
+    """The SHA git assigns to a blob with these contents"""
+    digest = hashlib.sha1(b'blob %d\0' % len(data))
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def _ref_key(repository, commit_sha, path):
+    return f"{repository.lower()}\n{commit_sha}\n{path}"
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Background job runner for long-running work such as codebase analyses
+Jobs run on a bounded worker pool independently of the HTTP request that
+submitted them (or, for callers that wait anyway, in the caller's thread),
+report progress counters, can be cancelled, and keep their result for a
+while after they finish. Submitting work under the key of a job that is
+still queued, running or finished within its TTL attaches to that job
+instead of starting new work.
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(BaseException):
+    """Raised inside a job once it has been cancelled
+
+    A BaseException (like asyncio.CancelledError) so the broad
+    `except Exception` handlers of the work being run do not swallow it.
+    """
+
+
+class Job:
+    """One unit of background work and its progress"""
+
+    def __init__(self, key, kind):
+        self.id = secrets.token_urlsafe(12)
+        self.key = key
+        self.kind = kind
+        self.status = QUEUED
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.attached = 0
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+        self._future = None
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def update_progress(self, **counts):
+        """Set progress counters; raises JobCancelled once the job is cancelled
+
+        Work should call this regularly: it is also the cancellation point.
+        """
+        self.progress.update(counts)
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def wait(self, timeout=None):
+        """Block until the job has finished; returns whether it did"""
+        return self._finished.wait(timeout)
+
+    def snapshot(self, include_result=False):
+        """JSON-ready description of the job (with its result once done, if asked)"""
+        now = self.finished_at or time.time()
+        snapshot = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': dict(self.progress),
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'elapsed': round(now - self.started_at, 3) if self.started_at else 0.0,
+            'attached': self.attached,
+        }
+        if include_result and self.status == DONE:
+            snapshot['result'] = self.result
+        return snapshot
+
+
+class JobRunner:
+    """
+    Runs jobs on a bounded thread pool
+
+    Finished jobs are kept for `ttl` seconds (and at most `max_finished` of
+    them, oldest dropped first) so their results can still be collected.
+    Failed and cancelled jobs are never attached to: submitting their key
+    again starts over.
+    """
+
+    def __init__(self, max_workers=2, ttl=3600.0, max_finished=100):
+        self.max_workers = max(1, int(max_workers))
+        self.ttl = float(ttl)
+        self.max_finished = max(0, int(max_finished))
+        self.submitted = 0
+        self.deduplicated = 0
+        self._jobs = OrderedDict()
+        self._by_key = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+
+    def submit(self, key, kind, fn, *args, **kwargs):
+        """
+        Run `fn(job, *args, **kwargs)` in the background unless `key` already has a job
+
+        Returns:
+            tuple: (Job, created) where created is False when the submission
+            attached to an existing job
+        """
+        with self._lock:
+            job, created = self._attach_or_create_locked(key, kind)
+            if created:
+                job._future = self._executor.submit(self._run, job, fn, args, kwargs)
+            return job, created
+
+    def run(self, key, kind, fn, *args, **kwargs):
+        """
+        Like submit(), but a new job runs in the calling thread instead of the pool
+
+        For callers that wait for the result anyway: they do not queue behind
+        background jobs for a worker. Returns once the job (new or attached
+        to) has finished.
+
+        Returns:
+            tuple: (Job, created)
+        """
+        with self._lock:
+            job, created = self._attach_or_create_locked(key, kind)
+        if created:
+            self._run(job, fn, args, kwargs)
+        else:
+            job.wait()
+        return job, created
+
+    def get(self, job_id):
+        """Return a job by id, or None if it is unknown or expired"""
+        with self._lock:
+            self._expire_locked()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancel a job: a queued job never starts, a running one stops at its next progress update
+
+        Returns:
+            Job: The job, or None if it is unknown or expired
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            job._cancel.set()
+            # Jobs run inline have no future; they stop at their next progress update
+            if job._future is not None and job._future.cancel():
+                # Never started; _run will not see it
+                self._finish_locked(job, CANCELLED)
+            return job
+
+    def jobs(self):
+        """Snapshots of every job, newest first"""
+        with self._lock:
+            self._expire_locked()
+            return [job.snapshot() for job in reversed(self._jobs.values())]
+
+    def stats(self):
+        with self._lock:
+            self._expire_locked()
+            counts = {state: 0 for state in (QUEUED, RUNNING) + FINISHED_STATES}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return {
+                'workers': self.max_workers,
+                'ttl': self.ttl,
+                'submitted': self.submitted,
+                'deduplicated': self.deduplicated,
+                'jobs': counts,
+            }
+
+    def _attach_or_create_locked(self, key, kind):
+        self._expire_locked()
+        job = self._by_key.get(key)
+        if job is not None and job.status not in (FAILED, CANCELLED):
+            job.attached += 1
+            self.deduplicated += 1
+            return job, False
+
+        job = Job(key, kind)
+        self._jobs[job.id] = job
+        self._by_key[key] = job
+        self.submitted += 1
+        return job, True
+
+    def _run(self, job, fn, args, kwargs):
+        with self._lock:
+            if job.cancelled:
+                self._finish_locked(job, CANCELLED)
+                return
+            job.status = RUNNING
+            job.started_at = time.time()
+        try:
+            result = fn(job, *args, **kwargs)
+        except JobCancelled:
+            with self._lock:
+                self._finish_locked(job, CANCELLED)
+        except Exception as e:
+            print(f"Job {job.id} ({job.kind}) failed: {e}")
+            with self._lock:
+                job.error = str(e)
+                self._finish_locked(job, FAILED)
+        else:
+            with self._lock:
+                job.result = result
+                self._finish_locked(job, CANCELLED if job.cancelled else DONE)
+
+    def _finish_locked(self, job, status):
+        job.status = status
+        job.finished_at = time.time()
+        if status == CANCELLED:
+            job.result = None
+        job._finished.set()
+        self._expire_locked()
+
+    def _expire_locked(self):
+        """Forget finished jobs past their TTL, and the oldest beyond max_finished"""
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.finished]
+        overflow = len(finished) - self.max_finished
+        for job in finished:
+            if overflow > 0 or now - job.finished_at >= self.ttl:
+                overflow -= 1
+                del self._jobs[job.id]
+                if self._by_key.get(job.key) is job:
+                    del self._by_key[job.key]
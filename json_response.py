@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Compact JSON responses with negotiated compression
+Serializes with orjson when it is installed (the standard library otherwise),
+without the whitespace of Flask's default output, and compresses response
+bodies with brotli or gzip according to the client's Accept-Encoding.
+"""
+
+import gzip
+import json
+
+from flask import Response
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+# Smaller bodies are not worth the CPU (or the extra header bytes)
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/html', 'text/plain', 'text/css', 'application/javascript')
+
+
+def serializer():
+    """Name of the JSON serializer in use"""
+    return 'orjson' if orjson is not None else 'json'
+
+
+def dumps(value):
+    """Serialize a JSON-ready value to compact UTF-8 bytes"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # Values orjson refuses (e.g. integers beyond 64 bits) go through json
+            pass
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+
+
+def json_response(value, status=200, headers=None):
+    """Flask response of `value` serialized with dumps(); compression is left to compress_response"""
+    return Response(dumps(value), status=status, mimetype='application/json', headers=headers)
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encodings):
+    """
+    Pick the content encoding for a response
+
+    Args:
+        accept_encodings: The request's parsed Accept-Encoding
+            (werkzeug's `request.accept_encodings`)
+
+    Returns:
+        str: 'br', 'gzip' or None for no compression
+    """
+    best = accept_encodings.best_match(available_encodings())
+    return best if best and accept_encodings[best] > 0 else None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def compress_response(response, accept_encodings):
+    """
+    Compress a finished response in place when the client accepts it
+
+    Streamed, file and already encoded responses, non-text bodies and
+    bodies under MIN_COMPRESS_BYTES are left as they are.
+    """
+    response.vary.add('Accept-Encoding')
+    if (response.is_streamed or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES or response.status_code < 200
+            or response.status_code in (204, 206, 304)):
+        return response
+
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_BYTES:
+        return response
+    encoding = negotiate_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    response.set_data(compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Metrics in the Prometheus text exposition format
+A small in-process registry of counters and histograms, plus collectors that
+read gauges (cache ratios, rate-limit budgets) at scrape time. Upstream GitHub
+calls are recorded here by both clients, labelled by endpoint type.
+"""
+
+import re
+import threading
+from urllib.parse import urlsplit
+
+# Seconds; covers cache hits (milliseconds) up to analyses of large repositories
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+COUNT_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+BYTE_BUCKETS = (1024, 16 * 1024, 256 * 1024, 1024 ** 2, 16 * 1024 ** 2, 256 * 1024 ** 2, 1024 ** 3)
+
+_REPO_ENDPOINT_RE = re.compile(r'/repos/[^/]+/[^/]+/(commits|contents|git/trees|git/blobs|tarball|zipball)(?:/|$)')
+_REPO_ENDPOINTS = {
+    'commits': 'commits',
+    'contents': 'contents',
+    'git/trees': 'trees',
+    'git/blobs': 'contents',
+    'tarball': 'archive',
+    'zipball': 'archive',
+}
+
+
+def upstream_endpoint(url):
+    """Classify a GitHub API URL as search, commits, contents, trees, archive, graphql, rate_limit or other"""
+    path = urlsplit(str(url)).path.rstrip('/')
+    if '/search/' in path:
+        return 'search'
+    if path.endswith('/graphql'):
+        return 'graphql'
+    if path.endswith('/rate_limit'):
+        return 'rate_limit'
+    match = _REPO_ENDPOINT_RE.search(path)
+    if match:
+        return _REPO_ENDPOINTS[match.group(1)]
+    return 'other'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value is None:
+        return 'NaN'
+    if isinstance(value, float) and value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                labels = list(zip(self.labelnames, key))
+                for bound, count in zip(self.buckets, series['buckets']):
+                    lines.append(f'{self.name}_bucket{_format_labels(labels + [("le", _format_value(bound))])} {count}')
+                lines.append(f'{self.name}_bucket{_format_labels(labels + [("le", "+Inf")])} {series["count"]}')
+                lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(series["sum"])}')
+                lines.append(f'{self.name}_count{_format_labels(labels)} {series["count"]}')
+        return lines
+
+
+class Registry:
+    """Holds metrics and scrape-time collectors; render() returns the exposition text"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, fn):
+        """
+        Register `fn()` to be called at every scrape
+
+        It returns (name, type, help, samples) tuples, samples being
+        (labels dict, value) pairs; None values are skipped. Usable as a decorator.
+        """
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collect in collectors:
+            try:
+                families = list(collect())
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    if value is not None:
+                        lines.append(f'{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+
+REGISTRY = Registry()
+
+http_request_seconds = REGISTRY.histogram(
+    'gitgutter_http_request_duration_seconds',
+    'Time to produce the response of a web request (streamed bodies: until the response starts)',
+    ('route', 'method')
+)
+http_requests = REGISTRY.counter(
+    'gitgutter_http_requests_total',
+    'Web requests by route and status code',
+    ('route', 'method', 'status')
+)
+upstream_request_seconds = REGISTRY.histogram(
+    'gitgutter_upstream_request_duration_seconds',
+    'Latency of GitHub API calls that reached the network (cache hits excluded)',
+    ('endpoint',)
+)
+upstream_requests = REGISTRY.counter(
+    'gitgutter_upstream_requests_total',
+    'GitHub API calls that reached the network, by endpoint type and status code',
+    ('endpoint', 'status')
+)
+analysis_files = REGISTRY.histogram(
+    'gitgutter_analysis_files',
+    'Files per codebase analysis, by stage (listed, fetched, scanned)',
+    ('stage',),
+    buckets=COUNT_BUCKETS
+)
+analysis_bytes = REGISTRY.histogram(
+    'gitgutter_analysis_fetched_bytes',
+    'File bytes downloaded per codebase analysis',
+    buckets=BYTE_BUCKETS
+)
+
+
+def observe_request(route, method, status_code, seconds):
+    http_request_seconds.observe(seconds, route=route, method=method)
+    http_requests.inc(route=route, method=method, status=status_code)
+
+
+def observe_upstream(url, status_code, seconds):
+    """Record one GitHub API call; `status_code` is None when no response arrived"""
+    endpoint = upstream_endpoint(url)
+    upstream_request_seconds.observe(seconds, endpoint=endpoint)
+    upstream_requests.inc(endpoint=endpoint, status=status_code if status_code is not None else 'error')
+
+
+def observe_analysis(files_listed, files_fetched, files_scanned, bytes_fetched):
+    analysis_files.observe(files_listed, stage='listed')
+    analysis_files.observe(files_fetched, stage='fetched')
+    analysis_files.observe(files_scanned, stage='scanned')
+    analysis_bytes.observe(bytes_fetched)
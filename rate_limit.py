@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Rate-limit-aware scheduling for GitHub API requests
+Tracks the core, search, code search and GraphQL budgets of each token in a
+pool from the X-RateLimit-* and Retry-After headers of every response, sends
+each request with the token that has the most budget left, holds requests
+back while every budget is exhausted and lets higher-priority callers go first.
+"""
+
+import hashlib
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# Lower numbers are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+
+RESOURCES = ('core', 'search', 'code_search', 'graphql')
+
+
+def resource_for_url(url):
+    """Guess which rate-limit resource a request URL is billed to"""
+    path = urlsplit(url).path.rstrip('/')
+    if path.endswith('/graphql'):
+        return 'graphql'
+    if '/search/code' in path:
+        return 'code_search'
+    if '/search/' in path:
+        return 'search'
+    return 'core'
+
+
+def token_label(token):
+    """Name a token in reports without revealing it"""
+    return f"token-...{token[-4:]}" if token else 'anonymous'
+
+
+def is_rate_limited(response):
+    """Whether a response is GitHub refusing the request for rate-limit reasons"""
+    if response is None or response.status_code not in (403, 429):
+        return False
+    headers = response.headers
+    return 'Retry-After' in headers or headers.get('X-RateLimit-Remaining') == '0'
+
+
+class RateLimitBucket:
+    """Known budget of one rate-limit resource, as last reported by GitHub"""
+
+    def __init__(self, resource):
+        self.resource = resource
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.retry_until = 0.0
+        self.in_flight = 0
+
+    def available(self, now):
+        """Requests left in the current window, or None while the budget is unknown"""
+        if self.remaining is None:
+            return None
+        if self.reset_at is not None and now >= self.reset_at:
+            # The window rolled over; assume a full budget until told otherwise
+            self.remaining = self.limit
+            self.reset_at = None
+        return self.remaining - self.in_flight
+
+    def update(self, headers, status_code, now):
+        try:
+            limit = int(headers['X-RateLimit-Limit'])
+            remaining = int(headers['X-RateLimit-Remaining'])
+            reset_at = float(headers['X-RateLimit-Reset'])
+        except (KeyError, TypeError, ValueError):
+            pass
+        else:
+            # Responses can arrive out of order; never raise the budget within a window
+            if self.reset_at is None or reset_at > self.reset_at or remaining < self.remaining:
+                self.limit = limit
+                self.remaining = remaining
+                self.reset_at = reset_at
+
+        if status_code in (403, 429) and 'Retry-After' in headers:
+            try:
+                self.retry_until = max(self.retry_until, now + float(headers['Retry-After']))
+            except ValueError:
+                pass
+
+    def snapshot(self, now):
+        available = self.available(now)
+        return {
+            'limit': self.limit,
+            'remaining': self.remaining,
+            'available': available,
+            'reset': int(self.reset_at) if self.reset_at is not None else None,
+            'retry_after': max(0, math.ceil(self.retry_until - now)),
+            'in_flight': self.in_flight,
+            # Spent budgets are parked until the window resets
+            'parked': available is not None and available <= 0,
+        }
+
+
+class RateLimitScheduler:
+    """
+    Admits requests against per-token, per-resource budgets in priority order
+
+    Every credential in the token pool (or the anonymous client when the pool
+    is empty) has its own bucket per resource. A request is sent with the
+    credential that has the most budget left; a credential whose budget is
+    spent is parked until its reset time. When no credential can take the
+    request, it waits, and waiting requests are admitted highest priority
+    first, in arrival order within a priority. Background requests also leave
+    `background_reserve` of each budget to interactive and normal requests.
+    Requests are never held back for more than `max_wait` seconds: if no
+    budget comes back sooner, they are sent and GitHub's own error response
+    is returned to the caller.
+    """
+
+    def __init__(self, max_wait=60.0, background_reserve=0.1, tokens=None):
+        self.max_wait = float(max_wait)
+        self.background_reserve = float(background_reserve)
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self._buckets = {}
+        self._waiting = {resource: [] for resource in RESOURCES}
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self.set_tokens(tokens)
+
+    def set_tokens(self, tokens):
+        """Replace the token pool; an empty pool sends requests unauthenticated"""
+        tokens = list(dict.fromkeys(token for token in (tokens or []) if token))
+        with self._cond:
+            self.tokens = tokens
+            self._credentials = tokens or [None]
+            self._buckets = {key: bucket for key, bucket in self._buckets.items() if key[0] in self._credentials}
+            self.pool_id = hashlib.sha256('\n'.join(tokens).encode('utf-8')).hexdigest()[:16] if tokens else ''
+            self._cond.notify_all()
+
+    @property
+    def current_priority(self):
+        """Priority of requests made from the current thread"""
+        return getattr(self._local, 'priority', PRIORITY_NORMAL)
+
+    @contextmanager
+    def priority(self, priority):
+        """Run the requests made inside the block (on this thread) at `priority`"""
+        previous = self.current_priority
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def bind(self, fn, priority=None):
+        """Wrap `fn` so it runs at `priority` (default: the caller's) on worker threads"""
+        if priority is None:
+            priority = self.current_priority
+
+        def run(*args, **kwargs):
+            with self.priority(priority):
+                return fn(*args, **kwargs)
+        return run
+
+    def acquire(self, resource, priority=None):
+        """
+        Block until a request to `resource` may be sent
+
+        Returns:
+            str: The token to send the request with, or None for an
+            unauthenticated request
+        """
+        if priority is None:
+            priority = self.current_priority
+        ticket = (priority, next(self._sequence))
+        started = time.monotonic()
+        with self._cond:
+            waiting = self._waiting.setdefault(resource, [])
+            heapq.heappush(waiting, ticket)
+            waited = False
+            try:
+                while True:
+                    credential, delay = self._pick_locked(resource, priority)
+                    if waiting[0] == ticket and delay <= 0:
+                        break
+                    remaining_wait = self.max_wait - (time.monotonic() - started)
+                    if delay > remaining_wait:
+                        # Holding the request back would not help; let GitHub answer
+                        break
+                    waited = True
+                    self._cond.wait(timeout=min(max(delay, 0.05), 1.0))
+            finally:
+                waiting.remove(ticket)
+                heapq.heapify(waiting)
+                if waited:
+                    self.waits += 1
+                    self.wait_seconds += time.monotonic() - started
+                self._cond.notify_all()
+            self._bucket_locked(credential, resource).in_flight += 1
+            return credential
+
+    def release(self, resource, credential, response=None):
+        """Record the outcome of a request admitted by acquire() with `credential`"""
+        with self._cond:
+            if credential in self._credentials:
+                self._bucket_locked(credential, resource).in_flight -= 1
+                if response is not None:
+                    # GitHub names the resource it billed; trust it over the URL guess
+                    billed = response.headers.get('X-RateLimit-Resource', resource)
+                    self._bucket_locked(credential, billed).update(response.headers, response.status_code, time.time())
+            self._cond.notify_all()
+
+    def should_retry(self, resource, response):
+        """Whether a rate-limited response is worth retrying (possibly with another token) within max_wait"""
+        if not is_rate_limited(response):
+            return False
+        with self._cond:
+            _, delay = self._pick_locked(response.headers.get('X-RateLimit-Resource', resource), PRIORITY_INTERACTIVE)
+            return delay <= self.max_wait
+
+    def snapshot(self):
+        """
+        Return the known budget of every resource plus queueing counters
+
+        'resources' adds up the budgets of the whole pool; 'tokens' has the
+        per-token buckets, labelled by the last characters of each token.
+        """
+        now = time.time()
+        with self._cond:
+            tokens = {}
+            for position, credential in enumerate(self._credentials, 1):
+                tokens[f"{position}:{token_label(credential)}"] = {
+                    resource: self._bucket_locked(credential, resource).snapshot(now)
+                    for resource in RESOURCES
+                }
+            resources = {}
+            for resource, waiting in self._waiting.items():
+                buckets = [self._bucket_locked(credential, resource).snapshot(now) for credential in self._credentials]
+                known = [bucket for bucket in buckets if bucket['remaining'] is not None]
+                resets = [bucket['reset'] for bucket in known if bucket['reset'] is not None]
+                resources[resource] = {
+                    'limit': sum(bucket['limit'] for bucket in known) if known else None,
+                    'remaining': sum(bucket['remaining'] for bucket in known) if known else None,
+                    'reset': min(resets) if resets else None,
+                    'in_flight': sum(bucket['in_flight'] for bucket in buckets),
+                    'waiting': len(waiting),
+                }
+            return {
+                'resources': resources,
+                'tokens': tokens,
+                'waits': self.waits,
+                'wait_seconds': round(self.wait_seconds, 3),
+            }
+
+    def _bucket_locked(self, credential, resource):
+        key = (credential, resource)
+        if key not in self._buckets:
+            self._buckets[key] = RateLimitBucket(resource)
+        return self._buckets[key]
+
+    def _pick_locked(self, resource, priority):
+        """Pick the credential that can send soonest, preferring the most remaining budget"""
+        now = time.time()
+        best = None
+        for credential in self._credentials:
+            bucket = self._bucket_locked(credential, resource)
+            delay = self._delay_locked(bucket, priority)
+            available = bucket.available(now)
+            # Unknown budgets sort first so every token gets probed
+            rank = (max(delay, 0), -(available if available is not None else float('inf')))
+            if best is None or rank < best[0]:
+                best = (rank, credential, delay)
+        return best[1], best[2]
+
+    def _delay_locked(self, bucket, priority):
+        """Seconds until `bucket` can take a request at `priority` (0 if it can now)"""
+        now = time.time()
+        if now < bucket.retry_until:
+            return bucket.retry_until - now
+        available = bucket.available(now)
+        if available is None:
+            return 0
+        reserve = 0
+        if priority >= PRIORITY_BACKGROUND and bucket.limit:
+            reserve = math.ceil(bucket.limit * self.background_reserve)
+        if available > reserve:
+            return 0
+        if bucket.reset_at is None:
+            # Budget spent by requests still in flight; their responses will tell
+            return 0.05 if bucket.in_flight else 0
+        return max(bucket.reset_at - now, 0.05)
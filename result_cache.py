@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+In-memory result cache with stale-while-revalidate
+Keeps computed results (e.g. enriched search pages) for a TTL. Once an
+entry is stale it is still served right away while a single background
+refresh recomputes it, so popular keys never make a caller wait twice.
+Entries are evicted least recently used first to stay under a byte budget.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def json_size(value):
+    """Approximate the memory held by a JSON-like value by its serialized size"""
+    return len(json.dumps(value, default=str))
+
+
+class ResultCache:
+    """
+    Memory-bounded cache of computed values
+
+    Entries are fresh for `ttl` seconds. Stale entries younger than
+    `ttl + stale_ttl` are returned immediately and refreshed in the
+    background (one refresh per key at a time); older ones are recomputed
+    by the caller. Counters:
+
+        hits           fresh entry returned
+        stale_hits     stale entry returned, refresh started
+        misses         value computed by the caller
+        refreshes      background refreshes that stored a new value
+        refresh_errors background refreshes that failed
+    """
+
+    def __init__(self, ttl=300.0, stale_ttl=3600.0, max_bytes=32 * 1024 * 1024, sizeof=json_size, refresh_workers=2):
+        self.ttl = float(ttl)
+        self.stale_ttl = float(stale_ttl)
+        self.max_bytes = int(max_bytes)
+        self.sizeof = sizeof
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix='result-refresh')
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the value for `key`, computing it with `compute()` when needed
+
+        `compute` may return None for results that must not be cached (such
+        as failures); that None is returned to the caller as is.
+
+        Returns:
+            tuple: (value, state) with state 'hit', 'stale' or 'miss'
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry['stored_at']
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry['value'], 'hit'
+                if age < self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self._executor.submit(self._refresh, key, compute)
+                    return entry['value'], 'stale'
+            self.misses += 1
+
+        value = compute()
+        if value is not None:
+            self.put(key, value)
+        return value, 'miss'
+
+    def put(self, key, value):
+        """Store a value, evicting least recently used entries over the byte budget"""
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous['size']
+            self._entries[key] = {'value': value, 'size': size, 'stored_at': time.time()}
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted['size']
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            served = self.hits + self.stale_hits
+            total = served + self.misses
+            return {
+                'enabled': True,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'stale_ttl': self.stale_ttl,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'refresh_errors': self.refresh_errors,
+                'evictions': self.evictions,
+                'hit_ratio': round(served / total, 4) if total else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _refresh(self, key, compute):
+        try:
+            value = compute()
+            if value is not None:
+                self.put(key, value)
+            with self._lock:
+                if value is None:
+                    self.refresh_errors += 1
+                else:
+                    self.refreshes += 1
+        except Exception as e:
+            print(f"Background refresh failed: {e}")
+            with self._lock:
+                self.refresh_errors += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
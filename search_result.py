@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Search result model shared by the web application and the CLI
+A SearchResult is built once from a code search API item and rendered on
+demand, either as the JSON-ready dict of /api/search or as colored terminal
+text. Timestamps in GitHub's own ISO-8601 form are parsed without dateutil.
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+
+from colorama import Fore, Style
+from dateutil import parser
+
+# Results whose file was last changed longer ago than this are flagged as old
+OLD_RESULT_AGE = timedelta(days=30)
+
+# Lines of the fragment shown around the first matching line
+SNIPPET_CONTEXT_LINES = 2
+
+# What GitHub sends: 2024-05-01T12:34:56Z, with optional fractional seconds or offset
+_ISO_TIMESTAMP_RE = re.compile(
+    r'(\d{4})-(\d\d)-(\d\d)[T ](\d\d):(\d\d):(\d\d)(?:\.(\d{1,6})\d*)?(?:(Z)|([+-])(\d\d):?(\d\d))?$'
+)
+
+
+def parse_timestamp(value):
+    """
+    Parse a timestamp to an aware datetime (naive ones are taken as UTC)
+
+    ISO-8601 timestamps are read with a compiled pattern; anything else goes
+    through dateutil. Returns None for missing or unparseable values.
+    """
+    if not value or value == 'Unknown':
+        return None
+    match = _ISO_TIMESTAMP_RE.match(value)
+    if match is not None:
+        year, month, day, hour, minute, second, fraction, utc, sign, offset_hours, offset_minutes = match.groups()
+        tzinfo = timezone.utc
+        if sign:
+            offset = timedelta(hours=int(offset_hours), minutes=int(offset_minutes))
+            tzinfo = timezone(-offset if sign == '-' else offset)
+        try:
+            return datetime(
+                int(year), int(month), int(day), int(hour), int(minute), int(second),
+                int(fraction.ljust(6, '0')) if fraction else 0, tzinfo
+            )
+        except ValueError:
+            return None
+    try:
+        parsed = parser.parse(value)
+    except (ValueError, OverflowError):
+        return None
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+class SearchResult:
+    """
+    One code search result
+
+    Attributes are read from the API item once: repository, file_path,
+    file_name, language, size, updated_at (as sent), html_url, config_files
+    and updated (updated_at parsed, or None). The snippet and both renderings
+    are only worked out when asked for.
+    """
+
+    __slots__ = (
+        'repository', 'file_path', 'file_name', 'language', 'size', 'updated_at', 'html_url',
+        'config_files', 'updated', '_text_match', '_snippet'
+    )
+
+    def __init__(self, repository, file_path, html_url, language='Unknown', size='Unknown',
+                 updated_at='Unknown', config_files=None, text_match=None):
+        self.repository = repository
+        self.file_path = file_path
+        self.file_name = file_path.rpartition('/')[2]
+        self.html_url = html_url
+        self.language = language
+        self.size = size
+        self.updated_at = updated_at
+        self.config_files = config_files or {}
+        self.updated = parse_timestamp(updated_at) if isinstance(updated_at, str) else None
+        self._text_match = text_match
+        self._snippet = None
+
+    @classmethod
+    def from_item(cls, item):
+        """Build a result from an item of the code search API (as enriched by GitHubCodeSearch)"""
+        text_matches = item.get('text_matches')
+        return cls(
+            item['repository']['full_name'],
+            item['path'],
+            item['html_url'],
+            language=item.get('language', 'Unknown'),
+            size=item.get('size', 'Unknown'),
+            updated_at=item.get('updated_at', 'Unknown'),
+            config_files=item.get('config_files', {}),
+            text_match=text_matches[0] if text_matches else None
+        )
+
+    def is_old(self, now=None):
+        """Whether the file was last changed more than OLD_RESULT_AGE before `now` (default: the current time)"""
+        if self.updated is None:
+            return False
+        return self.updated < (now or datetime.now(timezone.utc)) - OLD_RESULT_AGE
+
+    def snippet(self):
+        """
+        The first match of the fragment with SNIPPET_CONTEXT_LINES of context
+
+        Returns:
+            tuple: (lines, matched_text) where lines are (line number, text,
+            is the match) triples, line number None when no line of the
+            fragment holds the match whole; or None without a fragment
+        """
+        if self._snippet is None:
+            self._snippet = self._build_snippet()
+        return self._snippet or None
+
+    def _build_snippet(self):
+        match = self._text_match or {}
+        fragment = match.get('fragment') or ''
+        matched_text = match.get('text') or ''
+        if not fragment:
+            return ()
+        if not matched_text:
+            return ((None, fragment, False),), ''
+
+        lines = fragment.split('\n')
+        index = next((i for i, line in enumerate(lines) if matched_text in line), None)
+        if index is None:
+            # The match spans lines: the whole fragment, highlighted where it can be
+            return ((None, fragment, True),), matched_text
+        start = max(0, index - SNIPPET_CONTEXT_LINES)
+        stop = min(len(lines), index + SNIPPET_CONTEXT_LINES + 1)
+        return tuple((i + 1, lines[i], i == index) for i in range(start, stop)), matched_text
+
+    def snippet_text(self, highlight=None):
+        """
+        The snippet as numbered lines ('   >>  12: ...' marks the match)
+
+        `highlight(text)` wraps each occurrence of the matched text in the
+        matching line; without it the snippet is plain text.
+        """
+        snippet = self.snippet()
+        if snippet is None:
+            return ''
+        lines, matched_text = snippet
+        out = []
+        for line_num, line, is_match in lines:
+            if is_match and highlight is not None:
+                line = line.replace(matched_text, highlight(matched_text))
+            if line_num is None:
+                out.append(line)
+            elif is_match:
+                out.append(f"   >> {line_num:3d}: {line}")
+            else:
+                out.append(f"      {line_num:3d}: {line}")
+        return '\n'.join(out)
+
+    def to_json(self, now=None):
+        """JSON-ready dict for /api/search; the snippet is plain text (the page highlights it)"""
+        return {
+            'repository': self.repository,
+            'file_path': self.file_path,
+            'file_name': self.file_name,
+            'language': self.language,
+            'size': self.size,
+            'updated_at': self.updated_at,
+            'html_url': self.html_url,
+            'code_snippet': self.snippet_text(),
+            'is_old': self.is_old(now),
+            'config_files': self.config_files
+        }
+
+    def to_terminal(self, index, now=None):
+        """Colored text of the result as numbered `index` (0-based) in the CLI's result list"""
+        is_old = self.is_old(now)
+        result = f"{Fore.CYAN}{index + 1}.{Style.RESET_ALL} "
+
+        # Add red indicator for old results
+        if is_old:
+            result += f"{Fore.RED}[OLD]{Style.RESET_ALL} "
+
+        result += f"{Fore.GREEN}{self.repository}/{self.file_path}{Style.RESET_ALL}\n"
+        result += f"   {Fore.YELLOW}Repository:{Style.RESET_ALL} {self.repository}\n"
+        result += f"   {Fore.YELLOW}File:{Style.RESET_ALL} {self.file_name}\n"
+        result += f"   {Fore.YELLOW}Language:{Style.RESET_ALL} {self.language} | {Fore.YELLOW}Size:{Style.RESET_ALL} {self.size}\n"
+
+        # Color the date red if old
+        date_color = Fore.RED if is_old else Fore.YELLOW
+        result += f"   {date_color}Updated:{Style.RESET_ALL} {self.updated_at}\n"
+        result += f"   {Fore.YELLOW}URL:{Style.RESET_ALL} {self.html_url}\n"
+
+        # Add config file indicators if available
+        env_files = self.config_files.get('env_files', [])
+        config_files_list = self.config_files.get('config_files', [])
+        if env_files:
+            result += f"   {Fore.MAGENTA}🔧 Env Files:{Style.RESET_ALL} {', '.join(env_files[:3])}"
+            if len(env_files) > 3:
+                result += f" (+{len(env_files) - 3} more)"
+            result += "\n"
+        if config_files_list:
+            result += f"   {Fore.MAGENTA}⚙️  Config Files:{Style.RESET_ALL} {', '.join(config_files_list[:3])}"
+            if len(config_files_list) > 3:
+                result += f" (+{len(config_files_list) - 3} more)"
+            result += "\n"
+
+        code_snippet = self.snippet_text(highlight=terminal_highlight)
+        if code_snippet:
+            result += f"   {Fore.YELLOW}Code Snippet:{Style.RESET_ALL}\n{Fore.WHITE}{code_snippet}{Style.RESET_ALL}\n"
+
+        return result
+
+
+def terminal_highlight(text):
+    return f"{Fore.RED}{text}{Style.RESET_ALL}"
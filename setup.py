@@ -39,6 +39,12 @@ setup(
     ],
     python_requires=">=3.6",
     install_requires=requirements,
+    extras_require={
+        # Async client for the web application's upstream fan-outs (async_github.py)
+        "async": ["httpx>=0.24"],
+        # Faster JSON serialization and brotli compression of responses (json_response.py)
+        "fast": ["orjson>=3.6", "brotli>=1.0"],
+    },
     entry_points={
         "console_scripts": [
             "gitgutter-gui=app:main",
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Single-flight coalescing of identical concurrent calls
+While a call for a key is in flight, further calls for the same key wait for
+it and receive its result instead of starting their own. Used under the
+GitHub clients so concurrent identical GET requests (several users opening
+the same file, two tabs expanding the same tree) cost one upstream call.
+"""
+
+import asyncio
+import threading
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Thread-based single-flight group
+
+    Counters:
+        calls   calls that ran (one per flight)
+        shared  callers that received the result of another caller's flight
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, share=None):
+        """
+        Run `fn()` unless a call for `key` is already in flight, then wait for that one
+
+        Args:
+            share (callable, optional): Applied to the result handed to each
+                waiting caller, e.g. to give each one its own copy
+
+        Raises:
+            Exception: Whatever the call for `key` raised, in every caller
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return share(flight.result) if share else flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            return _stats(self.calls, self.shared, len(self._flights))
+
+
+class AsyncSingleFlight:
+    """
+    Single-flight group for coroutines running on one event loop
+
+    Same counters as SingleFlight.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._flights = {}
+
+    async def do(self, key, fn, share=None):
+        """
+        Await `fn()` unless a call for `key` is already in flight, then await that one
+
+        The call runs as its own task and every caller, the first included,
+        awaits it shielded: a caller that is cancelled gives up its wait
+        without cancelling the call for the others.
+        """
+        task = self._flights.get(key)
+        if task is not None:
+            self.shared += 1
+            result = await asyncio.shield(task)
+            return share(result) if share else result
+
+        self.calls += 1
+        task = asyncio.ensure_future(fn())
+        self._flights[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # Retrieved here so an error nobody waited for is not logged as lost
+            task.exception()
+
+    def stats(self):
+        return _stats(self.calls, self.shared, len(self._flights))
+
+
+def _stats(calls, shared, in_flight):
+    requested = calls + shared
+    return {
+        'calls': calls,
+        'shared': shared,
+        'in_flight': in_flight,
+        'saved_ratio': round(shared / requested, 4) if requested else 0.0,
+    }
@@ -1,5 +1,9 @@
 // Global variables
 let currentResults = [];
+// Cursor of the current search while more pages are available
+let currentCursor = null;
+// Commit SHA each repository's tree was loaded at, so expanding directories is served from the server's cached tree
+let repositoryTreeRefs = {};
 let allApiRoutes = [
     // Cloud Providers
     { text: 'AWS Lambda', query: 'lambda.amazonaws.com' },
@@ -70,6 +74,8 @@ const resultsTitle = document.getElementById('resultsTitle');
 const resultsCount = document.getElementById('resultsCount');
 const error = document.getElementById('error');
 const errorMessage = document.getElementById('errorMessage');
+const loadMore = document.getElementById('loadMore');
+const loadMoreButton = document.getElementById('loadMoreButton');
 const commitModal = document.getElementById('commitModal');
 const modalTitle = document.getElementById('modalTitle');
 const commitLoading = document.getElementById('commitLoading');
@@ -84,6 +90,7 @@ const detailsContent = document.getElementById('detailsContent');
 // Event listeners
 document.addEventListener('DOMContentLoaded', function() {
     searchForm.addEventListener('submit', handleSearch);
+    loadMoreButton.addEventListener('click', loadMoreResults);
     
     // Initialize random API chips
     generateRandomChips();
@@ -146,6 +153,7 @@ async function handleSearch(e) {
     showLoading();
     hideError();
     hideResults();
+    currentCursor = null;
     
     try {
         const response = await fetch('/api/search', {
@@ -160,6 +168,7 @@ async function handleSearch(e) {
         
         if (response.ok && data.success) {
             currentResults = data.results;
+            currentCursor = data.cursor;
             displayResults(data);
         } else {
             showError(data.error || 'Search failed');
@@ -188,9 +197,55 @@ function displayResults(data) {
         });
     }
     
+    updateLoadMore();
     showResults();
 }
 
+// Fetch the next page of the current search and append it to the results
+async function loadMoreResults() {
+    if (!currentCursor) {
+        return;
+    }
+    
+    loadMoreButton.disabled = true;
+    loadMoreButton.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Loading...';
+    hideError();
+    
+    try {
+        const response = await fetch('/api/search', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ cursor: currentCursor })
+        });
+        
+        const data = await response.json();
+        
+        if (response.ok && data.success) {
+            // Indices continue from the results already shown (viewDetails looks them up)
+            data.results.forEach(result => {
+                resultsList.appendChild(createResultElement(result, currentResults.length));
+                currentResults.push(result);
+            });
+            currentCursor = data.cursor;
+        } else {
+            currentCursor = null;
+            showError(data.error || 'Could not load more results');
+        }
+    } catch (err) {
+        showError('Network error: ' + err.message);
+    } finally {
+        loadMoreButton.disabled = false;
+        loadMoreButton.innerHTML = '<i class="fas fa-chevron-down"></i> Load more results';
+        updateLoadMore();
+    }
+}
+
+function updateLoadMore() {
+    loadMore.classList.toggle('hidden', !currentCursor);
+}
+
 // Create a result element
 function createResultElement(result, index) {
     const resultDiv = document.createElement('div');
@@ -310,7 +365,8 @@ async function viewCommitHistory(repository, filePath) {
             body: JSON.stringify({
                 repository: repository,
                 file_path: filePath,
-                max_commits: 10
+                max_commits: 10,
+                mode: 'patch'
             })
         });
         
@@ -336,7 +392,7 @@ function displayCommitHistory(commits, repository, filePath) {
         commitList.innerHTML = '<p class="no-commits">No commits found for this file.</p>';
     } else {
         commits.forEach((commit, index) => {
-            const commitElement = createCommitElement(commit, index);
+            const commitElement = createCommitElement(commit, index, repository, filePath);
             commitList.appendChild(commitElement);
         });
     }
@@ -346,7 +402,7 @@ function displayCommitHistory(commits, repository, filePath) {
 }
 
 // Create a commit element
-function createCommitElement(commit, index) {
+function createCommitElement(commit, index, repository, filePath) {
     const commitDiv = document.createElement('div');
     commitDiv.className = 'commit-item';
     
@@ -360,6 +416,7 @@ function createCommitElement(commit, index) {
         </div>
         <div class="commit-author">by ${commit.author}</div>
         <div class="commit-message">${escapeHtml(commit.message)}</div>
+        ${'change' in commit ? createCommitChangeHTML(commit, repository, filePath) : ''}
         ${contentPreview ? `
             <div class="commit-content">${escapeHtml(contentPreview)}</div>
             ${commit.total_lines > 20 ? `<div class="commit-more">... and ${commit.total_lines - 20} more lines</div>` : ''}
@@ -369,6 +426,71 @@ function createCommitElement(commit, index) {
     return commitDiv;
 }
 
+// Patch-only history: the lines a commit changed, with the full file loaded on demand
+function createCommitChangeHTML(commit, repository, filePath) {
+    const change = commit.change;
+    if (!change) {
+        return '<div class="commit-more">Could not load the changes of this commit</div>';
+    }
+    
+    let diffHTML = '';
+    change.hunks.forEach(hunk => {
+        diffHTML += `<div class="diff-hunk">@@ -${hunk.old_start},${hunk.old_lines} +${hunk.new_start},${hunk.new_lines} @@ ${escapeHtml(hunk.section)}</div>`;
+        hunk.lines.forEach(line => {
+            const marker = line.type === 'add' ? '+' : line.type === 'del' ? '-' : ' ';
+            const lineNum = line.type === 'del' ? line.old_line : line.new_line;
+            diffHTML += `<div class="diff-line diff-${line.type}"><span class="diff-line-num">${lineNum}</span>${marker} ${escapeHtml(line.text)}</div>`;
+        });
+    });
+    
+    // 'unknown': the commit changed too many files for GitHub to list this one
+    const summary = change.status === 'unknown'
+        ? 'changed · not listed by GitHub (too many files in this commit)'
+        : `${change.status} · <span class="diff-additions">+${change.additions}</span> <span class="diff-deletions">-${change.deletions}</span>`;
+    
+    return `
+        <div class="commit-change-summary">
+            ${summary}
+        </div>
+        ${diffHTML ? `<div class="commit-diff">${diffHTML}</div>` : `<div class="commit-more">${change.patch_available ? 'No line changes' : 'No textual diff available'}</div>`}
+        <button class="btn btn-secondary commit-full-file" data-repo="${repository}" data-file="${filePath}" data-sha="${commit.full_sha}" onclick="loadCommitFileContent(this)">
+            <i class="fas fa-file-code"></i> Show full file
+        </button>
+    `;
+}
+
+// Load the whole file at a commit (served from the blob cache after the first time)
+async function loadCommitFileContent(button) {
+    button.disabled = true;
+    
+    try {
+        const response = await fetch('/api/file-content', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                repository: button.dataset.repo,
+                file_path: button.dataset.file,
+                ref: button.dataset.sha
+            })
+        });
+        
+        const data = await response.json();
+        const contentDiv = document.createElement('div');
+        contentDiv.className = 'commit-content';
+        if (!response.ok || !data.success) {
+            contentDiv.textContent = 'Failed to load content: ' + (data.error || 'Unknown error');
+        } else {
+            contentDiv.textContent = data.binary ? describeBinaryFile(data) : data.content;
+        }
+        button.replaceWith(contentDiv);
+    } catch (err) {
+        button.disabled = false;
+        showCommitError('Network error: ' + err.message);
+    }
+}
+
 // Show/hide functions
 function showLoading() {
     loading.classList.remove('hidden');
@@ -515,6 +637,12 @@ async function viewDetails(repository, filePath, resultIndex) {
 
 // Load repository file tree
 async function loadRepositoryTree(repository, highlightedFilePath, currentPath = '') {
+    // If we have a highlighted file path, we need to build the full tree
+    if (highlightedFilePath && !currentPath) {
+        await buildFullTreeWithHighlight(repository, highlightedFilePath);
+        return;
+    }
+    
     try {
         const response = await fetch('/api/repository-tree', {
             method: 'POST',
@@ -523,19 +651,15 @@ async function loadRepositoryTree(repository, highlightedFilePath, currentPath =
             },
             body: JSON.stringify({
                 repository: repository,
-                path: currentPath
+                path: currentPath,
+                ref: repositoryTreeRefs[repository]
             })
         });
         
         const data = await response.json();
         
         if (response.ok && data.success) {
-            // If we have a highlighted file path, we need to build the full tree
-            if (highlightedFilePath && !currentPath) {
-                await buildFullTreeWithHighlight(repository, highlightedFilePath);
-            } else {
-                displayFileTree(data.tree, highlightedFilePath, repository, currentPath);
-            }
+            displayFileTree(data.tree, highlightedFilePath, repository, currentPath);
         } else {
             document.getElementById('fileTree').innerHTML = '<p class="error">Failed to load file tree</p>';
         }
@@ -547,26 +671,27 @@ async function loadRepositoryTree(repository, highlightedFilePath, currentPath =
 // Build full tree with automatic expansion to highlighted file
 async function buildFullTreeWithHighlight(repository, highlightedFilePath) {
     try {
-        // Get root contents
-        const rootResponse = await fetch('/api/repository-tree', {
+        // The root and every directory on the way to the file, in one request
+        const response = await fetch('/api/repository-tree/expand', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
             body: JSON.stringify({
                 repository: repository,
-                path: ''
+                path: highlightedFilePath
             })
         });
         
-        const rootData = await rootResponse.json();
+        const data = await response.json();
         
-        if (!rootResponse.ok || !rootData.success) {
-            throw new Error('Failed to load root directory');
+        if (!response.ok || !data.success) {
+            throw new Error(data.error || 'Failed to load root directory');
         }
+        repositoryTreeRefs[repository] = data.sha;
         
         // Build the tree structure
-        const treeStructure = await buildTreeStructure(repository, rootData.tree, highlightedFilePath);
+        const treeStructure = buildTreeStructure(data.listings[''], highlightedFilePath, data.listings);
         
         // Display the tree
         const treeHTML = displayTreeStructure(treeStructure, highlightedFilePath, repository);
@@ -577,8 +702,8 @@ async function buildFullTreeWithHighlight(repository, highlightedFilePath) {
     }
 }
 
-// Build tree structure recursively
-async function buildTreeStructure(repository, items, highlightedFilePath) {
+// Build tree structure recursively from directory listings (path -> items)
+function buildTreeStructure(items, highlightedFilePath, listings) {
     const tree = [];
     
     for (const item of items) {
@@ -592,28 +717,9 @@ async function buildTreeStructure(repository, items, highlightedFilePath) {
         if (highlightedFilePath.startsWith(item.path + '/')) {
             treeItem.expanded = true;
             
-            // If it's a directory, load its contents
-            if (item.type === 'dir') {
-                try {
-                    const response = await fetch('/api/repository-tree', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json',
-                        },
-                        body: JSON.stringify({
-                            repository: repository,
-                            path: item.path
-                        })
-                    });
-                    
-                    const data = await response.json();
-                    
-                    if (response.ok && data.success) {
-                        treeItem.children = await buildTreeStructure(repository, data.tree, highlightedFilePath);
-                    }
-                } catch (err) {
-                    console.error('Failed to load subdirectory:', err);
-                }
+            // If it's a directory, add its contents
+            if (item.type === 'dir' && listings[item.path]) {
+                treeItem.children = buildTreeStructure(listings[item.path], highlightedFilePath, listings);
             }
         }
         
@@ -785,14 +891,15 @@ async function loadTreeItemChildren(repository, filePath, treeItem) {
             },
             body: JSON.stringify({
                 repository: repository,
-                path: filePath
+                path: filePath,
+                ref: repositoryTreeRefs[repository]
             })
         });
         
         const data = await response.json();
         
         if (response.ok && data.success) {
-            const childrenHTML = displayTreeStructure(data.tree, '', repository, 1);
+            const childrenHTML = displayTreeStructure(buildTreeStructure(data.tree, '', {}), '', repository, 1);
             const childrenDiv = document.createElement('div');
             childrenDiv.className = 'file-tree-children';
             childrenDiv.innerHTML = childrenHTML;
@@ -930,27 +1037,43 @@ function toggleConfigFile(header) {
     }
 }
 
+// Lines of a config file loaded when it is opened; the rest is loaded on request
+const CONFIG_PREVIEW_LINES = 50;
+
 // Load config file content
 async function loadConfigFileContent(contentElement) {
     const repository = contentElement.dataset.repo;
     const filePath = contentElement.dataset.file;
     
     try {
-        const response = await fetch('/api/file-content', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                repository: repository,
-                file_path: filePath
-            })
-        });
-        
-        const data = await response.json();
+        const data = await fetchFileLines(repository, filePath, 1, CONFIG_PREVIEW_LINES);
         
-        if (response.ok && data.success) {
-            contentElement.textContent = data.content;
+        if (data.success && data.binary) {
+            contentElement.textContent = describeBinaryFile(data);
+        } else if (data.success) {
+            const text = document.createTextNode(data.content);
+            contentElement.replaceChildren(text);
+            if (data.truncated) {
+                const moreButton = document.createElement('button');
+                moreButton.className = 'btn btn-secondary config-file-more';
+                moreButton.textContent = 'Show the rest of the file';
+                moreButton.onclick = async (event) => {
+                    event.stopPropagation();
+                    moreButton.disabled = true;
+                    try {
+                        const rest = await fetchFileLines(repository, filePath, CONFIG_PREVIEW_LINES + 1, null);
+                        if (!rest.success) {
+                            throw new Error(rest.error || 'Unknown error');
+                        }
+                        text.appendData(rest.content);
+                        moreButton.remove();
+                    } catch (err) {
+                        moreButton.disabled = false;
+                        moreButton.textContent = 'Failed to load the rest: ' + err.message;
+                    }
+                };
+                contentElement.appendChild(moreButton);
+            }
         } else {
             contentElement.textContent = 'Failed to load content: ' + (data.error || 'Unknown error');
         }
@@ -959,13 +1082,40 @@ async function loadConfigFileContent(contentElement) {
     }
 }
 
+// Fetch lines first..last (1-based, last inclusive or null for the end) of a file
+async function fetchFileLines(repository, filePath, first, last) {
+    const response = await fetch('/api/file-content', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            repository: repository,
+            file_path: filePath,
+            lines: [first, last]
+        })
+    });
+    
+    const data = await response.json();
+    if (!response.ok) {
+        data.success = false;
+    }
+    return data;
+}
+
+function describeBinaryFile(data) {
+    return data.size !== null && data.size !== undefined
+        ? `Binary file (${data.size.toLocaleString()} bytes) not shown`
+        : 'Binary file not shown';
+}
+
 // View config file history
 function viewConfigFileHistory(repository, filePath, event) {
     event.stopPropagation(); // Prevent triggering the toggle
     viewCommitHistory(repository, filePath);
 }
 
-// Analyze file (placeholder for future implementation)
+// Analyze file - results stream in as newline-delimited JSON events
 async function analyzeFile(repository, filePath) {
     const searchString = document.getElementById('query').value;
     
@@ -977,8 +1127,21 @@ async function analyzeFile(repository, filePath) {
     // Show analysis loading state
     showAnalysisLoading();
     
+    const files = [];
+    const analysis = {
+        references: [],
+        declarations: [],
+        usages: [],
+        renames: [],
+        relationships: [],
+        uml_data: { classes: [], methods: [], properties: [], relationships: [] }
+    };
+    let fileCount = 0;
+    let filesScanned = 0;
+    let failed = false;
+    
     try {
-        const response = await fetch('/api/analyze', {
+        const response = await fetch('/api/analyze/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -990,18 +1153,126 @@ async function analyzeFile(repository, filePath) {
             })
         });
         
-        const data = await response.json();
-        
-        if (response.ok && data.success) {
-            displayAnalysisResults(data.analysis);
-        } else {
+        if (!response.ok) {
+            const data = await response.json();
             showAnalysisError(data.error || 'Analysis failed');
+            return;
+        }
+        
+        await readEventStream(response, event => {
+            switch (event.event) {
+                case 'start':
+                    fileCount = event.file_count;
+                    break;
+                case 'file':
+                    files.push(expandFileAnalysis(event));
+                    filesScanned = event.files_scanned;
+                    analysis.references.push(...event.analysis.references);
+                    updateAnalysisProgress(filesScanned, fileCount, analysis);
+                    break;
+                case 'progress':
+                    filesScanned = event.files_scanned;
+                    updateAnalysisProgress(filesScanned, fileCount, analysis);
+                    break;
+                case 'relationships':
+                    analysis.relationships = event.relationships;
+                    analysis.relationship_stats = event.stats;
+                    break;
+                case 'uml':
+                    analysis.uml_data = event.uml_data;
+                    break;
+                case 'error':
+                    failed = true;
+                    showAnalysisError(event.error || 'Analysis failed');
+                    break;
+            }
+        });
+        
+        if (failed) {
+            return;
         }
+        
+        // Files arrive as soon as they are scanned; show them in repository order
+        files.sort((a, b) => a.order - b.order);
+        analysis.references = [];
+        files.forEach(file => {
+            analysis.references.push(...file.analysis.references);
+            analysis.declarations.push(...file.analysis.declarations);
+            analysis.usages.push(...file.analysis.usages);
+            analysis.renames.push(...file.analysis.renames);
+        });
+        displayAnalysisResults(analysis);
     } catch (err) {
         showAnalysisError('Network error: ' + err.message);
     }
 }
 
+// File events list each reference once and point at them by index; give the
+// references back their file and the type lists the references themselves
+function expandFileAnalysis(event) {
+    const compact = event.analysis;
+    const references = compact.references.map(ref => Object.assign({ file_path: event.file_path }, ref));
+    event.analysis = {
+        references: references,
+        declarations: compact.declarations.map(i => references[i]),
+        usages: compact.usages.map(i => references[i]),
+        renames: compact.renames.map(i => references[i]),
+        line_count: compact.line_count
+    };
+    return event;
+}
+
+// Read a newline-delimited JSON response, calling onEvent for every event
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) {
+            break;
+        }
+        buffer += decoder.decode(value, { stream: true });
+        
+        let newline;
+        while ((newline = buffer.indexOf('\n')) >= 0) {
+            const line = buffer.slice(0, newline).trim();
+            buffer = buffer.slice(newline + 1);
+            if (line) {
+                onEvent(JSON.parse(line));
+            }
+        }
+    }
+    
+    buffer += decoder.decode();
+    if (buffer.trim()) {
+        onEvent(JSON.parse(buffer));
+    }
+}
+
+// Show partial analysis results while the stream is still running
+let analysisRenderPending = false;
+function updateAnalysisProgress(filesScanned, fileCount, analysis) {
+    if (analysisRenderPending) {
+        return;
+    }
+    analysisRenderPending = true;
+    
+    // Re-render at most once per animation frame
+    requestAnimationFrame(() => {
+        analysisRenderPending = false;
+        const status = document.querySelector('.analysis-status');
+        const partial = document.getElementById('analysisPartial');
+        if (status) {
+            status.textContent = `Scanned ${filesScanned} of ${fileCount} files - ${analysis.references.length} references so far`;
+        }
+        if (partial) {
+            partial.innerHTML = generateReferencesList(analysis);
+        }
+    });
+}
+
 // Show analysis loading state
 function showAnalysisLoading() {
     const detailsContent = document.getElementById('detailsContent');
@@ -1011,6 +1282,7 @@ function showAnalysisLoading() {
             <p>Analyzing codebase...</p>
             <p class="analysis-status">Searching for references to "${document.getElementById('query').value}"</p>
         </div>
+        <div id="analysisPartial" class="analysis-partial"></div>
     `;
     showDetailsContent();
 }
@@ -1055,7 +1327,7 @@ function displayAnalysisResults(analysis) {
                 </div>
                 
                 <div id="relationships-tab" class="tab-panel">
-                    ${generateRelationshipsList(analysis.relationships)}
+                    ${generateRelationshipsList(analysis)}
                 </div>
             </div>
         </div>
@@ -1108,7 +1380,7 @@ function generateUMLDiagram(umlData) {
         umlHTML += `
             <div class="uml-relationship" data-from="${rel.from}" data-to="${rel.to}">
                 <div class="relationship-line ${rel.type} ${rel.strength}"></div>
-                <div class="relationship-label">${rel.type}</div>
+                <div class="relationship-label">${rel.type}${rel.count > 1 ? ` &times;${rel.count}` : ''}</div>
             </div>
         `;
     });
@@ -1173,15 +1445,24 @@ function generateReferencesList(analysis) {
 }
 
 // Generate relationships list
-function generateRelationshipsList(relationships) {
+function generateRelationshipsList(analysis) {
+    const relationships = analysis.relationships;
     if (relationships.length === 0) {
         return '<p class="no-relationships">No relationships found.</p>';
     }
     
     let relationshipsHTML = '<div class="relationships-list">';
     
+    // Relationships refer to references by their index in analysis.references
+    const stats = analysis.relationship_stats;
+    if (stats && stats.total > stats.returned) {
+        relationshipsHTML += `<p class="relationships-truncated">Showing ${stats.returned.toLocaleString()} of ${stats.total.toLocaleString()} relationships</p>`;
+    }
+    
     relationships.forEach(rel => {
         const strengthClass = rel.strength;
+        const from = analysis.references[rel.from];
+        const to = analysis.references[rel.to];
         relationshipsHTML += `
             <div class="relationship-item ${rel.type} ${strengthClass}">
                 <div class="relationship-header">
@@ -1191,10 +1472,10 @@ function generateRelationshipsList(relationships) {
                 </div>
                 <div class="relationship-content">
                     <div class="relationship-from">
-                        <strong>From:</strong> ${rel.from.entity_name} (${rel.from.file_path}:${rel.from.line_num})
+                        <strong>From:</strong> ${from.entity_name} (${from.file_path}:${from.line_num})
                     </div>
                     <div class="relationship-to">
-                        <strong>To:</strong> ${rel.to.entity_name} (${rel.to.file_path}:${rel.to.line_num})
+                        <strong>To:</strong> ${to.entity_name} (${to.file_path}:${to.line_num})
                     </div>
                 </div>
             </div>
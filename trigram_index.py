@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Per-commit trigram index for codebase analysis
+Maps lowercase trigrams to the lines that contain them, so repeated searches
+over the same repository commit only fetch and re-check candidate lines
+instead of re-fetching and re-scanning every file. File bodies are not kept:
+the index refers to each file by its blob SHA, and the blob cache serves them.
+"""
+
+import os
+import pickle
+import re
+import tempfile
+import threading
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+INDEX_VERSION = 3
+
+# Lines longer than this (minified code, data blobs) are not split into
+# trigrams; they are always treated as candidates instead
+MAX_INDEXED_LINE = 1000
+
+_SAFE_NAME_RE = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class TrigramIndex:
+    """Line-level trigram index over the decoded files of one repository commit"""
+
+    def __init__(self, repository, commit_sha, paths, blob_shas, sizes, line_starts, postings, unindexed):
+        self.repository = repository
+        self.commit_sha = commit_sha
+        self.paths = paths
+        self.blob_shas = blob_shas
+        self.sizes = sizes
+        # Global id of the first line of each file; line ids are file-major
+        self.line_starts = line_starts
+        self.postings = postings
+        self.unindexed = unindexed
+        self._path_index = {path: i for i, path in enumerate(paths)}
+
+    @classmethod
+    def build(cls, repository, commit_sha, files):
+        """
+        Build an index from (path, blob SHA, size, content) tuples
+
+        Only the trigrams of each content are kept, so `files` may be a
+        generator reading the contents one at a time.
+
+        Args:
+            repository (str): Repository full name ('owner/repo')
+            commit_sha (str): Commit the contents were read at
+            files (iterable): (path, blob SHA, size in bytes, content) tuples;
+                empty contents (including files that are not UTF-8 text) are
+                kept with no lines, so the index lists the files a full scan does
+        """
+        paths = []
+        blob_shas = []
+        sizes = array('Q')
+        line_starts = array('I')
+        postings = {}
+        unindexed = array('I')
+        line_id = 0
+
+        for path, blob_sha, size, content in files:
+            paths.append(path)
+            blob_shas.append(blob_sha)
+            sizes.append(size or 0)
+            # An empty file shares its first line id with the next file, and
+            # candidate_lines maps line ids to the last file starting there
+            line_starts.append(line_id)
+            for line in content.split('\n') if content else ():
+                if len(line) > MAX_INDEXED_LINE:
+                    unindexed.append(line_id)
+                else:
+                    lowered = line.lower()
+                    for trigram in {lowered[i:i + 3] for i in range(len(lowered) - 2)}:
+                        posting = postings.get(trigram)
+                        if posting is None:
+                            posting = postings[trigram] = array('I')
+                        posting.append(line_id)
+                line_id += 1
+
+        return cls(repository, commit_sha, paths, blob_shas, sizes, line_starts, postings, unindexed)
+
+    @property
+    def nbytes(self):
+        """Approximate in-memory size, used for the memory budget"""
+        size = sum(len(path) + len(blob_sha or '') + 8 for path, blob_sha in zip(self.paths, self.blob_shas))
+        size += sum(len(trigram) * 4 + 64 + posting.itemsize * len(posting)
+                    for trigram, posting in self.postings.items())
+        return size + self.unindexed.itemsize * len(self.unindexed)
+
+    def file_info(self, path):
+        """Return {'path', 'sha', 'size'} of an indexed file (for fetching it again), or None if it is not indexed"""
+        i = self._path_index.get(path)
+        if i is None:
+            return None
+        return {'path': path, 'sha': self.blob_shas[i], 'size': self.sizes[i]}
+
+    def candidate_lines(self, search_string):
+        """
+        Find the lines that may contain `search_string` (case-insensitively)
+
+        Returns:
+            dict: Path -> sorted list of 1-based line numbers, or None when the
+            search string is too short to use the index and every line of
+            every file is a candidate
+        """
+        needle = search_string.lower()
+        if len(needle) < 3:
+            return None
+
+        trigrams = {needle[i:i + 3] for i in range(len(needle) - 2)}
+        postings = []
+        for trigram in trigrams:
+            posting = self.postings.get(trigram)
+            if posting is None:
+                postings = None
+                break
+            postings.append(posting)
+
+        line_ids = set(self.unindexed)
+        if postings:
+            postings.sort(key=len)
+            smallest, others = postings[0], postings[1:]
+            for line_id in smallest:
+                if all(_contains(posting, line_id) for posting in others):
+                    line_ids.add(line_id)
+
+        candidates = {}
+        for line_id in sorted(line_ids):
+            file_index = bisect_right(self.line_starts, line_id) - 1
+            line_num = line_id - self.line_starts[file_index] + 1
+            candidates.setdefault(self.paths[file_index], []).append(line_num)
+        return candidates
+
+    def to_bytes(self):
+        state = {
+            'version': INDEX_VERSION,
+            'repository': self.repository,
+            'commit_sha': self.commit_sha,
+            'paths': self.paths,
+            'blob_shas': self.blob_shas,
+            'sizes': self.sizes.tobytes(),
+            'line_starts': self.line_starts.tobytes(),
+            'postings': {trigram: posting.tobytes() for trigram, posting in self.postings.items()},
+            'unindexed': self.unindexed.tobytes(),
+        }
+        return zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+    @classmethod
+    def from_bytes(cls, data):
+        state = pickle.loads(zlib.decompress(data))
+        if state.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported index version {state.get('version')}")
+        return cls(
+            state['repository'],
+            state['commit_sha'],
+            state['paths'],
+            state['blob_shas'],
+            _array_from_bytes(state['sizes'], 'Q'),
+            _array_from_bytes(state['line_starts']),
+            {trigram: _array_from_bytes(data) for trigram, data in state['postings'].items()},
+            _array_from_bytes(state['unindexed']),
+        )
+
+
+class TrigramIndexSpill:
+    """
+    File bodies of one analysis, parked in a temporary file until its index is built
+
+    Bodies are appended as they stream in, in any order, and read back one at
+    a time by TrigramIndex.build, so they are never all held in memory.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        # Path -> (blob SHA, size, offset, length) in the temporary file
+        self._entries = {}
+
+    def add(self, path, blob_sha, size, content):
+        """Park the decoded content of a file; a None content (fetch failed) is not recorded"""
+        if content is None:
+            return
+        data = content.encode('utf-8')
+        offset = self._file.seek(0, os.SEEK_END)
+        self._file.write(data)
+        self._entries[path] = (blob_sha, size, offset, len(data))
+
+    def complete(self, paths):
+        """Whether every one of `paths` was parked"""
+        return all(path in self._entries for path in paths)
+
+    def files(self, paths):
+        """Yield (path, blob SHA, size, content) for `paths`, in that order, reading each from disk"""
+        for path in paths:
+            blob_sha, size, offset, length = self._entries[path]
+            self._file.seek(offset)
+            yield path, blob_sha, size, self._file.read(length).decode('utf-8')
+
+    def close(self):
+        self._file.close()
+
+
+class TrigramIndexStore:
+    """
+    Keeps trigram indexes in memory under a byte budget and persists them to disk
+
+    Both tiers evict least recently used indexes first: in memory when the
+    total of TrigramIndex.nbytes exceeds `memory_budget`, on disk when the
+    index files exceed `disk_budget`.
+    """
+
+    def __init__(self, index_dir, memory_budget=256 * 1024 * 1024, disk_budget=1024 * 1024 * 1024):
+        os.makedirs(index_dir, exist_ok=True)
+        self.index_dir = index_dir
+        self.memory_budget = int(memory_budget)
+        self.disk_budget = int(disk_budget)
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, repository, commit_sha):
+        """Return the index for a commit from memory or disk, or None"""
+        key = (repository.lower(), commit_sha)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key][0]
+
+        path = self._index_path(repository, commit_sha)
+        try:
+            with open(path, 'rb') as fh:
+                index = TrigramIndex.from_bytes(fh.read())
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except Exception as e:
+            print(f"Discarding unreadable index {path}: {e}")
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self._remember_locked(key, index)
+        return index
+
+    def put(self, index):
+        """Store a freshly built index in memory and on disk"""
+        key = (index.repository.lower(), index.commit_sha)
+        with self._lock:
+            self._remember_locked(key, index)
+
+        path = self._index_path(index.repository, index.commit_sha)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as fh:
+                fh.write(index.to_bytes())
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Could not persist index for {index.repository}@{index.commit_sha}: {e}")
+            self._remove(tmp_path)
+            return
+        self._enforce_disk_budget()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'indexes_in_memory': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'memory_budget': self.memory_budget,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def _remember_locked(self, key, index):
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key)[1]
+        nbytes = index.nbytes
+        self._memory[key] = (index, nbytes)
+        self._memory_bytes += nbytes
+        # Always keep the newest index, even if it alone exceeds the budget
+        while self._memory_bytes > self.memory_budget and len(self._memory) > 1:
+            _, (_, evicted_bytes) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_bytes
+
+    def _enforce_disk_budget(self):
+        files = []
+        for name in os.listdir(self.index_dir):
+            if name.endswith('.idx'):
+                path = os.path.join(self.index_dir, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_budget:
+                break
+            self._remove(path)
+            total -= size
+
+    def _index_path(self, repository, commit_sha):
+        name = _SAFE_NAME_RE.sub('_', repository.lower().replace('/', '__'))
+        return os.path.join(self.index_dir, f"{name}@{commit_sha}.idx")
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _contains(sorted_array, value):
+    i = bisect_left(sorted_array, value)
+    return i < len(sorted_array) and sorted_array[i] == value
+
+
+def _array_from_bytes(data, typecode='I'):
+    values = array(typecode)
+    values.frombytes(data)
+    return values